@@ -3,339 +3,42 @@ from .models import Client, Subscription, ClientEmail, WorkLog
 from django.utils.html import format_html
 from django.contrib import messages
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from datetime import datetime
 from decimal import Decimal
-from .models import Invoice, InvoiceLine
+from .models import BillingJob, BillingRun, BillingRunItem, Invoice, InvoiceLine, OptimumExportTask
 from django.conf import settings
 from django.core.mail import EmailMessage
 from django.core.management import call_command
 from django.urls import path, reverse
 from django.shortcuts import redirect
+from django.http import FileResponse, StreamingHttpResponse
+import tempfile
 
-from billing.services.pdf import generate_invoice_pdf
-
-# --- Optimum eksportas ---
-import urllib.request
-import xml.etree.ElementTree as ET
-import ssl
-import certifi
-import os
-from datetime import datetime
+from billing.services.downloads import invoice_pdf_url
+from config.db_router import reporting_db, use_primary
 
-def ensure_invoice_pdf(invoice):
-    """Ensure invoice.pdf is generated and saved.
 
-    Uses the same PDF generator as monthly invoices: billing.services.pdf.generate_invoice_pdf.
-    The generator returns a file-like object; we persist it into the Invoice.pdf FileField.
+class IndexedSearchMixin:
     """
-    # If PDF already exists, nothing to do
-    if getattr(invoice, "pdf", None) is not None and invoice.pdf:
-        return
-
-    pdf_file = generate_invoice_pdf(invoice)
-    # Persist into FileField so it is available for downloads and email attachments
-    invoice.pdf.save(pdf_file.name, pdf_file, save=True)
-
-
-# --- Eksportas į Optimum (viena eilutė) ---
-# Pagal Optimum dokumentaciją, WSDL ir SOAP veikia ir per HTTP.
-# Kai kuriuose tinkluose / momentais HTTPS sertifikatas api.optimum.lt gali turėti hostname mismatch,
-# todėl leidžiam konfigūruoti URL per ENV ir (jei reikia) naudoti HTTP.
-
-OPTIMUM_TRD_URL = (os.getenv("OPTIMUM_TRD_URL") or "https://api.optimum.lt/v1/lt/Trd.asmx").strip()
-OPTIMUM_NS = "http://api.optimum.lt/v1/lt/Trd/"
-SOAPENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
-
-# Optimum reikalauja sandėlio kodo kiekvienai eilutei (InvArticle.StrFllCode)
-OPTIMUM_STR_FLL_CODE = (os.getenv("OPTIMUM_STR_FLL_CODE") or getattr(settings, "OPTIMUM_STR_FLL_CODE", "") or "S").strip()
-
-# Kai kuriose Optimum instaliacijose taip pat reikalaujamas atsakingo darbuotojo kodas (invoice.RspEmpCode)
-OPTIMUM_EMP_CODE = (os.getenv("OPTIMUM_EMP_CODE") or getattr(settings, "OPTIMUM_EMP_CODE", "") or "vmil").strip()
-
-
-def _optimum_ssl_context():
-    """SSL context for Optimum SOAP calls.
-
-    Notes:
-    - Context is only used for HTTPS.
-    - Uses certifi CA bundle to avoid missing/old OS CA stores.
-    - You may TEMPORARILY disable verification by setting OPTIMUM_SSL_VERIFY=0 (NOT recommended).
-    - If you get hostname mismatch errors, preferred fix is either:
-        a) use OPTIMUM_TRD_URL=http://api.optimum.lt/v1/lt/Trd.asmx (no TLS), or
-        b) ask Optimum/IT to fix TLS / disable SSL inspection for api.optimum.lt.
+    Paieška per billing.services.search (MySQL FULLTEXT / SearchToken) vietoje LIKE '%...%'.
+    search_fields paliekami – pagal juos admin rodo paieškos laukelį.
     """
-    if not OPTIMUM_TRD_URL.lower().startswith("https://"):
-        return None
-
-    verify = (getattr(settings, "OPTIMUM_SSL_VERIFY", None) or os.getenv("OPTIMUM_SSL_VERIFY", "1")).strip()
-    if verify in {"0", "false", "False", "no", "NO"}:
-        return ssl._create_unverified_context()
-
-    ctx = ssl.create_default_context(cafile=certifi.where())
-    ctx.check_hostname = True
-    ctx.verify_mode = ssl.CERT_REQUIRED
-    return ctx
-
-
-def _xml_escape(s: str) -> str:
-    return (
-        (s or "")
-        .replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-        .replace("'", "&apos;")
-    )
-
-
-# --- Optimum SOAP helpers ---
-def _optimum_request(api_key: str, soap_action: str, body_xml: str) -> bytes:
-    """Send a SOAP 1.1 request to Optimum and return raw response bytes."""
-    envelope = f'''<?xml version="1.0" encoding="utf-8"?>
-<soap:Envelope xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:soap="{SOAPENV_NS}">
-  <soap:Header>
-    <Header xmlns="{OPTIMUM_NS}">
-      <Key>{_xml_escape(api_key)}</Key>
-    </Header>
-  </soap:Header>
-  <soap:Body>
-{body_xml}
-  </soap:Body>
-</soap:Envelope>'''
-
-    data = envelope.encode("utf-8")
-    req = urllib.request.Request(
-        OPTIMUM_TRD_URL,
-        data=data,
-        headers={
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": soap_action,
-        },
-        method="POST",
-    )
 
-    ctx = _optimum_ssl_context()
-    if ctx is None:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return resp.read()
-    with urllib.request.urlopen(req, timeout=30, context=ctx) as resp:
-        return resp.read()
+    def get_search_results(self, request, queryset, search_term):
+        from billing.services.search import search
 
+        return search(queryset, search_term), False
 
 
-# Debug helper for dumping SOAP request/response for troubleshooting.
-def _dump_optimum_soap(prefix: str, request_xml: str, response_bytes: bytes | None) -> None:
-    """Best-effort dump of SOAP request/response for debugging (API key should already be masked by caller if needed)."""
-    try:
-        with open(f"{prefix}_request.xml", "w", encoding="utf-8") as f:
-            f.write(request_xml)
-    except Exception:
-        pass
-
-    if response_bytes is not None:
-        try:
-            with open(f"{prefix}_response.xml", "wb") as f:
-                f.write(response_bytes)
-        except Exception:
-            pass
-
-
-def _optimum_insert_cmp_transaction(api_key: str, *, no: str, date_dt: datetime, notes: str = "") -> dict:
-    """Create a company transaction in Optimum and return dict with Status/Result/Error.
-
-    Result is expected to be TransactionId (int) on success.
-    """
-    body_xml = f'''    <InsertCmpTransaction xmlns="{OPTIMUM_NS}">
-      <transaction>
-        <Date>{date_dt.isoformat()}</Date>
-        <No>{_xml_escape(no)}</No>
-        <Notes>{_xml_escape(notes)}</Notes>
-      </transaction>
-    </InsertCmpTransaction>'''
-
-    debug_dump = (os.getenv("OPTIMUM_DEBUG_SOAP", "0").strip() in {"1", "true", "True", "yes", "YES"})
-    dump_prefix = f"soap_optimum_trn_{_xml_escape(no).replace('/', '_')}"
-
-    try:
-        # Reconstruct full envelope for debugging dumps (API key masked)
-        masked_key = "***"
-        envelope_for_dump = f'''<?xml version="1.0" encoding="utf-8"?>
-<soap:Envelope xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:soap="{SOAPENV_NS}">
-  <soap:Header>
-    <Header xmlns="{OPTIMUM_NS}">
-      <Key>{masked_key}</Key>
-    </Header>
-  </soap:Header>
-  <soap:Body>
-{body_xml}
-  </soap:Body>
-</soap:Envelope>'''
-
-        resp_bytes = _optimum_request(
-            api_key=api_key,
-            soap_action="http://api.optimum.lt/v1/lt/Trd/InsertCmpTransaction",
-            body_xml=body_xml,
-        )
-    except Exception as exc:
-        if debug_dump:
-            _dump_optimum_soap(dump_prefix, envelope_for_dump, None)
-        return {"Status": "Error", "Result": None, "Error": f"HTTP/SOAP klaida (InsertCmpTransaction): {exc}"}
-
-    try:
-        root = ET.fromstring(resp_bytes)
-        ns = {"soap": SOAPENV_NS, "opt": OPTIMUM_NS}
-        res = root.find(".//opt:InsertCmpTransactionResult", ns)
-        if res is None:
-            if debug_dump:
-                _dump_optimum_soap(dump_prefix, envelope_for_dump, resp_bytes)
-            return {"Status": "Error", "Result": None, "Error": "Nepavyko nuskaityti InsertCmpTransactionResult iš SOAP atsakymo."}
-
-        status = (res.findtext("opt:Status", default="", namespaces=ns) or "").strip()
-        result = (res.findtext("opt:Result", default="", namespaces=ns) or "").strip() or None
-        err = (res.findtext("opt:Error", default="", namespaces=ns) or "").strip() or None
-
-        if status.lower() == "success":
-            return {"Status": "Success", "Result": result, "Error": None}
-        if debug_dump:
-            _dump_optimum_soap(dump_prefix, envelope_for_dump, resp_bytes)
-        return {"Status": "Error", "Result": result, "Error": err or "Nežinoma Optimum klaida."}
-    except Exception as exc:
-        if debug_dump:
-            _dump_optimum_soap(dump_prefix, envelope_for_dump, resp_bytes)
-        return {"Status": "Error", "Result": None, "Error": f"SOAP parse klaida (InsertCmpTransaction): {exc}"}
-
-
-def export_invoice_to_optimum_single_line(invoice, *, description: str = "Suteiktos paslaugos (per mėn.)") -> dict:
-    """Export a single invoice to Optimum (InsertInvoice) using ONE article line.
-
-    - Uses client identifiers from our DB (company_code/vat_code/name).
-    - Sends ONE InvArticle with Qty=1 and UntPrice/ExtPrice = invoice.net_amount.
-    - VatTariff is sent as 0.21 (Optimum expects 21% as 0.21).
-
-    Returns dict: {"Status": "Success"|"Error", "Result": <str|None>, "Error": <str|None>}.
-    """
-    api_key = (getattr(settings, "OPTIMUM_API_KEY", None) or "").strip()
-    if not api_key:
-        return {"Status": "Error", "Result": None, "Error": "Nėra nustatytas OPTIMUM_API_KEY (settings/ENV)."}
-
-    client = invoice.client
-
-    # Optimum customer identification:
-    # - If you later add a dedicated field (e.g. client.optimum_code), swap it here.
-    cst_code = (getattr(client, "company_code", None) or "").strip() or (getattr(client, "vat_code", None) or "").strip()
-    cst_vat = (getattr(client, "vat_code", None) or "").strip()
-    cst_name = (getattr(client, "name", None) or "").strip()
-
-    if not cst_code and not cst_name:
-        return {"Status": "Error", "Result": None, "Error": f"Klientui {client!r} trūksta company_code/vat_code ir name."}
-
-    # Dates
-    inv_date = getattr(invoice, "issued_date", None) or timezone.localdate()
-
-    # Amounts
-    net_amount = (invoice.net_amount or Decimal("0.00")).quantize(Decimal("0.01"))
-    if net_amount <= Decimal("0.00"):
-        return {"Status": "Error", "Result": None, "Error": f"Sąskaitos {invoice.number} neto suma yra 0.00 – nėra ką eksportuoti."}
-
-    # VAT: Optimum expects 21% as 0.21
-    vat_tariff = Decimal("0.21")
-
-    str_fll_code = OPTIMUM_STR_FLL_CODE
-    if not str_fll_code:
-        return {"Status": "Error", "Result": None, "Error": "Nėra nustatytas OPTIMUM_STR_FLL_CODE (sandėlio kodas)."}
-
-    rsp_emp_code = OPTIMUM_EMP_CODE
-    if not rsp_emp_code:
-        return {"Status": "Error", "Result": None, "Error": "Nėra nustatytas OPTIMUM_EMP_CODE (RspEmpCode)."}
-
-    cst_grp = (getattr(client, "optimum_cst_group", None) or "K")
-    cst_grp = (str(cst_grp)).strip() or "K"
-
-    # Optimum DB pas tave turi FK į dbo.Transactions (fkInvoices01), todėl prieš InsertInvoice
-    # susikuriam Transaction ir jo ID perduodam į Invoice.TransactionId.
-    trn_no = f"TRN-{invoice.number}"
-    trn_resp = _optimum_insert_cmp_transaction(
-        api_key,
-        no=trn_no,
-        date_dt=datetime.now(),
-        notes=f"Auto transaction for invoice {invoice.number}",
-    )
-    if trn_resp.get("Status") != "Success" or not trn_resp.get("Result"):
-        return {"Status": "Error", "Result": None, "Error": f"Optimum Transaction nesukurtas: {trn_resp.get('Error')}"}
-
-    try:
-        transaction_id = int(str(trn_resp.get("Result")).strip())
-    except Exception:
-        return {"Status": "Error", "Result": None, "Error": f"Netinkamas TransactionId iš Optimum: {trn_resp.get('Result')}"}
-
-    # Build SOAP body XML (SOAP 1.1) and send
-    body_xml = f'''    <InsertInvoice xmlns="{OPTIMUM_NS}">
-      <invoice>
-        <Date>{inv_date.isoformat()}T00:00:00</Date>
-        <No>{_xml_escape(invoice.number)}</No>
-        <TransactionId>{transaction_id}</TransactionId>
-        <CstCompany>
-          <Code>{_xml_escape(cst_code)}</Code>
-          <VatCode>{_xml_escape(cst_vat)}</VatCode>
-          <Name>{_xml_escape(cst_name)}</Name>
-          <CstGrpFllCode>{_xml_escape(cst_grp)}</CstGrpFllCode>
-        </CstCompany>
-        <RspEmpCode>{_xml_escape(rsp_emp_code)}</RspEmpCode>
-        <Notes>{_xml_escape(description)}</Notes>
-        <Articles>
-          <InvArticle>
-            <ArtCode>PRIEZ</ArtCode>
-            <StrFllCode>{_xml_escape(str_fll_code)}</StrFllCode>
-            <Quantity>1</Quantity>
-            <UntPrice>{net_amount}</UntPrice>
-            <Discount>0</Discount>
-            <VatTariff>{vat_tariff}</VatTariff>
-            <ExtPrice>{net_amount}</ExtPrice>
-            <Notes>{_xml_escape(description)}</Notes>
-          </InvArticle>
-        </Articles>
-      </invoice>
-    </InsertInvoice>'''
-
-    try:
-        body = _optimum_request(
-            api_key=api_key,
-            soap_action="http://api.optimum.lt/v1/lt/Trd/InsertInvoice",
-            body_xml=body_xml,
-        )
-    except Exception as exc:
-        return {"Status": "Error", "Result": None, "Error": f"HTTP/SOAP klaida: {exc}"}
-
-    # Parse response
-    try:
-        root = ET.fromstring(body)
-        # Find InsertInvoiceResult node
-        ns = {
-            "soap": SOAPENV_NS,
-            "opt": OPTIMUM_NS,
-        }
-        res = root.find(".//opt:InsertInvoiceResult", ns)
-        if res is None:
-            return {"Status": "Error", "Result": None, "Error": "Nepavyko nuskaityti InsertInvoiceResult iš SOAP atsakymo."}
-
-        status = (res.findtext("opt:Status", default="", namespaces=ns) or "").strip()
-        result = (res.findtext("opt:Result", default="", namespaces=ns) or "").strip() or None
-        err = (res.findtext("opt:Error", default="", namespaces=ns) or "").strip() or None
-
-        # Normalize
-        if status.lower() == "success":
-            return {"Status": "Success", "Result": result, "Error": None}
-        return {"Status": "Error", "Result": result, "Error": err or "Nežinoma Optimum klaida."}
-    except Exception as exc:
-        return {"Status": "Error", "Result": None, "Error": f"SOAP parse klaida: {exc}"}
-
 class ClientEmailInline(admin.TabularInline):
     model = ClientEmail
     extra = 1
 
 
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("name", "company_code", "email", "active")
     search_fields = ("name", "company_code", "vat_code")
     list_filter = ("active",)
@@ -349,7 +52,7 @@ class SubscriptionAdmin(admin.ModelAdmin):
     search_fields = ("client__name", "title")
 
 @admin.register(WorkLog)
-class WorkLogAdmin(admin.ModelAdmin):
+class WorkLogAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ("client", "date", "description", "quantity", "unit_price", "total", "billed")
     list_filter = ("client", "billed", "date")
     search_fields = ("description",)
@@ -433,19 +136,14 @@ class WorkLogAdmin(admin.ModelAdmin):
                     id__in=[wl.id for wl in logs]
                 ).update(billed=True)
 
+                # Eksportas į Optimum – įrašas į outbox toje pačioje transakcijoje (siunčia drain_optimum_outbox)
+                OptimumExportTask.enqueue(invoice)
+
                 # --- Išsiųsti el. paštu (kaip mėnesinėse sąskaitose) ---
-                # Surenkam gavėjus: pagrindinis kliento email + papildomi iš ClientEmail
-                recipients = []
-                if getattr(client, "email", None):
-                    recipients.append(client.email)
-
-                extra_emails = list(
-                    ClientEmail.objects.filter(client=client)
-                    .values_list("email", flat=True)
-                )
-                for e in extra_emails:
-                    if e and e not in recipients:
-                        recipients.append(e)
+                # Surenkam gavėjus: pagrindinis kliento email + papildomi iš ClientEmail (BillingProfile cache)
+                from billing.services.profiles import get_profile
+
+                recipients = get_profile(client).all_recipients
 
                 # Jei nėra gavėjų – tik pranešam admin'e ir praleidžiam siuntimą
                 if not recipients:
@@ -456,7 +154,11 @@ class WorkLogAdmin(admin.ModelAdmin):
                     )
                 else:
                     # Sugeneruojam PDF (naudojam esamą projekto generatorių, jei yra)
-                    ensure_invoice_pdf(invoice)
+                    from billing.services.pdf import ensure_invoice_pdf
+                    from billing.services.ubl import ensure_invoice_ubl
+
+                    pdf = ensure_invoice_pdf(invoice)
+                    ubl = ensure_invoice_ubl(invoice)
 
                     subject = f"Sąskaita {invoice.number}"
                     body = (
@@ -475,42 +177,17 @@ class WorkLogAdmin(admin.ModelAdmin):
                         to=recipients,
                     )
 
-                    # Prisegam PDF jei yra (saugesnis variantas nei invoice.pdf.path)
-                    if getattr(invoice, "pdf", None) is not None and invoice.pdf:
-                        with invoice.pdf.open("rb") as f:
-                            msg.attach(f"{invoice.number}.pdf", f.read(), "application/pdf")
+                    # Prisegam tuos pačius atmintyje esančius PDF / UBL baitus (be skaitymo iš disko)
+                    pdf.attach_to(msg)
+                    ubl.attach_to(msg)
 
                     msg.send(fail_silently=False)
 
-                    # --- Eksportas į Optimum (viena eilutė) ---
-                    optimum_res = export_invoice_to_optimum_single_line(invoice)
-                    if optimum_res.get("Status") == "Success":
-                        self.message_user(
-                            request,
-                            f"✅ Optimum: sąskaita {invoice.number} įkelta (Result={optimum_res.get('Result')}).",
-                            level=messages.SUCCESS,
-                        )
-                    else:
-                        # Jei dubliuoja numerį – laikom kaip jau įkeltą (nekrentam)
-                        err = (optimum_res.get("Error") or "")
-                        if "duplicate" in err.lower() or "besidubliuoj" in err.lower():
-                            self.message_user(
-                                request,
-                                f"ℹ️ Optimum: sąskaita {invoice.number} jau egzistuoja (dubliuojasi numeris).",
-                                level=messages.INFO,
-                            )
-                        else:
-                            self.message_user(
-                                request,
-                                f"⚠️ Optimum: nepavyko įkelti {invoice.number}: {optimum_res.get('Error')}",
-                                level=messages.WARNING,
-                            )
-
                 created += 1
 
         self.message_user(
             request,
-            f"Sukurta sąskaitų: {created}",
+            f"Sukurta sąskaitų: {created} (eksportas į Optimum – įtraukta į eilę)",
             level=messages.SUCCESS
         )
 
@@ -530,13 +207,31 @@ class InvoiceAdmin(admin.ModelAdmin):
         "issued_date",
         "total_amount",
         "paid",
+        "optimum_status",
         "pdf_link",
         "run_monthly_btn",
     )
-    list_filter = ("invoice_type", "paid", "issued_date")
+    list_filter = ("invoice_type", "paid", "optimum_status", "issued_date")
     search_fields = ("number", "client__name")
     inlines = [InvoiceLineInline]
-    actions = ["export_selected_to_optimum"]
+    actions = [
+        "export_selected_to_optimum",
+        "export_for_accounting_csv",
+        "export_for_accounting_xlsx",
+        "download_pdf_zip",
+        "download_print_pdf",
+    ]
+    change_list_template = "admin/billing/invoice/change_list.html"
+
+    def get_search_results(self, request, queryset, search_term):
+        from billing.services.search import search
+
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        # Kliento pavadinimas – per paieškos indeksą (be JOIN ir LIKE '%...%' per billing_client)
+        clients = search(Client.objects.all(), search_term).values("pk")
+        return queryset.filter(Q(number__icontains=search_term) | Q(client_id__in=clients)), False
 
     def get_urls(self):
         urls = super().get_urls()
@@ -546,19 +241,57 @@ class InvoiceAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.run_monthly_view),
                 name="billing_invoice_run_monthly",
             ),
+            path(
+                "optimum-breaker-reset/",
+                self.admin_site.admin_view(self.optimum_breaker_reset_view),
+                name="billing_invoice_optimum_breaker_reset",
+            ),
         ]
         return custom_urls + urls
 
+    def changelist_view(self, request, extra_context=None):
+        from billing.services.optimum import optimum_breaker
+
+        state = optimum_breaker.state()
+        extra_context = {
+            **(extra_context or {}),
+            "optimum_breaker": {
+                "status": optimum_breaker.status(),
+                "failures": state["failures"],
+                "threshold": optimum_breaker.failure_threshold,
+                "opened_until": (
+                    datetime.fromtimestamp(state["opened_until"], tz=timezone.get_current_timezone())
+                    if state["opened_until"]
+                    else None
+                ),
+                "timeout": round(optimum_breaker.timeout(), 1),
+                "srtt_ms": round(state["srtt"] * 1000) if state["srtt"] is not None else None,
+                "rttvar_ms": round(state["rttvar"] * 1000) if state["rttvar"] is not None else None,
+                "last_latency_ms": round(state["last_latency"] * 1000) if state["last_latency"] is not None else None,
+                "calls": state["calls"],
+                "errors": state["errors"],
+                "last_error": state["last_error"],
+            },
+        }
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def optimum_breaker_reset_view(self, request):
+        """Rankiniu būdu uždaro Optimum grandinę (pvz. kai žinoma, kad Optimum vėl veikia)."""
+        from billing.services.optimum import optimum_breaker
+
+        if request.method == "POST":
+            optimum_breaker.reset()
+            self.message_user(request, "✅ Optimum grandinė uždaryta, statistika išvalyta.", level=messages.SUCCESS)
+        return redirect("admin:billing_invoice_changelist")
+
     def run_monthly_view(self, request):
         """Run monthly invoice generation using the management command."""
         try:
             # Uses the command's default behavior (on the 1st generates for previous month).
-            call_command("generate_monthly_invoices")
-            # Best-effort: po sugeneravimo pabandom eksportuoti šiandien sukurtas mėnesines sąskaitas.
-            today = timezone.localdate()
-            latest = Invoice.objects.filter(invoice_type="monthly", issued_date=today).order_by("-id")[:200]
-            for inv in latest:
-                export_invoice_to_optimum_single_line(inv)
+            # Optimum eksportas – šio run'o sąskaitos įtraukiamos į outbox (siunčia drain_optimum_outbox).
+            # Nuoroda – GET, bet generavimas skaito tik iš pagrindinės DB (ne replikos)
+            with use_primary():
+                call_command("generate_monthly_invoices", export_optimum=True)
             self.message_user(request, "✅ Mėnesinių sąskaitų generavimas paleistas ir įvykdytas.", level=messages.SUCCESS)
         except Exception as exc:
             self.message_user(request, f"❌ Nepavyko sugeneruoti mėnesinių sąskaitų: {exc}", level=messages.ERROR)
@@ -572,30 +305,122 @@ class InvoiceAdmin(admin.ModelAdmin):
 
     def pdf_link(self, obj):
         if obj.pdf:
-            return format_html('<a href="{}" target="_blank">PDF</a>', obj.pdf.url)
+            # Pasirašyta, ribotą laiką galiojanti nuoroda (ne tiesioginis /media/ kelias)
+            return format_html('<a href="{}" target="_blank">PDF</a>', invoice_pdf_url(obj))
         return "-"
 
     pdf_link.short_description = "PDF"
 
     @admin.action(description="Eksportuoti pažymėtas sąskaitas į Optimum (1 eilutė)")
     def export_selected_to_optimum(self, request, queryset):
-        ok = 0
-        already = 0
-        failed = 0
-
-        for inv in queryset.select_related("client"):
-            res = export_invoice_to_optimum_single_line(inv)
-            if res.get("Status") == "Success":
-                ok += 1
-            else:
-                err = (res.get("Error") or "")
-                if "duplicate" in err.lower() or "besidubliuoj" in err.lower():
-                    already += 1
-                else:
-                    failed += 1
+        # Tik įtraukiam į outbox – SOAP kvietimus atlieka drain_optimum_outbox, todėl admin nelaukia
+        # Optimum ir ta pati sąskaita nesiunčiama dviem procesais vienu metu.
+        queued = 0
+        with transaction.atomic():
+            for inv in queryset:
+                OptimumExportTask.enqueue(inv, requeue=True)
+                queued += 1
 
         self.message_user(
             request,
-            f"Optimum eksportas baigtas: OK={ok}, jau buvo={already}, klaidų={failed}.",
-            level=messages.SUCCESS if failed == 0 else messages.WARNING,
-        )
\ No newline at end of file
+            f"Įtraukta į Optimum eksporto eilę: {queued}. Siunčia `manage.py drain_optimum_outbox`.",
+            level=messages.SUCCESS,
+        )
+
+    @admin.action(description="Buhalterijai: CSV (sąskaitos su eilutėmis)")
+    def export_for_accounting_csv(self, request, queryset):
+        from billing.services.accounting_export import iter_csv, iter_rows
+
+        # Eksportas skaito iš replikos (jei sukonfigūruota) – neapkrauna pagrindinės DB
+        rows = iter_rows(queryset.using(reporting_db()))
+        response = StreamingHttpResponse(iter_csv(rows), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="saskaitos-{timezone.localdate():%Y%m%d}.csv"'
+        return response
+
+    @admin.action(description="Buhalterijai: XLSX (sąskaitos su eilutėmis)")
+    def export_for_accounting_xlsx(self, request, queryset):
+        from billing.services.accounting_export import iter_rows, write_xlsx
+
+        # XLSX yra ZIP – jį reikia baigti prieš siunčiant; rašom į laikiną failą diske, ne į atmintį
+        tmp = tempfile.TemporaryFile()
+        write_xlsx(iter_rows(queryset.using(reporting_db())), tmp)
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=f"saskaitos-{timezone.localdate():%Y%m%d}.xlsx",
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    @admin.action(description="Archyvas: pažymėtų sąskaitų PDF (ZIP)")
+    def download_pdf_zip(self, request, queryset):
+        from billing.services.archive import iter_zip
+
+        # ZIP siunčiamas srautu – archyvas visas atmintyje nelaikomas
+        response = StreamingHttpResponse(iter_zip(queryset.using(reporting_db())), content_type="application/zip")
+        response["Content-Disposition"] = f'attachment; filename="saskaitos-{timezone.localdate():%Y%m%d}.zip"'
+        return response
+
+    @admin.action(description="Spausdinimui: pažymėtos sąskaitos viename PDF")
+    def download_print_pdf(self, request, queryset):
+        from billing.services.archive import write_print_pdf
+
+        tmp = tempfile.TemporaryFile()
+        write_print_pdf(tmp, queryset.using(reporting_db()))
+        tmp.seek(0)
+        return FileResponse(
+            tmp,
+            as_attachment=True,
+            filename=f"saskaitos-spausdinimui-{timezone.localdate():%Y%m%d}.pdf",
+            content_type="application/pdf",
+        )
+
+
+@admin.register(BillingJob)
+class BillingJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "attempts", "created_at", "started_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("attempts", "created_at", "started_at", "finished_at", "error")
+
+
+@admin.register(OptimumExportTask)
+class OptimumExportTaskAdmin(admin.ModelAdmin):
+    list_display = ("id", "invoice", "status", "attempts", "available_at", "finished_at", "last_error")
+    list_filter = ("status",)
+    search_fields = ("invoice__number",)
+    raw_id_fields = ("invoice",)
+    readonly_fields = ("attempts", "created_at", "started_at", "finished_at", "last_error")
+    actions = ["requeue_selected"]
+
+    @admin.action(description="Grąžinti į eilę")
+    def requeue_selected(self, request, queryset):
+        updated = queryset.exclude(status="running").update(
+            status="pending", attempts=0, available_at=timezone.now(), last_error=""
+        )
+        self.message_user(request, f"Grąžinta į eilę: {updated}", level=messages.SUCCESS)
+
+
+class BillingRunItemInline(admin.TabularInline):
+    model = BillingRunItem
+    extra = 0
+    can_delete = False
+    fields = (
+        "client",
+        "invoice",
+        "skipped",
+        "done",
+        "invoice_created_at",
+        "pdf_rendered_at",
+        "emailed_at",
+        "exported_at",
+        "last_error",
+    )
+    readonly_fields = fields
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "period_from", "period_to", "issued_date", "shard", "status", "started_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = ("started_at", "finished_at")
+    inlines = [BillingRunItemInline]
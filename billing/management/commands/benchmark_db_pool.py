@@ -0,0 +1,65 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Palygina užklausos „pridėtinį“ DB laiką be pool'o (naujas prisijungimas kiekvienai užklausai) "
+        "ir su config.mysql_pool: prisijungimas → N × SELECT 1 → close(), kaip su CONN_MAX_AGE = 0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="DATABASES alias (default: default).")
+        parser.add_argument("--requests", type=int, default=100, help="Kiek „užklausų“ kiekvienu režimu (default: 100).")
+        parser.add_argument("--queries", type=int, default=1, help="Kiek SELECT 1 vienoje užklausoje (default: 1).")
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        if connections[alias].vendor != "mysql":
+            raise CommandError(f"'{alias}' nėra MySQL – pool'as skirtas tik MySQL.")
+
+        base = copy.deepcopy(connections[alias].settings_dict)
+        base["CONN_MAX_AGE"] = 0
+
+        plain = copy.deepcopy(base)
+        plain["ENGINE"] = "django.db.backends.mysql"
+        plain["OPTIONS"].pop("pool", None)
+
+        pooled = copy.deepcopy(base)
+        pooled["ENGINE"] = "config.mysql_pool"
+        pooled["OPTIONS"].setdefault("pool", {})
+
+        results = {}
+        for label, settings_dict in (("be pool'o", plain), ("su pool'u", pooled)):
+            wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(settings_dict, alias=f"{alias}-benchmark-{len(results)}")
+            results[label] = self.measure(wrapper, max(1, options["requests"]), max(1, options["queries"]))
+            if hasattr(wrapper, "pool"):
+                self.stdout.write(f"  pool'o statistika: {wrapper.pool.stats}")
+                wrapper.pool.close_all()
+
+        for label, timings in results.items():
+            ms = sorted(t * 1000 for t in timings)
+            self.stdout.write(
+                f"{label:>10}: vid. {statistics.mean(ms):.1f} ms, p50 {ms[len(ms) // 2]:.1f} ms, "
+                f"p95 {ms[int(len(ms) * 0.95) - 1]:.1f} ms, max {ms[-1]:.1f} ms"
+            )
+        plain_ms, pooled_ms = (statistics.mean(t) * 1000 for t in results.values())
+        self.stdout.write(self.style.SUCCESS(f"Sutaupoma {plain_ms - pooled_ms:.1f} ms užklausai ({plain_ms / pooled_ms:.1f}×)"))
+
+    @staticmethod
+    def measure(wrapper, requests: int, queries: int) -> list[float]:
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            with wrapper.cursor() as cursor:
+                for _q in range(queries):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            wrapper.close()
+            timings.append(time.perf_counter() - started)
+        return timings
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.services.pdf_benchmark import BASELINE_PATH, CASES, DEFAULT_TOLERANCE
+
+
+class Command(BaseCommand):
+    help = (
+        "Matuoja sąskaitų PDF generavimą sintetinėmis sąskaitomis (1, 20, 500, 5000 eilučių, ilgi lietuviški "
+        "tekstai): PDF/s, didžiausia atmintis, failo dydis. Lygina su bazinėmis reikšmėmis ir PDF tekstu – "
+        "regresija baigiasi klaida."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--case", action="append", choices=list(CASES), help="Tik šie atvejai (galima kartoti).")
+        parser.add_argument("--min-time", type=float, default=1.0, help="Kiek sekundžių matuoti kiekvieną atvejį (default: 1).")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=DEFAULT_TOLERANCE,
+            help=f"Leidžiamas nuokrypis nuo bazinių reikšmių, dalimis (default: {DEFAULT_TOLERANCE}).",
+        )
+        parser.add_argument("--no-speed", action="store_true", help="Nelyginti greičio (kita mašina / CI).")
+        parser.add_argument("--no-memory", action="store_true", help="Nematuoti atminties (tracemalloc lėtas).")
+        parser.add_argument("--baseline", type=str, default=str(BASELINE_PATH), help="Bazinių reikšmių JSON failas.")
+        parser.add_argument("--update-baseline", action="store_true", help="Įrašyti rezultatus kaip naujas bazines reikšmes.")
+        parser.add_argument("--dump-text", type=str, help="Katalogas, į kurį įrašyti ištrauktą PDF tekstą (palyginimui).")
+
+    def handle(self, *args, **options):
+        from billing.services.pdf_benchmark import compare, load_baseline, run, save_baseline
+
+        try:
+            results = run(options["case"], min_time=max(0.0, options["min_time"]), memory=not options["no_memory"])
+        except ImportError as exc:
+            raise CommandError(f"PDF tekstui ištraukti reikia pypdf (pip install pypdf): {exc}")
+
+        baseline_path = Path(options["baseline"])
+        stored = load_baseline(baseline_path)
+        baseline = stored.get("cases", {})
+
+        from reportlab import Version as reportlab_version
+
+        recorded_with = stored.get("environment", {}).get("reportlab")
+        if recorded_with and recorded_with != reportlab_version and not options["update_baseline"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Bazinės reikšmės įrašytos su reportlab {recorded_with}, įdiegta {reportlab_version} "
+                    "(žr. requirements.txt) – dydžio / greičio palyginimas gali būti netikslus."
+                )
+            )
+
+        self.stdout.write(f"{'Atvejis':<16} {'PDF/s':>9} {'bazinė':>9} {'atm. KB':>9} {'dydis KB':>9} {'psl.':>5}")
+        for name, result in results.items():
+            expected = baseline.get(name, {})
+            self.stdout.write(
+                f"{name:<16} {result['renders_per_s']:>9.2f} {expected.get('renders_per_s', '-'):>9} "
+                f"{result.get('peak_kb', '-'):>9} {result['size_bytes'] // 1024:>9} {result['pages']:>5}"
+            )
+
+        if options["dump_text"]:
+            directory = Path(options["dump_text"])
+            directory.mkdir(parents=True, exist_ok=True)
+            for name, result in results.items():
+                (directory / f"{name}.txt").write_text(result["text"], encoding="utf-8")
+
+        if options["update_baseline"]:
+            save_baseline(results, baseline_path)
+            self.stdout.write(self.style.SUCCESS(f"Bazinės reikšmės įrašytos ✅ {baseline_path}"))
+            return
+
+        problems = compare(
+            results,
+            {"cases": baseline},
+            tolerance=max(0.0, options["tolerance"]),
+            speed=not options["no_speed"],
+        )
+        if problems:
+            raise CommandError("PDF regresija:\n  " + "\n  ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Atitinka bazines reikšmes ✅"))
@@ -0,0 +1,231 @@
+import json
+import signal
+import smtplib
+import time
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from billing.models import BillingJob, Invoice, OptimumExportTask
+
+# „running“ darbas, kurio worker'is nebaigė per tiek laiko (procesas nukrito / buvo nužudytas), vėl paimamas.
+# Mėnesinis generavimas kartojamas saugiai (BillingRun žingsniai, advisory_lock kiekvienam klientui).
+STALE_RUNNING_AFTER = timedelta(hours=2)
+# Po tiek paėmimų nutrūkęs darbas nebekartojamas – pažymimas „failed“
+MAX_ATTEMPTS = 3
+
+
+class Command(BaseCommand):
+    """
+    Ilgai veikiantis billing procesas.
+
+    Vietoje to, kad cron kiekvienam darbui paleistų naują `manage.py` procesą (Django setup,
+    reportlab šriftai, naujas MySQL ir SMTP/TLS prisijungimas), worker'is viską tai laiko „šiltą“
+    ir vykdo darbus iš DB eilės (BillingJob).
+
+    Darbų įdėjimas į eilę (pvz. iš cron):
+        python manage.py billing_worker --enqueue monthly --payload '{"month": "2026-01"}'
+        python manage.py billing_worker --enqueue hosting
+        python manage.py billing_worker --enqueue pdf --payload '{"number": "MEV26-001"}'
+        python manage.py billing_worker --enqueue optimum --payload '{"numbers": ["MEV26-001"]}'
+    """
+
+    help = "Ilgai veikiantis billing worker'is: vykdo BillingJob eilės darbus su šiltais DB/SMTP/PDF resursais."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Kas kiek sekundžių tikrinti eilę, kai ji tuščia (default: 1).",
+        )
+        parser.add_argument(
+            "--smtp-idle",
+            type=float,
+            default=60.0,
+            help="Po kiek sekundžių be darbų uždaryti SMTP prisijungimą (default: 60).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Įvykdyti visus laukiančius darbus ir baigti (testams / cron).",
+        )
+        parser.add_argument(
+            "--enqueue",
+            choices=[kind for kind, _label in BillingJob.KIND_CHOICES],
+            help="Tik įdėti darbą į eilę ir baigti (worker'is jo nevykdo).",
+        )
+        parser.add_argument(
+            "--payload",
+            type=str,
+            default="{}",
+            help="Darbo parametrai JSON formatu (naudojama su --enqueue).",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("enqueue"):
+            try:
+                payload = json.loads(options.get("payload") or "{}")
+            except ValueError as exc:
+                raise CommandError(f"Netinkamas --payload JSON: {exc}")
+            job = BillingJob.enqueue(options["enqueue"], **payload)
+            self.stdout.write(self.style.SUCCESS(f"Įdėta į eilę: {job}"))
+            return
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.mail_connection = get_connection()
+        self._warm_up()
+
+        poll_interval = float(options.get("poll_interval") or 1.0)
+        smtp_idle = float(options.get("smtp_idle") or 60.0)
+        idle_since = time.monotonic()
+
+        self.stdout.write(self.style.SUCCESS("billing_worker paleistas – laukiu darbų..."))
+
+        while not self._stopping:
+            job = self._claim_next_job()
+            if job is None:
+                if options.get("once"):
+                    break
+                if time.monotonic() - idle_since > smtp_idle:
+                    self.mail_connection.close()
+                time.sleep(poll_interval)
+                continue
+
+            self._run_job(job)
+            idle_since = time.monotonic()
+
+        self.mail_connection.close()
+        self.stdout.write(self.style.SUCCESS("billing_worker sustabdytas ✅"))
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    # -------------------------
+    # Warm resources
+    # -------------------------
+
+    def _warm_up(self) -> None:
+        """Iš anksto užkraunam reportlab + šriftus ir atidarom DB prisijungimą."""
+        from billing.services.pdf import _ensure_fonts
+
+        _ensure_fonts()
+        connection.ensure_connection()
+
+    def _ensure_db(self) -> None:
+        # Po ilgo laukimo MySQL gali būti uždaręs prisijungimą (wait_timeout) – tada atsidarom naują.
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+    def _ensure_smtp(self) -> None:
+        """Laikom vieną SMTP/TLS sesiją tarp darbų; jei serveris ją nutraukė – atsidarom iš naujo."""
+        smtp = getattr(self.mail_connection, "connection", None)
+        if smtp is not None:
+            try:
+                alive = smtp.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                alive = False
+            if not alive:
+                self.mail_connection.close()
+        self.mail_connection.open()
+
+    # -------------------------
+    # Queue
+    # -------------------------
+
+    def _claim_next_job(self) -> BillingJob | None:
+        """Laukiantis darbas arba nutrūkęs „running“ (senesnis nei STALE_RUNNING_AFTER), kaip outbox.claim_tasks."""
+        self._ensure_db()
+        while True:
+            now = timezone.now()
+            with transaction.atomic():
+                job = (
+                    BillingJob.objects.select_for_update(skip_locked=True)
+                    .filter(Q(status="pending") | Q(status="running", started_at__lt=now - STALE_RUNNING_AFTER))
+                    .order_by("id")
+                    .first()
+                )
+                if job is None:
+                    return None
+                if job.attempts >= MAX_ATTEMPTS:
+                    BillingJob.objects.filter(pk=job.pk).update(
+                        status="failed",
+                        finished_at=now,
+                        error=f"Darbas nutrūko {job.attempts} kartus – nebekartojama.",
+                    )
+                    self.stdout.write(self.style.ERROR(f"❌ #{job.pk}: nutrūko {job.attempts} kartus"))
+                    continue
+                BillingJob.objects.filter(pk=job.pk).update(status="running", started_at=now, attempts=F("attempts") + 1)
+            job.refresh_from_db()
+            return job
+
+    def _run_job(self, job: BillingJob) -> None:
+        handler = getattr(self, f"_job_{job.kind}", None)
+        self.stdout.write(f"▶️ Vykdau {job}")
+        try:
+            if handler is None:
+                raise CommandError(f"Nežinomas darbo tipas: {job.kind}")
+            handler(**(job.payload or {}))
+        except Exception as exc:
+            if isinstance(exc, DatabaseError):
+                connection.close()
+            job.status = "failed"
+            job.error = f"{type(exc).__name__}: {exc}"
+            self.stdout.write(self.style.ERROR(f"❌ {job}: {job.error}"))
+        else:
+            job.status = "done"
+            job.error = ""
+            self.stdout.write(self.style.SUCCESS(f"✅ {job}"))
+
+        job.finished_at = timezone.now()
+        self._ensure_db()
+        job.save(update_fields=["status", "error", "finished_at"])
+
+    # -------------------------
+    # Job handlers
+    # -------------------------
+
+    def _job_monthly(self, **payload) -> None:
+        from billing.management.commands.generate_monthly_invoices import Command as MonthlyInvoicesCommand
+
+        self._ensure_smtp()
+        cmd = MonthlyInvoicesCommand(stdout=self.stdout, stderr=self.stderr)
+        cmd.mail_connection = self.mail_connection
+        call_command(cmd, **payload)
+
+    def _job_hosting(self, **payload) -> None:
+        from billing.management.commands.check_subscription import Command as CheckSubscriptionCommand
+
+        self._ensure_smtp()
+        cmd = CheckSubscriptionCommand(stdout=self.stdout, stderr=self.stderr)
+        cmd.mail_connection = self.mail_connection
+        call_command(cmd, **payload)
+
+    def _job_pdf(self, **payload) -> None:
+        from billing.management.commands.generate_invoice_pdf import Command as GenerateInvoicePdfCommand
+
+        call_command(GenerateInvoicePdfCommand(stdout=self.stdout, stderr=self.stderr), **payload)
+
+    def _job_optimum(self, *, numbers) -> None:
+        from billing.services.outbox import drain_optimum_outbox
+
+        # Per outbox: jei tą pačią sąskaitą jau siunčia drain_optimum_outbox, ji čia nepaimama (SKIP LOCKED)
+        invoices = list(Invoice.objects.filter(number__in=numbers))
+        with transaction.atomic():
+            for inv in invoices:
+                OptimumExportTask.enqueue(inv, requeue=True)
+
+        report = drain_optimum_outbox(batch_size=max(1, len(invoices)), invoice_ids=[inv.pk for inv in invoices])
+        if report.exported < len(invoices):
+            raise CommandError(
+                f"Optimum eksportas: eksportuota {report.exported} iš {len(invoices)} "
+                f"(atidėta {report.deferred}, kartos vėliau {report.retry}, nepavyko {report.failed})"
+            )
@@ -4,6 +4,8 @@ from datetime import date
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
 # Pernaudojam jau turimą logiką iš mėnesinių sąskaitų komandos
@@ -125,6 +127,7 @@ class Command(MonthlyInvoicesCommand):
             .first()
         )
 
+    @transaction.atomic
     def _create_hosting_invoice(self, sub: Subscription, issued_date: date) -> Invoice:
         """
         Sukuria invoice + 1 eilutę už hosting metams (be PVM/PVM/total logiką paliekam tavo esamai
@@ -180,11 +183,13 @@ class Command(MonthlyInvoicesCommand):
         2) Išsiunčiam el. laišką (jei turi tam metodą)
         """
         # 1) PDF
-        # Dažniausi metodų pavadinimai – bandome kelis.
+        # Dažniausi metodų pavadinimai – bandome kelis. generate_pdf_for_invoice grąžina RenderedPdf –
+        # tie patys baitai prisegami laiške (PDF iš storage atgal neskaitomas).
+        pdf = None
         for pdf_method_name in ("generate_pdf_for_invoice", "generate_invoice_pdf", "create_invoice_pdf"):
             pdf_method = getattr(self, pdf_method_name, None)
             if callable(pdf_method):
-                pdf_method(invoice)
+                pdf = pdf_method(invoice)
                 break
 
         # 2) Email
@@ -192,6 +197,10 @@ class Command(MonthlyInvoicesCommand):
         email_method = getattr(self, "send_invoice_email", None)
         if callable(email_method):
             if is_reminder:
-                email_method(invoice, subject_prefix="PRIMINIMAS: ")
+                email_method(invoice, pdf=pdf, subject_prefix="PRIMINIMAS: ")
+                now = timezone.now()
+                Invoice.objects.filter(pk=invoice.pk).update(
+                    reminder_count=F("reminder_count") + 1, last_reminder_at=now, updated_at=now
+                )
             else:
-                email_method(invoice)
+                email_method(invoice, pdf=pdf)
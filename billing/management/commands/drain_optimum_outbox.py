@@ -0,0 +1,67 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from billing.services.outbox import DEFAULT_BATCH_SIZE, drain_optimum_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Siunčia į Optimum laukiančias eksporto užduotis (OptimumExportTask) paketais. "
+        "Kelis procesus galima leisti lygiagrečiai – užduotys paimamos su SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Kiek užduočių paimti vienu kartu (default: {DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Neišeiti, kai eilė tuščia – laukti naujų užduočių.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Kas kiek sekundžių tikrinti tuščią eilę su --loop (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        batch_size = max(1, options["batch_size"])
+        totals = {"exported": 0, "deferred": 0, "retry": 0, "failed": 0}
+
+        while not self._stopping:
+            report = drain_optimum_outbox(batch_size)
+            for key in totals:
+                totals[key] += getattr(report, key)
+
+            if report.total:
+                self.stdout.write(
+                    f"Paketas: eksportuota {report.exported}, atidėta {report.deferred}, "
+                    f"kartos vėliau {report.retry}, nepavyko {report.failed}"
+                )
+
+            # Tuščia eilė arba Optimum nepasiekiamas – nėra prasmės iškart imti kito paketo
+            if report.total == 0 or report.deferred:
+                if not options["loop"]:
+                    break
+                time.sleep(options["poll_interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Optimum eilė apdorota ✅ eksportuota {totals['exported']}, atidėta {totals['deferred']}, "
+                f"kartos vėliau {totals['retry']}, nepavyko {totals['failed']}"
+            )
+        )
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
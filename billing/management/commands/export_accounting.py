@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.models import Invoice
+from billing.services.accounting_export import DEFAULT_CHUNK_SIZE
+from config.db_router import reporting_db
+
+
+class Command(BaseCommand):
+    help = (
+        "Eksportuoja laikotarpio sąskaitas su eilutėmis (suma be PVM, PVM, su PVM) buhalterijai – "
+        "CSV arba XLSX. Eilutės skaitomos paketais, todėl ir metų istorija neužkraunama į atmintį."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", type=str, help="Mėnuo YYYY-MM.")
+        parser.add_argument("--year", type=int, help="Visi metai (vietoje --month).")
+        parser.add_argument("--from", dest="date_from", type=str, help="Išrašymo data nuo YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", type=str, help="Išrašymo data iki YYYY-MM-DD (default: šiandien).")
+        parser.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="Failo formatas (default: csv).")
+        parser.add_argument("-o", "--output", type=str, help="Failas. CSV be --output rašomas į stdout.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Kiek sąskaitų skaityti vienu paketu (default: {DEFAULT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        from billing.services.accounting_export import iter_csv, iter_rows, write_xlsx
+
+        date_from, date_to = self.resolve_period(options)
+        # Ataskaita skaito iš replikos (jei sukonfigūruota) – neapkrauna pagrindinės DB
+        rows = iter_rows(
+            Invoice.objects.using(reporting_db()).filter(issued_date__range=(date_from, date_to)),
+            chunk_size=max(1, options["chunk_size"]),
+        )
+
+        if options["format"] == "xlsx":
+            if not options["output"]:
+                raise CommandError("XLSX formatui reikia --output failo.")
+            try:
+                write_xlsx(rows, options["output"])
+            except ImportError:
+                raise CommandError("XLSX eksportui reikia openpyxl (pip install openpyxl).")
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                f.writelines(iter_csv(rows))
+        else:
+            for chunk in iter_csv(rows):
+                self.stdout.write(chunk, ending="")
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Eksportuota ✅ {date_from}–{date_to} → {options['output']}"))
+
+    @staticmethod
+    def resolve_period(options) -> tuple[date, date]:
+        try:
+            if options.get("year"):
+                return date(options["year"], 1, 1), date(options["year"], 12, 31)
+            if options.get("month"):
+                year, month = map(int, options["month"].split("-"))
+                return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+            if not options.get("date_from"):
+                raise CommandError("Nurodykit --month, --year arba --from (ir --to).")
+            date_from = date.fromisoformat(options["date_from"])
+            date_to = date.fromisoformat(options["date_to"]) if options.get("date_to") else timezone.localdate()
+        except ValueError as exc:
+            raise CommandError(f"Netinkama data: {exc}")
+        if date_from > date_to:
+            raise CommandError("--from negali būti vėlesnė už --to.")
+        return date_from, date_to
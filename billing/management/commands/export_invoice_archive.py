@@ -0,0 +1,94 @@
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.models import Invoice
+from billing.services.archive import DEFAULT_CHUNK_SIZE
+from config.db_router import reporting_db
+
+
+class Command(BaseCommand):
+    help = (
+        "Laikotarpio sąskaitų archyvas: ZIP su visais PDF (buhalterijai) arba vienas sunumeruotų "
+        "puslapių PDF spausdinimui. Sąskaitos skaitomos paketais, abu formatai rašomi srautu."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", type=str, help="Mėnuo YYYY-MM (default: praėjęs mėnuo).")
+        parser.add_argument("--from", dest="date_from", type=str, help="Išrašymo data nuo YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", type=str, help="Išrašymo data iki YYYY-MM-DD (default: šiandien).")
+        parser.add_argument(
+            "--format",
+            choices=["zip", "print"],
+            default="zip",
+            help="zip – visi PDF viename ZIP; print – įrašyti PDF sujungti į vieną spausdinimui (default: zip).",
+        )
+        parser.add_argument("--type", dest="invoice_type", type=str, help="Tik šio tipo sąskaitos (monthly, hosting, ...).")
+        parser.add_argument("-o", "--output", type=str, help="Failas (default: saskaitos-<nuo>-<iki>.zip/.pdf).")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Kiek sąskaitų skaityti vienu paketu (default: {DEFAULT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        from billing.services.archive import iter_zip, write_print_pdf
+
+        date_from, date_to = self.resolve_period(options)
+        # Archyvas skaito iš replikos (jei sukonfigūruota) – neapkrauna pagrindinės DB
+        invoices = Invoice.objects.using(reporting_db()).filter(issued_date__range=(date_from, date_to))
+        if options["invoice_type"]:
+            invoices = invoices.filter(invoice_type=options["invoice_type"])
+        if not invoices.exists():
+            raise CommandError(f"Sąskaitų už {date_from}–{date_to} nėra.")
+
+        suffix = ".zip" if options["format"] == "zip" else ".pdf"
+        output = Path(options["output"] or f"saskaitos-{date_from:%Y%m%d}-{date_to:%Y%m%d}{suffix}")
+        chunk_size = max(1, options["chunk_size"])
+
+        # Rašom į laikiną failą šalia – nepavykus senas archyvas lieka nepaliestas
+        fd, tmp_path = tempfile.mkstemp(prefix=".archive-", suffix=suffix, dir=output.resolve().parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if options["format"] == "zip":
+                    for chunk in iter_zip(invoices, chunk_size=chunk_size):
+                        f.write(chunk)
+                    summary = f"sąskaitų {invoices.count()}"
+                else:
+                    try:
+                        count, pages = write_print_pdf(f, invoices, chunk_size=chunk_size)
+                    except ImportError as exc:
+                        raise CommandError(f"Spausdinimo PDF sujungti reikia pypdf (pip install pypdf): {exc}")
+                    summary = f"sąskaitų {count}, puslapių {pages}"
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, output)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        self.stdout.write(self.style.SUCCESS(f"Archyvas ✅ {date_from}–{date_to}: {summary} → {output}"))
+
+    @staticmethod
+    def resolve_period(options) -> tuple[date, date]:
+        try:
+            if options.get("date_from"):
+                date_from = date.fromisoformat(options["date_from"])
+                date_to = date.fromisoformat(options["date_to"]) if options.get("date_to") else timezone.localdate()
+            else:
+                if options.get("month"):
+                    year, month = map(int, options["month"].split("-"))
+                else:
+                    prev = timezone.localdate().replace(day=1) - timedelta(days=1)
+                    year, month = prev.year, prev.month
+                date_from = date(year, month, 1)
+                date_to = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        except ValueError as exc:
+            raise CommandError(f"Netinkama data: {exc}")
+        if date_from > date_to:
+            raise CommandError("--from negali būti vėlesnė už --to.")
+        return date_from, date_to
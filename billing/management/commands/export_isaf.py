@@ -0,0 +1,84 @@
+import os
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from billing.services.isaf import DEFAULT_CHUNK_SIZE
+from config.db_router import use_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Sugeneruoja VMI i.SAF išrašytų sąskaitų registrą (XML) už laikotarpį ir patikrina jį pagal XSD. "
+        "XML rašomas srautu, todėl atmintis nepriklauso nuo sąskaitų kiekio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", type=str, help="Mėnuo YYYY-MM (default: praėjęs mėnuo).")
+        parser.add_argument("--from", dest="date_from", type=str, help="Laikotarpio pradžia YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", type=str, help="Laikotarpio pabaiga YYYY-MM-DD.")
+        parser.add_argument("-o", "--output", type=str, help="Failas (default: isaf-<nuo>-<iki>.xml).")
+        parser.add_argument("--xsd", type=str, help="i.SAF XSD kelias (default: settings.ISAF_XSD_PATH).")
+        parser.add_argument("--no-validate", action="store_true", help="Netikrinti pagal XSD.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Kiek sąskaitų skaityti vienu paketu (default: {DEFAULT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        from lxml import etree
+
+        from billing.services.isaf import IsafError, validate_isaf, write_isaf
+
+        date_from, date_to = self.resolve_period(options)
+        output = Path(options["output"] or f"isaf-{date_from:%Y%m%d}-{date_to:%Y%m%d}.xml")
+        xsd = options["xsd"] or getattr(settings, "ISAF_XSD_PATH", "")
+        if not options["no_validate"] and not xsd:
+            raise CommandError("Nurodykit --xsd (arba ISAF_XSD_PATH), arba --no-validate.")
+
+        # Rašom į laikiną failą šalia – nepavykus ar neatitikus XSD, senas failas lieka nepaliestas
+        fd, tmp_path = tempfile.mkstemp(prefix=".isaf-", suffix=".xml", dir=output.resolve().parent)
+        try:
+            # Registras skaitomas iš replikos (jei sukonfigūruota)
+            with os.fdopen(fd, "wb") as f, use_replica():
+                count = write_isaf(f, date_from, date_to, chunk_size=max(1, options["chunk_size"]))
+            if not options["no_validate"]:
+                validate_isaf(tmp_path, xsd)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, output)
+        except IsafError as exc:
+            raise CommandError(str(exc))
+        except etree.XMLSyntaxError as exc:
+            raise CommandError(f"i.SAF neatitinka XSD: {exc}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        checked = "" if options["no_validate"] else ", atitinka XSD"
+        self.stdout.write(self.style.SUCCESS(f"i.SAF ✅ {date_from}–{date_to}: sąskaitų {count}{checked} → {output}"))
+
+    @staticmethod
+    def resolve_period(options) -> tuple[date, date]:
+        try:
+            if options.get("date_from"):
+                date_from = date.fromisoformat(options["date_from"])
+                date_to = date.fromisoformat(options["date_to"]) if options.get("date_to") else timezone.localdate()
+            else:
+                if options.get("month"):
+                    year, month = map(int, options["month"].split("-"))
+                else:
+                    prev = timezone.localdate().replace(day=1) - timedelta(days=1)
+                    year, month = prev.year, prev.month
+                date_from = date(year, month, 1)
+                date_to = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        except ValueError as exc:
+            raise CommandError(f"Netinkama data: {exc}")
+        if date_from > date_to:
+            raise CommandError("--from negali būti vėlesnė už --to.")
+        return date_from, date_to
@@ -2,7 +2,6 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 from billing.models import Invoice
-from billing.services.pdf import generate_invoice_pdf
 
 
 class Command(BaseCommand):
@@ -13,6 +12,8 @@ class Command(BaseCommand):
 
     @transaction.atomic
     def handle(self, *args, **options):
+        from billing.services.pdf import RenderedPdf
+
         number = options.get("number")
 
         if number:
@@ -24,8 +25,7 @@ class Command(BaseCommand):
 
         count = 0
         for inv in invoices:
-            pdf_file = generate_invoice_pdf(inv)
-            inv.pdf.save(pdf_file.name, pdf_file, save=True)
+            RenderedPdf.render(inv).save()
             count += 1
 
         self.stdout.write(self.style.SUCCESS(f"PDF sugeneruota: {count}"))
\ No newline at end of file
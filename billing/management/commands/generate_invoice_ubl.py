@@ -0,0 +1,79 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from billing.models import BillingRun, Invoice
+from billing.services.ubl import DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Sugeneruoja UBL 2.1 (Peppol) XML sąskaitoms ir įrašo šalia PDF (Invoice.ubl). "
+        "Visam mėnesio run'ui ar mėnesiui – vienu procesu, paketais."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=str, help="Sąskaitos numeris.")
+        parser.add_argument("--run", type=int, help="BillingRun ID – visos run'o sąskaitos.")
+        parser.add_argument("--month", type=str, help="Išrašymo mėnuo YYYY-MM.")
+        parser.add_argument("--force", action="store_true", help="Perrašyti jau sugeneruotus XML.")
+        parser.add_argument(
+            "--benchmark",
+            action="store_true",
+            help="Tik sugeneruoti atmintyje (neįrašant) ir parodyti greitį (failai/s).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f"Kiek sąskaitų užkrauti vienu paketu (default: {DEFAULT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        from billing.services.ubl import iter_rendered_ubl
+
+        invoices = self.select_invoices(options)
+        if not options["force"] and not options["benchmark"]:
+            invoices = invoices.filter(Q(ubl__isnull=True) | Q(ubl=""))
+
+        count = total_bytes = 0
+        started = time.perf_counter()
+        for ubl in iter_rendered_ubl(invoices, chunk_size=max(1, options["chunk_size"])):
+            if options["benchmark"]:
+                total_bytes += len(ubl.content)
+            else:
+                ubl.save()
+            count += 1
+        elapsed = time.perf_counter() - started
+
+        rate = count / elapsed if elapsed else 0.0
+        if options["benchmark"]:
+            self.stdout.write(
+                f"UBL: {count} failų per {elapsed:.2f} s – {rate:.0f} failų/s, "
+                f"vidutiniškai {total_bytes // max(1, count)} B (be įrašymo į storage)"
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(f"UBL sugeneruota: {count} ({rate:.0f} failų/s)"))
+
+    @staticmethod
+    def select_invoices(options):
+        if options["number"]:
+            invoices = Invoice.objects.filter(number=options["number"])
+            if not invoices.exists():
+                raise CommandError(f"Nerasta sąskaita su numeriu: {options['number']}")
+            return invoices
+        if options["run"]:
+            if not BillingRun.objects.filter(pk=options["run"]).exists():
+                raise CommandError(f"Nerastas BillingRun #{options['run']}")
+            return Invoice.objects.filter(billing_run_items__run_id=options["run"])
+        if options["month"]:
+            try:
+                year, month = map(int, options["month"].split("-"))
+                date_from = date(year, month, 1)
+            except ValueError:
+                raise CommandError("Netinkamas --month (YYYY-MM).")
+            date_to = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+            return Invoice.objects.filter(issued_date__range=(date_from, date_to))
+        return Invoice.objects.all()
@@ -1,19 +1,26 @@
+import csv
 from datetime import date
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.db.models.functions import Mod
 from django.utils import timezone
 
-from billing.models import Client, Invoice, InvoiceLine, WorkLog
+from billing.models import BillingRun, BillingRunItem, Client, Invoice, InvoiceLine, OptimumExportTask, WorkLog
 from django.conf import settings
 from django.core.mail import EmailMessage
-from billing.services.pdf import generate_invoice_pdf
+from billing.services.locks import advisory_lock
+from billing.services.planner import ClientPlan, build_monthly_plan
 
 
 class Command(BaseCommand):
     help = "Generuoja mėnesines sąskaitas visiems aktyviams klientams (su PVM 21%)"
 
+    # SMTP prisijungimas, kurį gali perduoti ilgai veikiantis procesas (billing_worker).
+    # None – kiekvienas laiškas atsidaro savo prisijungimą (Django default).
+    mail_connection = None
+
     def add_arguments(self, parser):
         parser.add_argument(
             "--force",
@@ -35,8 +42,78 @@ class Command(BaseCommand):
             type=str,
             help="Nurodyti sąskaitos išrašymo datą (YYYY-MM-DD). Jei nenurodyta ir šiandien yra mėnesio 1 d. – naudos vakarykštę datą.",
         )
+        parser.add_argument(
+            "--shard",
+            type=str,
+            help="Apdoroti tik dalį klientų formatu i/N (pvz. 0/3) – klientus, kurių id %% N == i. "
+            "Leidžia mėnesinį generavimą paskirstyti per kelis serverius.",
+        )
+        parser.add_argument(
+            "--export-optimum",
+            action="store_true",
+            help="Įtraukti sąskaitas į Optimum eksporto eilę (siunčia drain_optimum_outbox).",
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="RUN_ID",
+            help="Pratęsti nutrūkusį BillingRun: vykdomi tik neatlikti žingsniai (sąskaita, PDF, laiškas, Optimum).",
+        )
+        parser.add_argument(
+            "--plan",
+            action="store_true",
+            help="Tik parodyti, kas būtų išrašyta (eilutės, be PVM, PVM, su PVM) – nieko neįrašant į DB.",
+        )
+        parser.add_argument(
+            "--plan-format",
+            choices=["table", "csv"],
+            default="table",
+            help="--plan išvesties formatas (default: table; su -v 2 lentelėje rodomos ir eilutės).",
+        )
 
     def handle(self, *args, **options):
+        if options.get("plan"):
+            period_from, period_to, _issued_date = self.resolve_period(options)
+            clients = list(self.select_clients(options.get("shard") or ""))
+            plans = build_monthly_plan(clients, period_from, period_to)
+            self.write_plan(list(plans.values()), period_from, period_to, options.get("plan_format"), options.get("verbosity", 1))
+            return
+
+        resume_id = options.get("resume")
+        if resume_id:
+            if options.get("force") or options.get("resend"):
+                raise CommandError("--resume negalima naudoti kartu su --force / --resend.")
+            try:
+                run = BillingRun.objects.get(pk=resume_id)
+            except BillingRun.DoesNotExist:
+                raise CommandError(f"Nerastas BillingRun #{resume_id}")
+            self.stdout.write(f"↩️ Pratęsiamas {run}")
+        else:
+            period_from, period_to, issued_date = self.resolve_period(options)
+            shard_opt = options.get("shard") or ""
+            if shard_opt:
+                self.parse_shard(shard_opt)
+            run = BillingRun.objects.create(
+                period_from=period_from,
+                period_to=period_to,
+                issued_date=issued_date,
+                shard=shard_opt,
+                export_optimum=bool(options.get("export_optimum")),
+            )
+            self.stdout.write(f"🧾 Pradėtas {run}")
+
+        self.run_billing(run, force=options.get("force", False), resend=options.get("resend", False))
+
+        if run.status == "done":
+            self.stdout.write(self.style.SUCCESS("Sąskaitų generavimas baigtas ✅"))
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Sąskaitų generavimas baigtas su klaidomis – pakartokite: manage.py generate_monthly_invoices --resume {run.pk}"
+                )
+            )
+
+    def resolve_period(self, options) -> tuple[date, date, date]:
         today = timezone.now().date()
 
         # Default elgsena:
@@ -69,19 +146,227 @@ class Command(BaseCommand):
         else:
             period_to = date(year, month + 1, 1) - timezone.timedelta(days=1)
 
-        for client in Client.objects.filter(active=True):
-            self.generate_for_client(
-                client,
-                period_from,
-                period_to,
-                issued_date,
-                force=options.get("force", False),
-                resend=options.get("resend", False),
+        return period_from, period_to, issued_date
+
+    def run_billing(self, run: BillingRun, *, force: bool = False, resend: bool = False) -> None:
+        # Klientai, kurių žingsniai šiame run'e jau visi atlikti, nebeliečiami – pratęsimas kainuoja
+        # tiek, kiek liko darbo.
+        clients = list(
+            self.select_clients(run.shard).exclude(pk__in=run.items.filter(done=True).values("client_id"))
+        )
+        # Visų likusių klientų eilutės suskaičiuojamos iš anksto keliomis bendromis užklausomis
+        plans = build_monthly_plan(clients, run.period_from, run.period_to)
+
+        items = {item.client_id: item for item in run.items.filter(done=False).select_related("invoice")}
+
+        for client in clients:
+            # Klientą „užsiimam“ per DB užraktą: jei tą patį klientą už tą patį mėnesį jau apdoroja
+            # kitas procesas / serveris – praleidžiam (kitaip galėtume išrašyti dvi sąskaitas).
+            lock_name = f"billing:monthly:{client.pk}:{run.period_from:%Y-%m}"
+            with advisory_lock(lock_name) as acquired:
+                if not acquired:
+                    self.stdout.write(
+                        self.style.WARNING(f"🔒 Klientą {client.name} šiuo metu apdoroja kitas procesas – praleidžiu.")
+                    )
+                    continue
+
+                item = items.get(client.pk)
+                if item is None:
+                    item, _created = BillingRunItem.objects.get_or_create(run=run, client=client)
+                item.client = client
+
+                try:
+                    self.process_client(run, item, force=force, resend=resend, plan=plans[client.pk])
+                except Exception as exc:
+                    item.last_error = f"{type(exc).__name__}: {exc}"
+                    item.save(update_fields=["last_error"])
+                    self.stdout.write(self.style.ERROR(f"❌ {client.name}: {item.last_error}"))
+
+        run.status = "failed" if run.items.filter(done=False).exists() else "done"
+        run.finished_at = timezone.now()
+        run.save(update_fields=["status", "finished_at"])
+
+    def process_client(
+        self,
+        run: BillingRun,
+        item: BillingRunItem,
+        *,
+        force: bool = False,
+        resend: bool = False,
+        plan: ClientPlan | None = None,
+    ) -> None:
+        """Vykdo tik neatliktus kliento žingsnius; kiekvienas atliktas žingsnis iškart įrašomas į DB."""
+        client = item.client
+
+        # 1) Sąskaita
+        if item.invoice_id is None:
+            existing = (
+                Invoice.objects.filter(
+                    client=client,
+                    invoice_type="monthly",
+                    period_from=run.period_from,
+                    period_to=run.period_to,
+                )
+                .order_by("-id")
+                .first()
             )
 
-        self.stdout.write(self.style.SUCCESS("Sąskaitų generavimas baigtas ✅"))
+            if existing and force:
+                existing.delete()
+                existing = None
+                plan = None  # ištrinta sąskaita galėjo „atlaisvinti“ darbus – planą skaičiuojam iš naujo
+
+            # Jei sąskaita už šį laikotarpį jau sukurta – pagal režimą arba persiunčiam, arba praleidžiam.
+            if existing and not resend:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"⏭️ Sąskaita už {run.period_from}–{run.period_to} klientui {client.name} jau yra ({existing.number}) – praleidžiu."
+                    )
+                )
+                item.invoice = existing
+                item.skipped = True
+                item.done = True
+                item.save(update_fields=["invoice", "skipped", "done"])
+                return
+
+            # Sąskaitos sukūrimas ir žingsnio pažymėjimas – vienoje transakcijoje, kad po lūžio
+            # pratęsimas nepalaikytų jau sukurtos sąskaitos „svetima“.
+            with transaction.atomic():
+                if existing:
+                    invoice = existing
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"↩️ Sąskaita {existing.number} už {run.period_from}–{run.period_to} jau yra – persiunčiama el. paštu."
+                        )
+                    )
+                else:
+                    invoice = self.generate_for_client(client, run.period_from, run.period_to, run.issued_date, plan=plan)
+
+                if invoice is None:
+                    item.skipped = True
+                    item.done = True
+                    item.save(update_fields=["skipped", "done"])
+                    return
+
+                item.invoice = invoice
+                item.invoice_created_at = timezone.now()
+                update_fields = ["invoice", "invoice_created_at"]
+
+                # Optimum eksportas – tik įrašas į outbox toje pačioje transakcijoje; SOAP nelaukiam
+                if run.export_optimum:
+                    OptimumExportTask.enqueue(invoice)
+                    item.exported_at = item.invoice_created_at
+                    update_fields.append("exported_at")
+                item.save(update_fields=update_fields)
+
+        invoice = item.invoice
+        invoice.client = client
+
+        # 2) PDF – sugeneruojamas vieną kartą; į storage rašomas fone, kol siunčiamas laiškas
+        pdf = None
+        if item.pdf_rendered_at is None:
+            pdf = self.generate_pdf_for_invoice(invoice, background=True)
+
+        # 3) El. laiškas (priedas – tie patys atmintyje esantys baitai)
+        if item.emailed_at is None:
+            self.send_invoice_email(invoice, pdf=pdf)
+            item.emailed_at = timezone.now()
+            item.save(update_fields=["emailed_at"])
+
+        # PDF žingsnis pažymimas tik kai failas tikrai įrašytas
+        if pdf is not None:
+            pdf.wait()
+            item.pdf_rendered_at = timezone.now()
+            item.save(update_fields=["pdf_rendered_at"])
+
+        # 4) Optimum (senesniems / pratęsiamiems run'ams, kai sąskaita sukurta be eilės įrašo)
+        if run.export_optimum and item.exported_at is None:
+            with transaction.atomic():
+                OptimumExportTask.enqueue(invoice)
+                item.exported_at = timezone.now()
+                item.save(update_fields=["exported_at"])
+
+        item.done = True
+        item.last_error = ""
+        item.save(update_fields=["done", "last_error"])
+
+    def select_clients(self, shard: str):
+        clients = Client.objects.filter(active=True).order_by("id")
+        if shard:
+            shard_index, shard_count = self.parse_shard(shard)
+            clients = clients.annotate(shard=Mod("id", shard_count)).filter(shard=shard_index)
+        return clients
+
+    def write_plan(self, plans: list[ClientPlan], period_from, period_to, fmt: str = "table", verbosity: int = 1) -> None:
+        """Išveda planą. Klientai, kuriems sąskaita už laikotarpį jau yra, į sumas neįtraukiami."""
+        billable = [p for p in plans if p.billable and not p.existing_number]
+        net = sum((p.net_amount for p in billable), Decimal("0.00"))
+        vat = sum((p.vat_amount for p in billable), Decimal("0.00"))
+        gross = sum((p.total_amount for p in billable), Decimal("0.00"))
+
+        if fmt == "csv":
+            writer = csv.writer(self.stdout)
+            writer.writerow(["client_id", "client", "lines", "net_amount", "vat_amount", "total_amount", "existing_invoice"])
+            for p in plans:
+                writer.writerow(
+                    [
+                        p.client.pk,
+                        p.client.name,
+                        len(p.lines),
+                        f"{p.net_amount:.2f}",
+                        f"{p.vat_amount:.2f}",
+                        f"{p.total_amount:.2f}",
+                        p.existing_number or "",
+                    ]
+                )
+            writer.writerow(["", "VISO", sum(len(p.lines) for p in billable), f"{net:.2f}", f"{vat:.2f}", f"{gross:.2f}", ""])
+            return
+
+        self.stdout.write(f"Planas {period_from}–{period_to} (niekas neįrašoma į DB)")
+        self.stdout.write(f"{'Klientas':<40} {'Eil.':>5} {'Be PVM':>12} {'PVM':>10} {'Su PVM':>12}  Pastaba")
+        for p in plans:
+            if p.existing_number:
+                note = f"jau yra {p.existing_number}"
+            elif not p.billable:
+                note = "nėra ką išrašyti"
+            else:
+                note = ""
+            self.stdout.write(
+                f"{p.client.name[:40]:<40} {len(p.lines):>5} {p.net_amount:>12.2f} {p.vat_amount:>10.2f} {p.total_amount:>12.2f}  {note}"
+            )
+            if verbosity >= 2:
+                for line in p.lines:
+                    self.stdout.write(f"    {line.description[:50]:<50} {line.quantity:>8} × {line.unit_price:>10.2f} = {line.total:>10.2f}")
+
+        self.stdout.write(self.style.SUCCESS(f"Viso: {len(billable)} sąsk., be PVM {net:.2f} €, PVM {vat:.2f} €, su PVM {gross:.2f} €"))
+
+    @staticmethod
+    def parse_shard(value: str) -> tuple[int, int]:
+        try:
+            i_str, n_str = value.split("/")
+            shard_index, shard_count = int(i_str), int(n_str)
+        except ValueError:
+            raise CommandError(f"Netinkamas --shard formatas: {value} (turi būti i/N, pvz. 0/3)")
+
+        if shard_count < 1 or not 0 <= shard_index < shard_count:
+            raise CommandError(f"Netinkamas --shard: {value} (reikia 0 <= i < N)")
+        return shard_index, shard_count
+
+    def generate_pdf_for_invoice(self, invoice: Invoice, *, background: bool = False):
+        """
+        Grąžina sąskaitos RenderedPdf: PDF sugeneruojamas vieną kartą ir tie patys baitai naudojami
+        storage įrašui bei el. laiškams. background=True – storage įrašas vyksta fone (reikia pdf.wait()).
+        """
+        from billing.services.pdf import RenderedPdf
+
+        pdf = RenderedPdf.for_invoice(invoice)
+        if background:
+            pdf.save_async()
+        else:
+            pdf.save()
+        return pdf
 
-    def send_invoice_email(self, invoice: Invoice) -> None:
+    def send_invoice_email(self, invoice: Invoice, pdf=None, subject_prefix: str = "") -> None:
         client = invoice.client
 
         # --- TEST REŽIMAS ---
@@ -89,24 +374,10 @@ class Command(BaseCommand):
         ADMIN_EMAIL = getattr(settings, "ADMIN_INVOICE_EMAIL", "vyga@infsis.lt")
         # --------------------
 
-        recipients = []
-
-        # 1) Paimam papildomus klientų el. paštus (ClientEmail)
-        emails_mgr = getattr(client, "emails", None)  # jei related_name="emails"
-        if emails_mgr is None:
-            emails_mgr = getattr(client, "clientemail_set", None)  # default related_name
-
-        if emails_mgr is not None:
-            try:
-                recipients = list(emails_mgr.values_list("email", flat=True))
-            except Exception:
-                recipients = []
+        # Gavėjai: ClientEmail adresai, jei jų nėra – pagrindinis client.email (iš BillingProfile cache)
+        from billing.services.profiles import get_profile
 
-        # 2) Jei nėra – naudojam pagrindinį client.email
-        if not recipients:
-            main_email = getattr(client, "email", "")
-            if main_email:
-                recipients = [main_email]
+        recipients = get_profile(client).recipients
 
         if SEND_ONLY_TO_ADMIN:
             original_recipients = recipients.copy()
@@ -121,10 +392,14 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING(f"⚠️ Klientas {client.name} neturi el. pašto – nesiunčiu."))
             return
 
-        # Užtikrinam, kad PDF yra
-        if getattr(invoice, "pdf", None) is not None and not invoice.pdf:
-            pdf_file = generate_invoice_pdf(invoice)
-            invoice.pdf.save(pdf_file.name, pdf_file, save=True)
+        # Užtikrinam, kad PDF yra; abu laiškai gauna tuos pačius baitus
+        if pdf is None:
+            pdf = self.generate_pdf_for_invoice(invoice)
+
+        # UBL (Peppol) e. sąskaita – prisegama kartu su PDF
+        from billing.services.ubl import ensure_invoice_ubl
+
+        ubl = ensure_invoice_ubl(invoice)
 
         is_proforma = invoice.invoice_type == "hosting"
 
@@ -133,6 +408,7 @@ class Command(BaseCommand):
             if is_proforma
             else f"PVM sąskaita faktūra {invoice.number} – {client.name}"
         )
+        subject = f"{subject_prefix}{subject}"
 
         body = (
             "Sveiki,\n\n"
@@ -147,12 +423,12 @@ class Command(BaseCommand):
             body=body,
             from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@localhost"),
             to=recipients,
+            connection=self.mail_connection,
         )
 
-        if getattr(invoice, "pdf", None) is not None and invoice.pdf:
-            with invoice.pdf.open("rb") as f:
-                msg.attach(f"{invoice.number}.pdf", f.read(), "application/pdf")
-        
+        pdf.attach_to(msg)
+        ubl.attach_to(msg)
+
         self.stdout.write(f"DEBUG recipients: {msg.recipients()}")
 
         # Pagrindinis laiškas klientui
@@ -166,139 +442,67 @@ class Command(BaseCommand):
                 body=body,
                 from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@localhost"),
                 to=[admin_copy_email],
+                connection=self.mail_connection,
             )
 
-            if getattr(invoice, "pdf", None) is not None and invoice.pdf:
-                with invoice.pdf.open("rb") as f:
-                    copy_msg.attach(f"{invoice.number}.pdf", f.read(), "application/pdf")
+            pdf.attach_to(copy_msg)
+            ubl.attach_to(copy_msg)
 
             copy_msg.send(fail_silently=False)
             self.stdout.write(self.style.SUCCESS(f"📧 Kopija išsiųsta → {admin_copy_email}"))
 
     @transaction.atomic
-    def generate_for_client(
-        self,
-        client,
-        period_from,
-        period_to,
-        issued_date,
-        *,
-        force: bool = False,
-        resend: bool = False,
-    ):
-        # Imame tik aktyvius abonementus. Nuliniai (0.00) mėnesiniai abonementai bus praleisti žemiau.
-        existing = (
-            Invoice.objects.filter(
-                client=client,
-                invoice_type="monthly",
-                period_from=period_from,
-                period_to=period_to,
-            )
-            .order_by("-id")
-            .first()
-        )
-
-        # Jei sąskaita už šį laikotarpį jau sukurta – pagal režimą arba persiunčiam, arba pergeneruojam, arba praleidžiam.
-        if existing and resend and not force:
-            self.send_invoice_email(existing)
-            self.stdout.write(
-                self.style.WARNING(
-                    f"↩️ Sąskaita {existing.number} už {period_from}–{period_to} jau yra – persiųsta el. paštu."
-                )
-            )
-            return
-
-        if existing and force:
-            existing.delete()
-            existing = None
-
-        if existing and not force:
-            self.stdout.write(
-                self.style.WARNING(
-                    f"⏭️ Sąskaita už {period_from}–{period_to} klientui {client.name} jau yra ({existing.number}) – praleidžiu."
-                )
-            )
-            return
+    def generate_for_client(self, client, period_from, period_to, issued_date, plan: ClientPlan | None = None) -> Invoice | None:
+        """Sukuria mėnesinę sąskaitą su eilutėmis. Grąžina None, jei nėra ką išrašyti.
 
-        subscriptions = client.subscriptions.filter(active=True)
+        Eilutės imamos iš plano (build_monthly_plan); jei planas neperduotas – suskaičiuojamas šiam klientui.
+        Ar sąskaita už laikotarpį jau yra, PDF ir el. laišką tvarko process_client (BillingRun žingsniai).
+        """
+        if plan is None:
+            plan = build_monthly_plan([client], period_from, period_to)[client.pk]
 
-        work_logs = WorkLog.objects.filter(
-            client=client,
-            billed=False,
-            date__range=(period_from, period_to),
-        )
-
-        # Pastaba: sąskaitą generuojame ir tada, kai nėra papildomų darbų (work_logs tuščias).
-        # Tokiu atveju sąskaitoje bus tik abonementų eilutės + PVM.
-
-        invoice_number = self.generate_invoice_number()
+        # Jei nėra nei vienos apmokestinamos eilutės (pvz. visi abonementai 0 ir nėra darbų) — sąskaitos nekuriam.
+        # Pastaba: sąskaitą generuojame ir tada, kai nėra papildomų darbų – tada joje tik abonementų eilutės + PVM.
+        if not plan.billable:
+            return None
 
+        # PVM nelaikome kaip atskiros eilutės (InvoiceLine) — jis bus rodomas PDF'e atskirai
+        # nuo paslaugų eilučių: Neto suma, PVM, Bruto suma.
         invoice = Invoice.objects.create(
-            number=invoice_number,
+            number=self.generate_invoice_number(),
             client=client,
             invoice_type="monthly",
             period_from=period_from,
             period_to=period_to,
             issued_date=issued_date,
             due_date=issued_date + timezone.timedelta(days=14),
-            total_amount=Decimal("0.00"),
+            net_amount=plan.net_amount,
+            vat_rate=plan.vat_rate,
+            vat_amount=plan.vat_amount,
+            total_amount=plan.total_amount,
         )
 
-        vat_rate = Decimal("0.21")
-        total_net = Decimal("0.00")
-
-        has_billable_lines = False
-
-        # 1) Abonementai (gali būti keli) — praleidžiam 0.00
-        for sub in subscriptions:
-            sub_fee = Decimal(str(sub.monthly_fee)).quantize(Decimal("0.01"))
-            if sub_fee == Decimal("0.00"):
-                continue
-
-            InvoiceLine.objects.create(
-                invoice=invoice,
-                description=f"{sub.title}",
-                quantity=Decimal("1.00"),
-                unit_price=sub_fee,
-                total=sub_fee,
-            )
-            total_net += sub_fee
-            has_billable_lines = True
-
-        # 2) Papildomi darbai (be PVM)
-        for work in work_logs:
-            line_total = Decimal(str(work.total_price()))
-            InvoiceLine.objects.create(
-                invoice=invoice,
-                description=work.description,
-                quantity=Decimal(str(work.quantity)),
-                unit_price=Decimal(str(work.unit_price)),
-                total=line_total,
-            )
-            total_net += line_total
-            has_billable_lines = True
-
-            work.billed = True
-            work.save(update_fields=["billed"])
-
-        # Jei nėra nei vienos apmokestinamos eilutės (pvz. visi abonementai 0 ir nėra darbų) — sąskaitos nekuriam.
-        if not has_billable_lines:
-            invoice.delete()
-            return
-
-        # 3) PVM (nuo visos sumos be PVM)
-        vat_amount = (total_net * vat_rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        total_gross = (total_net + vat_amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        invoice.net_amount = total_net
-        invoice.vat_rate = vat_rate
-        invoice.vat_amount = vat_amount
-
-        # PVM nelaikome kaip atskiros eilutės (InvoiceLine) — jis bus rodomas PDF'e atskirai
-        # nuo paslaugų eilučių: Neto suma, PVM, Bruto suma.
+        InvoiceLine.objects.bulk_create(
+            [
+                InvoiceLine(
+                    invoice=invoice,
+                    description=line.description,
+                    quantity=line.quantity,
+                    unit_price=line.unit_price,
+                    total=line.total,
+                )
+                for line in plan.lines
+            ]
+        )
 
-        invoice.total_amount = total_gross
-        invoice.save(update_fields=["net_amount", "vat_rate", "vat_amount", "total_amount"])
+        work_log_ids = plan.work_log_ids
+        if work_log_ids:
+            billed = WorkLog.objects.filter(id__in=work_log_ids, billed=False).update(billed=True)
+            # Jei tarp plano ir įrašymo kažkas kitas jau įtraukė darbus į sąskaitą – atšaukiam transakciją.
+            if billed != len(work_log_ids):
+                raise CommandError(
+                    f"Klientui {client.name} dalis darbų jau įtraukta į kitą sąskaitą – pakartokite (--resume)."
+                )
 
         self.stdout.write(f"Sukurta sąskaita {invoice.number} klientui {client.name}")
         self.stdout.write(
@@ -306,14 +510,17 @@ class Command(BaseCommand):
                 f"🗓️ Laikotarpis {period_from}–{period_to}, išrašymo data {issued_date}"
             )
         )
-        self.send_invoice_email(invoice)
+        return invoice
 
     def generate_invoice_number(self):
         # Numeracija: MEV26-001, MEV26-002 ...
         prefix = "MEV26"
 
+        # select_for_update: kai keli procesai generuoja lygiagrečiai, paskutinį numerį skaitom
+        # užrakindami (locking read), kad du procesai negautų to paties numerio.
         last_invoice = (
-            Invoice.objects.filter(number__startswith=f"{prefix}-")
+            Invoice.objects.select_for_update()
+            .filter(number__startswith=f"{prefix}-")
             .order_by("-number")
             .first()
         )
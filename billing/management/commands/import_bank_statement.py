@@ -0,0 +1,53 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.services.bank_statement import import_statements
+
+
+class Command(BaseCommand):
+    help = (
+        "Importuoja banko išrašus (ISO 20022 camt.053 XML): įplaukas sutikrina su neapmokėtomis sąskaitomis "
+        "pagal numerį mokėjimo paskirtyje ir sumą, sutapusias pažymi apmokėtomis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", type=str, help="camt.053 XML failai.")
+        parser.add_argument("--dry-run", action="store_true", help="Tik parodyti, ką pažymėtų (nieko nekeičia).")
+
+    def handle(self, *args, **options):
+        paths = [Path(p) for p in options["paths"]]
+        for path in paths:
+            if not path.exists():
+                raise CommandError(f"Failas nerastas: {path}")
+
+        from lxml import etree
+
+        started = time.monotonic()
+        try:
+            report = import_statements([str(p) for p in paths], dry_run=options["dry_run"])
+        except etree.XMLSyntaxError as exc:
+            raise CommandError(f"Netinkamas XML: {exc}")
+        elapsed = time.monotonic() - started
+
+        verbosity = options.get("verbosity", 1)
+        if verbosity >= 2:
+            for credit, number in report.matched:
+                self.stdout.write(f"  ✅ {number}: {credit.amount:.2f} {credit.currency} ({credit.booking_date}, {credit.debtor})")
+
+        for credit, reason in report.unmatched:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ❔ {credit.booking_date} {credit.amount:.2f} {credit.currency} – {credit.debtor or '?'}: "
+                    f"„{credit.remittance}“ – {reason}"
+                )
+            )
+
+        marked = "nepažymėta (--dry-run)" if options["dry_run"] else f"pažymėta apmokėtomis {report.marked_paid}"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Išrašai apdoroti per {elapsed:.2f}s ✅ įplaukų {report.credits}, sutapo {len(report.matched)} "
+                f"({marked}), nesutapo {len(report.unmatched)}"
+            )
+        )
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from billing.services.worklog_import import DEFAULT_BATCH_SIZE, import_worklogs, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Masiškai importuoja darbus (WorkLog) iš CSV arba JSON failo. "
+        "Eilutės su jau importuotu idempotency_key praleidžiamos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="CSV arba JSON failas.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "json"],
+            help="Failo formatas (default: pagal failo plėtinį).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Kiek eilučių įrašyti vienu bulk_create (default: {DEFAULT_BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Failas nerastas: {path}")
+
+        fmt = options.get("format") or ("csv" if path.suffix.lower() == ".csv" else "json")
+
+        try:
+            reports = import_worklogs(read_rows(path.read_bytes(), fmt), batch_size=max(1, options["batch_size"]))
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise CommandError(f"Nepavyko nuskaityti {path}: {exc}")
+
+        for r in reports:
+            self.stdout.write(
+                f"Paketas {r.batch}: priimta {r.accepted}, dublikatų {r.duplicates}, atmesta {len(r.rejected)}"
+            )
+            for rejected in r.rejected:
+                errors = "; ".join(f"{k}: {v}" for k, v in rejected["errors"].items())
+                self.stdout.write(self.style.WARNING(f"  eilutė {rejected['row']}: {errors}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Importas baigtas ✅ priimta {sum(r.accepted for r in reports)}, "
+                f"dublikatų {sum(r.duplicates for r in reports)}, "
+                f"atmesta {sum(len(r.rejected) for r in reports)}"
+            )
+        )
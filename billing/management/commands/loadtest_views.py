@@ -0,0 +1,124 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand, CommandError
+
+FAKE_OPTIMUM_RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <{op}Response xmlns="http://api.optimum.lt/v1/lt/Trd/">
+      <{op}Result><Status>Success</Status><Result>1</Result></{op}Result>
+    </{op}Response>
+  </soap:Body>
+</soap:Envelope>"""
+
+
+def _fake_optimum_handler(delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            op = (self.headers.get("SOAPAction") or "").strip('"').rsplit("/", 1)[-1] or "InsertInvoice"
+            time.sleep(delay)
+            body = FAKE_OPTIMUM_RESPONSE.format(op=op).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = (
+        "Lokalus apkrovos testas: ta pati užklausa lygiagrečiai siunčiama į WSGI ir ASGI serverius, "
+        "palyginamas pralaidumas ir vėlinimas.\n\n"
+        "Pvz.:\n"
+        "  OPTIMUM_TRD_URL=http://127.0.0.1:8099/ gunicorn config.wsgi -w 2 -b :8001\n"
+        "  OPTIMUM_TRD_URL=http://127.0.0.1:8099/ uvicorn config.asgi:application --port 8002\n"
+        "  python manage.py loadtest_views --wsgi-url http://127.0.0.1:8001 --asgi-url http://127.0.0.1:8002 "
+        "--path '/api/invoices/MEV26-0001/optimum/?force=1' --method POST --token $BILLING_API_TOKEN "
+        "--fake-optimum 8099 --delay 1"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", help="WSGI serverio adresas, pvz. http://127.0.0.1:8001")
+        parser.add_argument("--asgi-url", help="ASGI serverio adresas, pvz. http://127.0.0.1:8002")
+        parser.add_argument("--path", required=True, help="Testuojamas kelias (su query), pvz. /api/pdf/<token>/")
+        parser.add_argument("--method", choices=["GET", "POST"], default="GET")
+        parser.add_argument("--token", default="", help="BILLING_API_TOKEN (Authorization: Bearer ...).")
+        parser.add_argument("--concurrency", type=int, default=50, help="Lygiagrečių klientų skaičius (default: 50).")
+        parser.add_argument("--requests", type=int, default=200, help="Užklausų skaičius kiekvienam serveriui (default: 200).")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Vienos užklausos timeout sekundėmis.")
+        parser.add_argument(
+            "--fake-optimum",
+            type=int,
+            metavar="PORT",
+            help="Paleisti netikrą lėtą Optimum SOAP serverį šiame porte (serveriams nurodykit OPTIMUM_TRD_URL).",
+        )
+        parser.add_argument("--delay", type=float, default=1.0, help="Netikro Optimum atsakymo vėlinimas sekundėmis.")
+
+    def handle(self, *args, **options):
+        targets = [(name, options[f"{name}_url"]) for name in ("wsgi", "asgi") if options[f"{name}_url"]]
+        if not targets:
+            raise CommandError("Nurodykit bent vieną iš --wsgi-url / --asgi-url.")
+
+        fake_server = None
+        if options.get("fake_optimum"):
+            fake_server = ThreadingHTTPServer(("127.0.0.1", options["fake_optimum"]), _fake_optimum_handler(options["delay"]))
+            threading.Thread(target=fake_server.serve_forever, daemon=True).start()
+            self.stdout.write(f"Netikras Optimum: http://127.0.0.1:{options['fake_optimum']}/ (vėlinimas {options['delay']}s)")
+
+        try:
+            for name, base_url in targets:
+                self.stdout.write(self._format(name.upper(), self._run(base_url.rstrip("/") + options["path"], options)))
+        finally:
+            if fake_server is not None:
+                fake_server.shutdown()
+
+    def _run(self, url: str, options) -> dict:
+        headers = {"Authorization": f"Bearer {options['token']}"} if options["token"] else {}
+        data = b"" if options["method"] == "POST" else None
+
+        def one(_i):
+            req = urllib.request.Request(url, data=data, headers=headers, method=options["method"])
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=options["timeout"]) as resp:
+                    resp.read()
+                    status = resp.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            except Exception:
+                status = None
+            return status, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as pool:
+            results = list(pool.map(one, range(max(1, options["requests"]))))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _status, latency in results)
+        return {
+            "requests": len(results),
+            "errors": sum(1 for status, _latency in results if status is None or status >= 500),
+            "elapsed": elapsed,
+            "rps": len(results) / elapsed if elapsed else 0.0,
+            "p50": statistics.median(latencies),
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
+
+    @staticmethod
+    def _format(name: str, r: dict) -> str:
+        return (
+            f"{name}: {r['requests']} užklausų per {r['elapsed']:.2f}s – {r['rps']:.1f} req/s, "
+            f"p50 {r['p50'] * 1000:.0f} ms, p95 {r['p95'] * 1000:.0f} ms, klaidų {r['errors']}"
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from billing.models import Client, WorkLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Atnaujina paieškos indeksą (SearchToken) DB be FULLTEXT, pvz. SQLite. "
+        "MySQL paieška naudoja FULLTEXT indeksus – ten komanda nieko nedaro."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            choices=["client", "worklog"],
+            help="Tik vienas modelis (default: visi).",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Išvalyti ir suindeksuoti iš naujo (pašalina ir ištrintų objektų žodžius).",
+        )
+
+    def handle(self, *args, **options):
+        from billing.services.search import rebuild_index, sync_index, uses_fulltext
+
+        if uses_fulltext():
+            self.stdout.write("MySQL: paieška per FULLTEXT indeksus, SearchToken nenaudojamas.")
+            return
+
+        model = {"client": Client, "worklog": WorkLog}.get(options["model"])
+        count = rebuild_index(model) if options["full"] else sync_index(model)
+        self.stdout.write(self.style.SUCCESS(f"Paieškos indeksas atnaujintas ✅ suindeksuota objektų: {count}"))
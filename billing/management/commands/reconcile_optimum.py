@@ -0,0 +1,193 @@
+import csv
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from billing.models import Invoice, OptimumExportTask
+
+# Jei GetInvoices atsakymas būtų nepilnas, visos sąskaitos atrodytų „trūkstamos“. Netikėta atsakymo
+# struktūra – klaida (fetch_optimum_invoices), o akivaizdžiai nepilnas sąrašas (tuščias arba trūksta
+# daugiau nei --max-missing-share) – CommandError dar prieš keičiant būsenas (--mark / --enqueue-missing).
+# Pakartotinai įtraukta į eilę jau esanti sąskaita nepakenks: Optimum ją atmes kaip „duplicate“,
+# o tai laikoma sėkmingu eksportu.
+DEFAULT_MAX_MISSING_SHARE = Decimal("0.5")
+
+
+class Command(BaseCommand):
+    help = (
+        "Sutikrina vietines sąskaitas su Optimum: parsiunčia Optimum sąskaitų sąrašą už laikotarpį "
+        "keliomis GetInvoices užklausomis ir parodo trūkstamas, perteklines ir nesutampančios sumos sąskaitas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", type=str, help="Laikotarpio pradžia YYYY-MM-DD.")
+        parser.add_argument("--to", dest="date_to", type=str, help="Laikotarpio pabaiga YYYY-MM-DD (default: šiandien).")
+        parser.add_argument("--month", type=str, help="Visas mėnuo YYYY-MM (vietoje --from/--to).")
+        parser.add_argument(
+            "--mark",
+            action="store_true",
+            help="Pažymėti eksporto būseną pagal Optimum (optimum_status, OptimumExportTask).",
+        )
+        parser.add_argument(
+            "--enqueue-missing",
+            action="store_true",
+            help="Trūkstamas Optimum sąskaitas įtraukti į eksporto eilę (drain_optimum_outbox).",
+        )
+        parser.add_argument(
+            "--max-missing-share",
+            type=Decimal,
+            default=DEFAULT_MAX_MISSING_SHARE,
+            help=(
+                "Didžiausia trūkstamų Optimum sąskaitų dalis (0–1); didesnė laikoma Optimum atsakymo klaida "
+                f"(default: {DEFAULT_MAX_MISSING_SHARE})."
+            ),
+        )
+        parser.add_argument("--format", choices=["table", "csv"], default="table", help="Ataskaitos formatas.")
+        parser.add_argument("--chunk-days", type=int, default=31, help="Kiek dienų apima viena GetInvoices užklausa.")
+
+    def handle(self, *args, **options):
+        from billing.services.breaker import CircuitOpenError
+        from billing.services.optimum import fetch_optimum_invoices
+
+        date_from, date_to = self.resolve_period(options)
+
+        try:
+            remote = fetch_optimum_invoices(date_from, date_to, chunk_days=max(1, options["chunk_days"]))
+        except (RuntimeError, CircuitOpenError) as exc:
+            raise CommandError(f"Nepavyko gauti sąskaitų iš Optimum: {exc}")
+
+        # Išankstinės (hosting) sąskaitos į Optimum neeksportuojamos – jų ten ir neturi būti
+        local = list(
+            Invoice.objects.filter(issued_date__range=(date_from, date_to))
+            .exclude(invoice_type="hosting")
+            .order_by("issued_date", "number")
+            .values_list("id", "number", "net_amount", "optimum_status")
+        )
+
+        matched, missing, mismatched = [], [], []
+        local_numbers = set()
+        for pk, number, net_amount, optimum_status in local:
+            local_numbers.add(number)
+            net_amount = Decimal(net_amount).quantize(Decimal("0.01"))
+            found = remote.get(number)
+            if found is None:
+                # 0.00 sąskaitų eksportas neleidžiamas – jos ir neturi būti Optimum
+                if net_amount > Decimal("0.00"):
+                    missing.append((pk, number, net_amount, optimum_status))
+            elif found.net_amount != net_amount:
+                mismatched.append((pk, number, net_amount, found.net_amount))
+            else:
+                matched.append(pk)
+        extra = sorted(number for number in remote if number not in local_numbers)
+
+        self.check_remote(remote, local, missing, matched, mismatched, options["max_missing_share"])
+        self.write_report(date_from, date_to, matched, missing, mismatched, extra, remote, options["format"])
+
+        if options["mark"]:
+            self.mark(matched, missing, mismatched)
+        if options["enqueue_missing"] and missing:
+            with transaction.atomic():
+                for invoice in Invoice.objects.filter(id__in=[pk for pk, *_rest in missing]):
+                    OptimumExportTask.enqueue(invoice, requeue=True)
+            self.stdout.write(self.style.SUCCESS(f"Į eksporto eilę įtraukta: {len(missing)}"))
+
+    @staticmethod
+    def resolve_period(options) -> tuple[date, date]:
+        try:
+            if options.get("month"):
+                year, month = map(int, options["month"].split("-"))
+                date_from = date(year, month, 1)
+                date_to = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+            else:
+                if not options.get("date_from"):
+                    raise CommandError("Nurodykit --month arba --from (ir --to).")
+                date_from = date.fromisoformat(options["date_from"])
+                date_to = date.fromisoformat(options["date_to"]) if options.get("date_to") else timezone.localdate()
+        except ValueError as exc:
+            raise CommandError(f"Netinkama data: {exc}")
+        if date_from > date_to:
+            raise CommandError("--from negali būti vėlesnė už --to.")
+        return date_from, date_to
+
+    def mark(self, matched, missing, mismatched) -> None:
+        """Būsenos atnaujinamos keliomis bendromis UPDATE užklausomis, ne po vieną sąskaitą."""
+        now = timezone.now()
+        with transaction.atomic():
+            exported = (
+                Invoice.objects.filter(id__in=matched)
+                .exclude(optimum_status="exported")
+                .update(
+                    optimum_status="exported",
+                    optimum_exported_at=Coalesce(F("optimum_exported_at"), now),
+                    optimum_error="",
+                    updated_at=now,
+                )
+            )
+            OptimumExportTask.objects.filter(invoice_id__in=matched).exclude(status__in=["done", "running"]).update(
+                status="done", finished_at=now, last_error=""
+            )
+
+            # Pažymėtos kaip eksportuotos, bet Optimum jų nėra – grąžinam į „neeksportuota“
+            reset = Invoice.objects.filter(
+                id__in=[pk for pk, _number, _net, status in missing if status == "exported"]
+            ).update(optimum_status="", optimum_exported_at=None, updated_at=now)
+
+            for pk, number, net_amount, remote_net in mismatched:
+                Invoice.objects.filter(pk=pk).update(
+                    optimum_status="failed",
+                    optimum_error=f"Optimum neto suma {remote_net:.2f} ≠ {net_amount:.2f}",
+                    updated_at=now,
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Būsena atnaujinta: eksportuota {exported}, grąžinta į neeksportuotas {reset}, "
+                f"nesutampa {len(mismatched)}"
+            )
+        )
+
+    @staticmethod
+    def check_remote(remote, local, missing, matched, mismatched, max_missing_share: Decimal) -> None:
+        """Tuščias ar beveik tuščias Optimum sąrašas – greičiausiai neišparsuotas atsakymas, ne tikri trūkumai."""
+        exported = sum(1 for *_rest, optimum_status in local if optimum_status == "exported")
+        if not remote and exported:
+            raise CommandError(
+                f"Optimum negrąžino nė vienos sąskaitos, nors pas mus eksportuotų {exported} – "
+                "patikrinkit GetInvoices atsakymą (filtrą ir Result/Invoice struktūrą)."
+            )
+        compared = len(missing) + len(matched) + len(mismatched)
+        if compared and Decimal(len(missing)) / compared > max_missing_share:
+            raise CommandError(
+                f"Optimum trūksta {len(missing)} iš {compared} sąskaitų (daugiau nei {max_missing_share:.0%}) – "
+                "patikrinkit GetInvoices atsakymą prieš remdamiesi ataskaita."
+            )
+
+    def write_report(self, date_from, date_to, matched, missing, mismatched, extra, remote, fmt: str) -> None:
+        if fmt == "csv":
+            writer = csv.writer(self.stdout)
+            writer.writerow(["kind", "number", "local_net_amount", "optimum_net_amount"])
+            for _pk, number, net_amount, _status in missing:
+                writer.writerow(["missing", number, f"{net_amount:.2f}", ""])
+            for _pk, number, net_amount, remote_net in mismatched:
+                writer.writerow(["mismatch", number, f"{net_amount:.2f}", f"{remote_net:.2f}"])
+            for number in extra:
+                writer.writerow(["extra", number, "", f"{remote[number].net_amount:.2f}"])
+            return
+
+        self.stdout.write(f"🗓️ Laikotarpis {date_from}–{date_to}: Optimum sąskaitų {len(remote)}")
+        for _pk, number, net_amount, _status in missing:
+            self.stdout.write(self.style.WARNING(f"  ❌ nėra Optimum: {number} ({net_amount:.2f} €)"))
+        for _pk, number, net_amount, remote_net in mismatched:
+            self.stdout.write(self.style.WARNING(f"  ≠ suma nesutampa: {number} – mūsų {net_amount:.2f} €, Optimum {remote_net:.2f} €"))
+        for number in extra:
+            self.stdout.write(f"  ➕ tik Optimum: {number} ({remote[number].net_amount:.2f} €)")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sutampa {len(matched)}, trūksta {len(missing)}, nesutampa suma {len(mismatched)}, perteklinių {len(extra)}"
+            )
+        )
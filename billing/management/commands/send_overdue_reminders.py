@@ -0,0 +1,188 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from billing.models import Invoice
+from billing.services.profiles import get_profiles
+
+DEFAULT_COOLDOWN_DAYS = 7
+DEFAULT_BATCH_SIZE = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Siunčia priminimus apie pradelstas (neapmokėtas, praėjusi mokėjimo data) sąskaitas: "
+        "vienas laiškas klientui su visomis jo pradelstomis sąskaitomis, ne dažniau nei kas --cooldown-days."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--today", type=str, help="(Testams) Šiandienos data YYYY-MM-DD.")
+        parser.add_argument(
+            "--cooldown-days",
+            type=int,
+            default=DEFAULT_COOLDOWN_DAYS,
+            help=f"Klientui priminimas siunčiamas ne dažniau nei kas tiek dienų (default: {DEFAULT_COOLDOWN_DAYS}).",
+        )
+        parser.add_argument(
+            "--grace-days",
+            type=int,
+            default=0,
+            help="Kiek dienų po mokėjimo termino dar nelaikyti sąskaitos pradelsta (default: 0).",
+        )
+        parser.add_argument(
+            "--max-reminders",
+            type=int,
+            default=0,
+            help="Daugiausiai priminimų vienai sąskaitai (0 – neribota).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Kiek laiškų (su priedais) paruošti vienu paketu (default: {DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Tik parodyti, kam būtų siunčiama.")
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options["today"]) if options.get("today") else timezone.localdate()
+        except ValueError:
+            raise CommandError("Netinkama --today data (YYYY-MM-DD).")
+
+        now = timezone.now()
+        invoices = list(
+            self.overdue_invoices(
+                today - timedelta(days=max(0, options["grace_days"])),
+                now - timedelta(days=max(0, options["cooldown_days"])),
+                max_reminders=max(0, options["max_reminders"]),
+            )
+        )
+        if not invoices:
+            self.stdout.write(self.style.SUCCESS("Pradelstų sąskaitų, kurioms reikia priminimo, nėra ✅"))
+            return
+
+        profiles = get_profiles({inv.client_id: inv.client for inv in invoices}.values())
+
+        # Laiškai (su PDF / UBL priedais) sudaromi tik siunčiant, po paketą – čia tik gavėjai ir sąskaitos
+        reminders = []
+        for client_id, group in groupby(invoices, key=lambda inv: inv.client_id):
+            group = list(group)
+            client = group[0].client
+            recipients = profiles[client_id].recipients
+            if not recipients:
+                self.stdout.write(self.style.WARNING(f"⚠️ Klientas {client.name} neturi el. pašto – praleidžiu."))
+                continue
+            reminders.append((group, recipients))
+
+        if options["dry_run"]:
+            for group, recipients in reminders:
+                self.stdout.write(f"  {', '.join(recipients)}: {self.build_subject(group)} ({len(group)} sąsk.)")
+            self.stdout.write(self.style.SUCCESS(f"--dry-run: būtų išsiųsta priminimų {len(reminders)}"))
+            return
+
+        sent = self.send_batches(reminders, max(1, options["batch_size"]), today)
+        self.stdout.write(self.style.SUCCESS(f"Priminimai išsiųsti ✅ {sent} klientams"))
+
+    def overdue_invoices(self, overdue_before: date, reminded_before, *, max_reminders: int = 0):
+        """
+        Visos pradelstos sąskaitos viena užklausa (indeksas paid, due_date).
+
+        Klientas praleidžiamas, jei bent vienai jo sąskaitai priminimas siųstas per cooldown –
+        kad naujai pradelsta sąskaita nesukeltų antro laiško tam pačiam klientui.
+        """
+        recently_reminded = Invoice.objects.filter(
+            client_id=OuterRef("client_id"),
+            last_reminder_at__gte=reminded_before,
+        )
+        qs = (
+            Invoice.objects.filter(paid=False, due_date__lt=overdue_before)
+            # Išankstinių (hosting) sąskaitų priminimus siunčia check_subscription
+            .exclude(invoice_type="hosting")
+            .filter(~Exists(recently_reminded))
+            .select_related("client")
+            .order_by("client_id", "due_date", "id")
+        )
+        if max_reminders:
+            qs = qs.filter(reminder_count__lt=max_reminders)
+        return qs
+
+    @staticmethod
+    def build_subject(invoices: list[Invoice]) -> str:
+        client = invoices[0].client
+        if len(invoices) == 1:
+            return f"PRIMINIMAS: neapmokėta sąskaita {invoices[0].number} – {client.name}"
+        return f"PRIMINIMAS: neapmokėtos sąskaitos ({len(invoices)}) – {client.name}"
+
+    def build_message(self, invoices: list[Invoice], recipients: list[str], today: date) -> EmailMessage:
+        # --- TEST REŽIMAS (kaip generate_monthly_invoices.send_invoice_email) ---
+        SEND_ONLY_TO_ADMIN = True
+        ADMIN_EMAIL = getattr(settings, "ADMIN_INVOICE_EMAIL", "vyga@infsis.lt")
+        # --------------------
+
+        if SEND_ONLY_TO_ADMIN:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"TEST režimas: klientui {invoices[0].client.name} priminimas nesiunčiamas. Vietoje to siunčiama tik į {ADMIN_EMAIL}. Originalūs gavėjai: {', '.join(recipients)}"
+                )
+            )
+            recipients = [ADMIN_EMAIL]
+
+        total = sum((inv.total_amount for inv in invoices), Decimal("0.00"))
+        lines = "\n".join(
+            f"- {inv.number}, išrašyta {inv.issued_date}, apmokėti iki {inv.due_date} "
+            f"(vėluoja {(today - inv.due_date).days} d.): {inv.total_amount:.2f} €"
+            for inv in invoices
+        )
+        body = (
+            "Sveiki,\n\n"
+            "primename, kad šios sąskaitos dar neapmokėtos:\n\n"
+            f"{lines}\n\n"
+            f"Iš viso: {total:.2f} €\n\n"
+            "Jei jau apmokėjote – ačiū, šį laišką galite ignoruoti.\n\n"
+            "Geros dienos.\n"
+        )
+        msg = EmailMessage(
+            subject=self.build_subject(invoices),
+            body=body,
+            from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@localhost"),
+            to=recipients,
+        )
+        for inv in invoices:
+            if inv.pdf:
+                with inv.pdf.open("rb") as f:
+                    msg.attach(f"{inv.number}.pdf", f.read(), "application/pdf")
+            if inv.ubl:
+                with inv.ubl.open("rb") as f:
+                    msg.attach(f"{inv.number}.xml", f.read(), "application/xml")
+        return msg
+
+    def send_batches(self, reminders, batch_size: int, today: date) -> int:
+        """
+        Siunčia per vieną SMTP prisijungimą. Laiškai su priedais sudaromi po batch_size (atmintyje –
+        tik vienas paketas). Po kiekvieno išsiųsto laiško jo sąskaitoms padidinamas reminder_count ir
+        nustatomas last_reminder_at – nukritus viduryje, jau išsiųsti priminimai pakartotinai nesiunčiami.
+        """
+        sent = 0
+        with get_connection() as connection:
+            for start in range(0, len(reminders), batch_size):
+                batch = reminders[start : start + batch_size]
+                messages = [(self.build_message(group, recipients, today), group) for group, recipients in batch]
+                for msg, group in messages:
+                    msg.connection = connection
+                    connection.send_messages([msg])
+
+                    now = timezone.now()
+                    Invoice.objects.filter(id__in=[inv.pk for inv in group]).update(
+                        reminder_count=F("reminder_count") + 1,
+                        last_reminder_at=now,
+                        updated_at=now,
+                    )
+                    sent += 1
+                self.stdout.write(f"📧 Paketas: {len(batch)} laiškų")
+        return sent
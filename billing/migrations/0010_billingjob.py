@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0009_remove_invoice_net_ammount_invoice_net_amount_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='net_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Suma be PVM (€)'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Suma su PVM (€)'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='vat_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='PVM suma (€)'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='vat_rate',
+            field=models.DecimalField(decimal_places=4, default=0.21, max_digits=5, verbose_name='PVM tarifas'),
+        ),
+        migrations.CreateModel(
+            name='BillingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('monthly', 'Mėnesinės sąskaitos'), ('hosting', 'Hostingo patikra'), ('pdf', 'PDF generavimas'), ('optimum', 'Optimum eksportas')], max_length=20, verbose_name='Tipas')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Parametrai')),
+                ('status', models.CharField(choices=[('pending', 'Laukia'), ('running', 'Vykdoma'), ('done', 'Atlikta'), ('failed', 'Nepavyko')], default='pending', max_length=20, verbose_name='Būsena')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Sukurta')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Pradėta')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Baigta')),
+                ('error', models.TextField(blank=True, verbose_name='Klaida')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='billing_bil_status_77dae4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0010_billingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_from', models.DateField(verbose_name='Periodas nuo')),
+                ('period_to', models.DateField(verbose_name='Periodas iki')),
+                ('issued_date', models.DateField(verbose_name='Išrašymo data')),
+                ('shard', models.CharField(blank=True, max_length=20, verbose_name='Shard (i/N)')),
+                ('export_optimum', models.BooleanField(default=False, verbose_name='Eksportuoti į Optimum')),
+                ('status', models.CharField(choices=[('running', 'Vykdoma'), ('done', 'Baigta'), ('failed', 'Baigta su klaidomis')], default='running', max_length=20, verbose_name='Būsena')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Pradėta')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Baigta')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BillingRunItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skipped', models.BooleanField(default=False, verbose_name='Praleista')),
+                ('done', models.BooleanField(default=False, verbose_name='Atlikta')),
+                ('invoice_created_at', models.DateTimeField(blank=True, null=True, verbose_name='Sąskaita sukurta')),
+                ('pdf_rendered_at', models.DateTimeField(blank=True, null=True, verbose_name='PDF sugeneruotas')),
+                ('emailed_at', models.DateTimeField(blank=True, null=True, verbose_name='Išsiųsta')),
+                ('exported_at', models.DateTimeField(blank=True, null=True, verbose_name='Eksportuota į Optimum')),
+                ('last_error', models.TextField(blank=True, verbose_name='Paskutinė klaida')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='billing_run_items', to='billing.client', verbose_name='Klientas')),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='billing_run_items', to='billing.invoice', verbose_name='Sąskaita')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='billing.billingrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run', 'done'], name='billing_bil_run_id_30368b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('run', 'client'), name='billing_runitem_run_client_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0011_billingrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='worklog',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Importo raktas'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0012_worklog_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Atnaujinta'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['issued_date', 'id'], name='billing_inv_issued__418984_idx'),
+        ),
+    ]
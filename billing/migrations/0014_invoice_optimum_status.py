@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0013_invoice_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='optimum_error',
+            field=models.TextField(blank=True, verbose_name='Optimum klaida'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='optimum_exported_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Optimum eksportas'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='optimum_status',
+            field=models.CharField(blank=True, choices=[('', 'Neeksportuota'), ('exported', 'Eksportuota'), ('failed', 'Klaida')], default='', max_length=20, verbose_name='Optimum būsena'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0014_invoice_optimum_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='optimum_status',
+            field=models.CharField(blank=True, choices=[('', 'Neeksportuota'), ('exported', 'Eksportuota'), ('failed', 'Klaida'), ('deferred', 'Atidėta (Optimum nepasiekiamas)')], default='', max_length=20, verbose_name='Optimum būsena'),
+        ),
+    ]
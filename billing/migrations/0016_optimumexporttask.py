@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0015_invoice_optimum_status_deferred'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='billingrunitem',
+            name='exported_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Įtraukta į Optimum eilę'),
+        ),
+        migrations.CreateModel(
+            name='OptimumExportTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Laukia'), ('running', 'Siunčiama'), ('done', 'Eksportuota'), ('failed', 'Nepavyko')], default='pending', max_length=20, verbose_name='Būsena')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Bandymų')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Siųsti ne anksčiau')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Sukurta')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Pradėta')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Baigta')),
+                ('last_error', models.TextField(blank=True, verbose_name='Paskutinė klaida')),
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='optimum_task', to='billing.invoice', verbose_name='Sąskaita')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='billing_opt_status_83f55e_idx')],
+            },
+        ),
+    ]
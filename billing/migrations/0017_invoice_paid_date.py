@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0016_optimumexporttask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='paid_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Apmokėjimo data'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='payment_reference',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Mokėjimo nuoroda'),
+        ),
+    ]
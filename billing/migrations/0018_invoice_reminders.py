@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0017_invoice_paid_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='last_reminder_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Paskutinis priminimas'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='reminder_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Priminimų skaičius'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['paid', 'due_date'], name='billing_inv_paid_cc6b4b_idx'),
+        ),
+    ]
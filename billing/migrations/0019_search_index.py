@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+# MySQL: FULLTEXT indeksai paieškai (billing.services.search). Pirmas FULLTEXT indeksas InnoDB lentelei
+# ją perkuria (prideda FTS_DOC_ID), todėl didelėje billing_worklog migracija gali užtrukti.
+FULLTEXT_INDEXES = [
+    ("billing_client", "billing_client_search_ft", ["name", "company_code", "vat_code"]),
+    ("billing_worklog", "billing_worklog_description_ft", ["description"]),
+]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    qn = schema_editor.quote_name
+    for table, name, columns in FULLTEXT_INDEXES:
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {qn(name)} ON {qn(table)} ({', '.join(qn(c) for c in columns)})"
+        )
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    qn = schema_editor.quote_name
+    for table, name, _columns in FULLTEXT_INDEXES:
+        schema_editor.execute(f"DROP INDEX {qn(name)} ON {qn(table)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0018_invoice_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20, verbose_name='Modelis')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Objekto ID')),
+                ('token', models.CharField(max_length=32, verbose_name='Žodis')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='billing_sea_kind_ed6b35_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'token', 'object_id'), name='billing_searchtoken_uniq')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0019_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='ubl',
+            field=models.FileField(blank=True, null=True, upload_to='invoices/%Y/%m/', verbose_name='UBL XML'),
+        ),
+    ]
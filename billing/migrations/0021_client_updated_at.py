@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0020_invoice_ubl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Atnaujinta'),
+        ),
+    ]
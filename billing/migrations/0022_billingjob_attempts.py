@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0021_client_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='Bandymų'),
+        ),
+    ]
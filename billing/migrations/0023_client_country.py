@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0022_billingjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='country',
+            field=models.CharField(default='LT', max_length=2, verbose_name='Šalis'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Client(models.Model):
@@ -7,7 +8,10 @@ class Client(models.Model):
     vat_code = models.CharField("PVM kodas", max_length=50, blank=True)
     email = models.EmailField("El. paštas", blank=True)
     address = models.TextField("Adresas", blank=True)
+    # ISO 3166-1 alpha-2 (el. sąskaitoms: UBL, i.SAF)
+    country = models.CharField("Šalis", max_length=2, default="LT")
     active = models.BooleanField("Aktyvus", default=True)
+    updated_at = models.DateTimeField("Atnaujinta", auto_now=True)
 
     def __str__(self):
         return self.name
@@ -109,6 +113,15 @@ class WorkLog(models.Model):
         default=False,
     )
 
+    # Kliento (pvz. laiko apskaitos sistemos) pateiktas raktas – tas pats įrašas importuojamas tik kartą
+    idempotency_key = models.CharField(
+        "Importo raktas",
+        max_length=100,
+        unique=True,
+        null=True,
+        blank=True,
+    )
+
 
     def total_price(self):
         return self.quantity * self.unit_price
@@ -123,6 +136,13 @@ class Invoice(models.Model):
         ("hosting", "Hostingo avansinė"),
     ]
 
+    OPTIMUM_STATUS_CHOICES = [
+        ("", "Neeksportuota"),
+        ("exported", "Eksportuota"),
+        ("failed", "Klaida"),
+        ("deferred", "Atidėta (Optimum nepasiekiamas)"),
+    ]
+
     number = models.CharField("Numeris", max_length=50, unique=True)
     client = models.ForeignKey(Client, on_delete=models.PROTECT, related_name="invoices")
     invoice_type = models.CharField("Tipas", max_length=20, choices=INVOICE_TYPE_CHOICES)
@@ -154,7 +174,34 @@ class Invoice(models.Model):
 
     total_amount = models.DecimalField("Suma su PVM (€)", max_digits=12, decimal_places=2)
     paid = models.BooleanField("Apmokėta", default=False)
+    paid_date = models.DateField("Apmokėjimo data", null=True, blank=True)
+    payment_reference = models.CharField("Mokėjimo nuoroda", max_length=100, blank=True)
+    reminder_count = models.PositiveIntegerField("Priminimų skaičius", default=0)
+    last_reminder_at = models.DateTimeField("Paskutinis priminimas", null=True, blank=True)
     pdf = models.FileField("PDF", upload_to="invoices/%Y/%m/", blank=True, null=True)
+    # UBL 2.1 (Peppol BIS 3.0) e. sąskaita – tame pačiame kataloge kaip PDF
+    ubl = models.FileField("UBL XML", upload_to="invoices/%Y/%m/", blank=True, null=True)
+
+    # Keičiasi kiekvieną kartą išsaugant sąskaitą; masiniuose .update() reikia nustatyti ranka.
+    # Naudojamas API ETag / Last-Modified.
+    updated_at = models.DateTimeField("Atnaujinta", auto_now=True)
+
+    optimum_status = models.CharField(
+        "Optimum būsena",
+        max_length=20,
+        choices=OPTIMUM_STATUS_CHOICES,
+        default="",
+        blank=True,
+    )
+    optimum_exported_at = models.DateTimeField("Optimum eksportas", null=True, blank=True)
+    optimum_error = models.TextField("Optimum klaida", blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["issued_date", "id"]),
+            # send_overdue_reminders: neapmokėtos ir pradelstos
+            models.Index(fields=["paid", "due_date"]),
+        ]
 
     def __str__(self):
         return f"{self.number} – {self.client.name}"
@@ -169,3 +216,180 @@ class InvoiceLine(models.Model):
 
     def __str__(self):
         return f"{self.invoice.number} – {self.description}"
+
+
+class BillingJob(models.Model):
+    """Darbas ilgai veikiančiam `billing_worker` procesui (DB eilė)."""
+
+    KIND_CHOICES = [
+        ("monthly", "Mėnesinės sąskaitos"),
+        ("hosting", "Hostingo patikra"),
+        ("pdf", "PDF generavimas"),
+        ("optimum", "Optimum eksportas"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "Laukia"),
+        ("running", "Vykdoma"),
+        ("done", "Atlikta"),
+        ("failed", "Nepavyko"),
+    ]
+
+    kind = models.CharField("Tipas", max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField("Parametrai", default=dict, blank=True)
+    status = models.CharField("Būsena", max_length=20, choices=STATUS_CHOICES, default="pending")
+    # Kiek kartų worker'is paėmė darbą (nutrūkęs „running“ darbas paimamas iš naujo)
+    attempts = models.PositiveIntegerField("Bandymų", default=0)
+    created_at = models.DateTimeField("Sukurta", auto_now_add=True)
+    started_at = models.DateTimeField("Pradėta", null=True, blank=True)
+    finished_at = models.DateTimeField("Baigta", null=True, blank=True)
+    error = models.TextField("Klaida", blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "id"])]
+
+    @classmethod
+    def enqueue(cls, kind: str, **payload) -> "BillingJob":
+        return cls.objects.create(kind=kind, payload=payload)
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_kind_display()} ({self.get_status_display()})"
+
+
+class BillingRun(models.Model):
+    """Vienas mėnesinio generavimo paleidimas (checkpoint'ams ir --resume)."""
+
+    STATUS_CHOICES = [
+        ("running", "Vykdoma"),
+        ("done", "Baigta"),
+        ("failed", "Baigta su klaidomis"),
+    ]
+
+    period_from = models.DateField("Periodas nuo")
+    period_to = models.DateField("Periodas iki")
+    issued_date = models.DateField("Išrašymo data")
+    shard = models.CharField("Shard (i/N)", max_length=20, blank=True)
+    export_optimum = models.BooleanField("Eksportuoti į Optimum", default=False)
+    status = models.CharField("Būsena", max_length=20, choices=STATUS_CHOICES, default="running")
+    started_at = models.DateTimeField("Pradėta", auto_now_add=True)
+    finished_at = models.DateTimeField("Baigta", null=True, blank=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.period_from}–{self.period_to} ({self.get_status_display()})"
+
+
+class BillingRunItem(models.Model):
+    """Vieno kliento žingsnių būsena BillingRun'e: sąskaita → PDF → el. laiškas → Optimum."""
+
+    run = models.ForeignKey(BillingRun, on_delete=models.CASCADE, related_name="items")
+    client = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name="billing_run_items",
+        verbose_name="Klientas",
+    )
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="billing_run_items",
+        verbose_name="Sąskaita",
+    )
+
+    skipped = models.BooleanField("Praleista", default=False)
+    done = models.BooleanField("Atlikta", default=False)
+
+    invoice_created_at = models.DateTimeField("Sąskaita sukurta", null=True, blank=True)
+    pdf_rendered_at = models.DateTimeField("PDF sugeneruotas", null=True, blank=True)
+    emailed_at = models.DateTimeField("Išsiųsta", null=True, blank=True)
+    exported_at = models.DateTimeField("Įtraukta į Optimum eilę", null=True, blank=True)
+
+    last_error = models.TextField("Paskutinė klaida", blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["run", "client"], name="billing_runitem_run_client_uniq"),
+        ]
+        indexes = [models.Index(fields=["run", "done"])]
+
+    def __str__(self):
+        return f"{self.run_id} – {self.client}"
+
+
+class OptimumExportTask(models.Model):
+    """
+    Optimum eksporto „outbox“ įrašas.
+
+    Sukuriamas toje pačioje transakcijoje kaip ir sąskaita (enqueue), o į Optimum siunčia atskiras
+    `drain_optimum_outbox` procesas – sąskaitos kūrimas nelaukia SOAP ir eksportas neprarandamas.
+    Viena sąskaita – vienas įrašas.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Laukia"),
+        ("running", "Siunčiama"),
+        ("done", "Eksportuota"),
+        ("failed", "Nepavyko"),
+    ]
+
+    invoice = models.OneToOneField(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name="optimum_task",
+        verbose_name="Sąskaita",
+    )
+    status = models.CharField("Būsena", max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField("Bandymų", default=0)
+    available_at = models.DateTimeField("Siųsti ne anksčiau", default=timezone.now)
+    created_at = models.DateTimeField("Sukurta", auto_now_add=True)
+    started_at = models.DateTimeField("Pradėta", null=True, blank=True)
+    finished_at = models.DateTimeField("Baigta", null=True, blank=True)
+    last_error = models.TextField("Paskutinė klaida", blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    @classmethod
+    def enqueue(cls, invoice, *, requeue: bool = False) -> "OptimumExportTask":
+        """
+        Įdeda sąskaitą į eksporto eilę. Kviesti sąskaitą kuriančios transakcijos viduje.
+
+        Jau eksportuota / galutinai nepavykusi sąskaita grąžinama į eilę tik su requeue=True.
+        """
+        task, created = cls.objects.get_or_create(invoice=invoice)
+        if requeue and not created and task.status in ("done", "failed"):
+            task.status = "pending"
+            task.attempts = 0
+            task.available_at = timezone.now()
+            task.last_error = ""
+            task.save(update_fields=["status", "attempts", "available_at", "last_error"])
+        return task
+
+    def __str__(self):
+        return f"{self.invoice} – {self.get_status_display()}"
+
+
+class SearchToken(models.Model):
+    """
+    Portabilus paieškos indeksas DB be FULLTEXT (pvz. SQLite): vienas įrašas – vienas normalizuotas
+    objekto žodis. Pildo ir naudoja billing.services.search; MySQL ieško per FULLTEXT indeksus,
+    todėl ten ši lentelė lieka tuščia.
+
+    Įrašas su tuščiu token – „žyma“: object_id yra didžiausias jau suindeksuotas id.
+    """
+
+    kind = models.CharField("Modelis", max_length=20)
+    object_id = models.PositiveBigIntegerField("Objekto ID")
+    token = models.CharField("Žodis", max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "token", "object_id"], name="billing_searchtoken_uniq"),
+        ]
+        indexes = [models.Index(fields=["kind", "object_id"])]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.token}"
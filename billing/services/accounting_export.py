@@ -0,0 +1,140 @@
+import csv
+from typing import Iterable, Iterator
+
+from billing.models import Invoice
+
+DEFAULT_CHUNK_SIZE = 2000
+
+HEADER = [
+    "Sąskaitos nr.",
+    "Išrašyta",
+    "Apmokėti iki",
+    "Tipas",
+    "Klientas",
+    "Įmonės kodas",
+    "PVM kodas",
+    "Eilutė",
+    "Kiekis",
+    "Kaina (€)",
+    "Eilutės suma be PVM (€)",
+    "PVM tarifas",
+    "Suma be PVM (€)",
+    "PVM suma (€)",
+    "Suma su PVM (€)",
+    "Apmokėta",
+]
+
+_FIELDS = (
+    "id",
+    "number",
+    "issued_date",
+    "due_date",
+    "invoice_type",
+    "client__name",
+    "client__company_code",
+    "client__vat_code",
+    "lines__description",
+    "lines__quantity",
+    "lines__unit_price",
+    "lines__total",
+    "vat_rate",
+    "net_amount",
+    "vat_amount",
+    "total_amount",
+    "paid",
+)
+
+_INVOICE_TYPES = dict(Invoice.INVOICE_TYPE_CHOICES)
+
+
+def iter_rows(queryset, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[list]:
+    """
+    Sąskaitų eilutės buhalterijai: viena eilutė – viena sąskaitos eilutė (sąskaita be eilučių – viena
+    eilutė tuščiais eilutės laukais). Sąskaitos sumos (be PVM, PVM, su PVM) įrašomos tik pirmoje
+    sąskaitos eilutėje, kad stulpelių sumos skaičiuoklėje nesidubliuotų.
+
+    Atmintyje laikomi tik sąskaitų ID; eilutės skaitomos paketais po chunk_size sąskaitų per
+    .iterator(chunk_size=...) – pymysql rezultatą buferizuoja visą, todėl be paketų metų istorija
+    vis tiek atsidurtų atmintyje. Paketai skaitomi iš tos pačios DB kaip queryset (pvz. replikos).
+    """
+    ids = list(queryset.order_by("issued_date", "number").values_list("id", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        rows = (
+            Invoice.objects.using(queryset.db)
+            .filter(id__in=ids[start : start + chunk_size])
+            .order_by("issued_date", "number", "lines__id")
+            .values_list(*_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+        previous_id = None
+        for (
+            pk,
+            number,
+            issued_date,
+            due_date,
+            invoice_type,
+            client_name,
+            company_code,
+            vat_code,
+            description,
+            quantity,
+            unit_price,
+            line_total,
+            vat_rate,
+            net_amount,
+            vat_amount,
+            total_amount,
+            paid,
+        ) in rows:
+            first = pk != previous_id
+            previous_id = pk
+            yield [
+                number,
+                issued_date,
+                due_date,
+                _INVOICE_TYPES.get(invoice_type, invoice_type),
+                client_name,
+                company_code,
+                vat_code,
+                description or "",
+                quantity,
+                unit_price,
+                line_total,
+                vat_rate,
+                net_amount if first else None,
+                vat_amount if first else None,
+                total_amount if first else None,
+                ("Taip" if paid else "Ne") if first else None,
+            ]
+
+
+class _Echo:
+    """csv.writer „failas“, kuris eilutę grąžina vietoje rašymo (StreamingHttpResponse generatoriui)."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows: Iterable[list]) -> Iterator[str]:
+    """CSV tekstas eilutėmis. Pradžioje BOM – kad Excel lietuviškas raides atpažintų kaip UTF-8."""
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(["" if value is None else value for value in row])
+
+
+def write_xlsx(rows: Iterable[list], fileobj) -> None:
+    """
+    XLSX per openpyxl write-only režimą: eilutės iškart rašomos į laikiną failą, ne laikomos atmintyje.
+    fileobj – kelias arba binarinis failas.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sąskaitos")
+    for letter, width in zip("ABCDEFGHIJKLMNOP", (14, 12, 12, 16, 32, 14, 16, 48, 9, 11, 14, 11, 14, 12, 14, 10)):
+        ws.column_dimensions[letter].width = width
+    ws.append(HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
@@ -0,0 +1,250 @@
+import os
+import tempfile
+import zipfile
+from io import BytesIO
+from typing import Iterator
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from billing.models import InvoiceLine
+
+# Mėnesio sąskaitų archyvas buhalterei / spausdinimui:
+# - ZIP su visais Invoice.pdf – rašomas srautu (atmintyje tik kopijuojamas gabalas, ne visas archyvas);
+# - vienas spausdinimo PDF – įrašyti sąskaitų PDF sujungti į vieną dokumentą, puslapiai sunumeruoti „Psl. N iš M“;
+#   objektai rašomi į failą iš karto po kiekvienos sąskaitos (atmintyje tik xref poslinkiai ir puslapių numeriai).
+# Sąskaitos skaitomos paketais po chunk_size, kaip accounting_export / ubl; eilutės užkraunamos tik toms
+# sąskaitoms, kurias reikia generuoti (be įrašyto PDF).
+
+DEFAULT_CHUNK_SIZE = 100
+COPY_CHUNK_SIZE = 64 * 1024
+
+def iter_invoices(queryset, *, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Sąskaitos (su klientu) išrašymo tvarka, paketais; skaitoma iš queryset DB. Eilutės prefetch'inamos
+    tik sąskaitoms be įrašyto PDF – įrašytų PDF eilutės nereikalingos.
+    """
+    ids = list(queryset.order_by("issued_date", "number").values_list("id", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        invoices = list(
+            queryset.model.objects.using(queryset.db)
+            .filter(id__in=ids[start : start + chunk_size])
+            .select_related("client")
+            .order_by("issued_date", "number")
+        )
+        prefetch_related_objects(
+            [invoice for invoice in invoices if not invoice.pdf],
+            Prefetch("lines", queryset=InvoiceLine.objects.order_by("id")),
+        )
+        yield from invoices
+
+
+# --- ZIP ---
+
+
+class _ZipStream:
+    """Neperžiūrimas (non-seekable) „failas“ zipfile'ui: įrašyti baitai kaupiami iki drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(queryset, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    ZIP archyvas gabalais (StreamingHttpResponse / failui). PDF jau suspausti, todėl saugomi be
+    glaudinimo (ZIP_STORED). Sąskaita be įrašyto PDF sugeneruojama atmintyje (į storage neįrašoma).
+    """
+    from billing.services.pdf import RenderedPdf
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as zf:
+        for invoice in iter_invoices(queryset, chunk_size=chunk_size):
+            info = zipfile.ZipInfo(f"{invoice.number}.pdf", date_time=invoice.issued_date.timetuple()[:6])
+            with zf.open(info, "w") as dest:
+                if invoice.pdf:
+                    with invoice.pdf.open("rb") as src:
+                        while chunk := src.read(COPY_CHUNK_SIZE):
+                            dest.write(chunk)
+                            yield stream.drain()
+                else:
+                    dest.write(RenderedPdf.render(invoice).content)
+            yield stream.drain()
+    # Centrinis katalogas
+    yield stream.drain()
+
+
+# --- spausdinimo PDF ---
+
+
+def _page_numbers_overlay(page_sizes: list[tuple[float, float]], first: int, total: int):
+    """
+    Permatomi puslapiai tik su „Psl. N iš M“ apačioje dešinėje – uždedami ant vienos sąskaitos puslapių.
+    Standartinis Helvetica (WinAnsi turi „š“) – šriftas neįterpiamas į kiekvienos sąskaitos puslapius.
+    """
+    from pypdf import PdfReader
+    from reportlab.pdfgen.canvas import Canvas
+
+    buffer = BytesIO()
+    c = Canvas(buffer, pageCompression=1)
+    for no, (width, height) in enumerate(page_sizes, start=first):
+        c.setPageSize((width, height))
+        c.setFont("Helvetica", 8)
+        c.drawRightString(width - 40 - 30, 25, f"Psl. {no} iš {total}")
+        c.showPage()
+    c.save()
+    buffer.seek(0)
+    return PdfReader(buffer)
+
+
+class _PdfStreamWriter:
+    """
+    Minimalus PDF rašytojas: objektai rašomi į failą iš karto, atmintyje lieka tik jų poslinkiai (xref)
+    ir puslapių objektų numeriai. Katalogas (1) ir puslapių medis (2) rezervuojami pradžioje, įrašomi gale.
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.position = 0
+        self.offsets: list[int | None] = [None, None]
+        self.kids: list[int] = []
+        self._write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes) -> None:
+        self.fileobj.write(data)
+        self.position += len(data)
+
+    def _reserve(self) -> int:
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def _write_object(self, idnum: int, obj) -> None:
+        buffer = BytesIO()
+        obj.write_to_stream(buffer)
+        self.offsets[idnum - 1] = self.position
+        self._write(f"{idnum} 0 obj\n".encode() + buffer.getvalue() + b"\nendobj\n")
+
+    def add_pages(self, pages) -> None:
+        """
+        Įrašo puslapius su visais jų objektais (šriftai, paveikslėliai, turinys). Nuorodos pernumeruojamos
+        į šio failo numerius; /Parent nukreipiamas į bendrą puslapių medį.
+        """
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+        class Ref(IndirectObject):
+            """Jau pernumeruota nuoroda – antrą kartą nebeliečiama."""
+
+        numbers: dict[tuple[int, int], int] = {}
+        pending = []
+
+        def ref(indirect) -> Ref:
+            key = (id(indirect.pdf), indirect.idnum)
+            if key not in numbers:
+                numbers[key] = self._reserve()
+                pending.append((numbers[key], indirect))
+            return Ref(numbers[key], 0, None)
+
+        def renumber(obj):
+            if isinstance(obj, Ref):
+                return obj
+            if isinstance(obj, IndirectObject):
+                return ref(obj)
+            if isinstance(obj, DictionaryObject):
+                for key, value in list(obj.items()):
+                    obj[key] = renumber(value)
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(obj):
+                    obj[i] = renumber(value)
+            return obj
+
+        for page in pages:
+            page[NameObject("/Parent")] = Ref(self.PAGES, 0, None)
+            self.kids.append(ref(page.indirect_reference).idnum)
+            while pending:
+                idnum, indirect = pending.pop()
+                self._write_object(idnum, renumber(indirect.get_object()))
+
+    def close(self, title: str) -> None:
+        """Puslapių medis, katalogas, metaduomenys ir xref lentelė."""
+        from pypdf.generic import DictionaryObject, NameObject, TextStringObject
+
+        kids = " ".join(f"{idnum} 0 R" for idnum in self.kids)
+        self.offsets[self.PAGES - 1] = self.position
+        self._write(f"{self.PAGES} 0 obj\n<< /Type /Pages /Count {len(self.kids)} /Kids [{kids}] >>\nendobj\n".encode())
+        self.offsets[self.CATALOG - 1] = self.position
+        self._write(f"{self.CATALOG} 0 obj\n<< /Type /Catalog /Pages {self.PAGES} 0 R >>\nendobj\n".encode())
+        info = self._reserve()
+        self._write_object(info, DictionaryObject({NameObject("/Title"): TextStringObject(title)}))
+
+        xref = self.position
+        size = len(self.offsets) + 1
+        self._write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        self._write(b"".join(f"{offset:010d} 00000 n \n".encode() for offset in self.offsets))
+        self._write(
+            f"trailer\n<< /Size {size} /Root {self.CATALOG} 0 R /Info {info} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        )
+
+
+def write_print_pdf(fileobj, queryset, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple[int, int]:
+    """
+    Visos sąskaitos viename PDF spausdinimui. Imami išrašyti (įrašyti) Invoice.pdf failai be jokių
+    pakeitimų – spausdinama tai, kas buvo išsiųsta klientui; iš naujo sugeneruojamos tik sąskaitos
+    be įrašyto PDF. Ant kiekvieno puslapio uždedamas „Psl. N iš M“. Grąžina (sąskaitų, puslapių) skaičių.
+
+    Du praėjimai: pirmas suskaičiuoja puslapius (M reikia nuo pirmo puslapio; sugeneruoti PDF
+    padedami į laikiną katalogą, kad antrame nereikėtų generuoti iš naujo), antras rašo puslapius
+    į fileobj po vieną sąskaitą. Atmintyje vienu metu – viena sąskaita.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    from billing.services.pdf import RenderedPdf
+
+    with tempfile.TemporaryDirectory(prefix="print-pdf-") as tmp:
+
+        def content(invoice) -> bytes:
+            if invoice.pdf:
+                return RenderedPdf(invoice, stored=True).content
+            path = os.path.join(tmp, f"{invoice.pk}.pdf")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read()
+            data = RenderedPdf.render(invoice).content
+            with open(path, "wb") as f:
+                f.write(data)
+            return data
+
+        page_counts = {
+            invoice.pk: len(PdfReader(BytesIO(content(invoice))).pages)
+            for invoice in iter_invoices(queryset, chunk_size=chunk_size)
+        }
+        total = sum(page_counts.values())
+
+        stream = _PdfStreamWriter(fileobj)
+        first = 1
+        for invoice in iter_invoices(queryset.filter(pk__in=list(page_counts)), chunk_size=chunk_size):
+            writer = PdfWriter()
+            for page in PdfReader(BytesIO(content(invoice))).pages:
+                writer.add_page(page)
+            pages = page_counts[invoice.pk]
+            if len(writer.pages) != pages:
+                raise RuntimeError(f"Sąskaitos {invoice.number} PDF pasikeitė eksportuojant – paleiskite iš naujo.")
+            overlay = _page_numbers_overlay([(float(p.mediabox.width), float(p.mediabox.height)) for p in writer.pages], first, total)
+            for page, numbers in zip(writer.pages, overlay.pages):
+                page.merge_page(numbers)
+                page.compress_content_streams()
+            stream.add_pages(writer.pages)
+            first += pages
+        stream.close("Sąskaitos")
+    return len(page_counts), total
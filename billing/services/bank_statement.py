@@ -0,0 +1,209 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Iterator
+
+from django.db import transaction
+from django.db.models import Case, DateField, Value, When
+from django.utils import timezone
+
+from billing.models import Invoice
+
+# Sąskaitų numeriai mokėjimo paskirtyje: MEV26-001, 202601-001 ir pan.
+_NUMBER_RE = re.compile(r"[A-Z0-9]+(?:-[A-Z0-9]+)+")
+
+# Sąskaitos išrašomos tik eurais – kitos valiutos įplauka (ar be nurodytos valiutos) nesutikrinama
+INVOICE_CURRENCY = "EUR"
+
+
+@dataclass
+class BankCredit:
+    """Viena įplauka iš išrašo (Ntry arba jo TxDtls)."""
+
+    amount: Decimal
+    currency: str
+    booking_date: date | None
+    reference: str
+    remittance: str
+    debtor: str
+
+
+@dataclass
+class StatementReport:
+    credits: int = 0
+    matched: list[tuple[BankCredit, str]] = field(default_factory=list)
+    unmatched: list[tuple[BankCredit, str]] = field(default_factory=list)
+    marked_paid: int = 0
+
+
+def _flatten(elem, out: dict, prefix: str = "") -> dict:
+    """
+    {"BookgDt/Dt": [elem], "RmtInf/Ustrd": [elem, elem], ...} – vienas praėjimas per <Ntry> vaikus
+    vietoj dešimties find() su namespace keliais (camt.053 versijos skiriasi tik namespace).
+    <TxDtls> nesileidžiam – jos skaitomos atskirai.
+    """
+    for child in elem:
+        tag = child.tag
+        if not isinstance(tag, str):
+            continue
+        local = tag[tag.rfind("}") + 1:]
+        if local == "TxDtls":
+            out.setdefault("TxDtls", []).append(child)
+        elif len(child):
+            _flatten(child, out, f"{prefix}{local}/")
+        else:
+            out.setdefault(f"{prefix}{local}", []).append(child)
+    return out
+
+
+class _Entry:
+    """Vieno <Ntry> (ar jo <TxDtls>) laukai pagal kelią be namespace."""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, elem):
+        self.fields = _flatten(elem, {})
+
+    def text(self, *paths: str) -> str:
+        for path in paths:
+            for node in self.fields.get(path, ()):
+                if node.text and node.text.strip():
+                    return node.text.strip()
+        return ""
+
+    def amount(self, *paths: str) -> tuple[Decimal, str] | None:
+        for path in paths:
+            for node in self.fields.get(path, ()):
+                try:
+                    return Decimal((node.text or "").strip()), node.get("Ccy", "")
+                except InvalidOperation:
+                    return None
+        return None
+
+    def remittance(self) -> str:
+        parts = [
+            (node.text or "").strip()
+            for path in ("RmtInf/Ustrd", "RmtInf/Strd/CdtrRefInf/Ref")
+            for node in self.fields.get(path, ())
+        ]
+        return " ".join(p for p in parts if p)
+
+    def credit(self, amount: tuple[Decimal, str], booking_date: date | None, entry_ref: str) -> "BankCredit":
+        return BankCredit(
+            amount=amount[0],
+            currency=amount[1],
+            booking_date=booking_date,
+            reference=self.text("Refs/AcctSvcrRef", "Refs/EndToEndId") or entry_ref,
+            remittance=self.remittance(),
+            debtor=self.text("RltdPties/Dbtr/Nm", "RltdPties/Dbtr/Pty/Nm"),
+        )
+
+
+def _parse_date(value: str) -> date | None:
+    try:
+        return date.fromisoformat(value[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def iter_credits(source) -> Iterator[BankCredit]:
+    """
+    Srautu skaito camt.053 išrašą (failo kelias arba file-like) ir grąžina įplaukas (CdtDbtInd=CRDT).
+
+    lxml iterparse apdoroja po vieną <Ntry> ir jį išvalo, todėl atmintis nepriklauso nuo failo dydžio.
+    Jei įraše yra kelios TxDtls (paketinis mokėjimas), kiekviena grąžinama atskirai.
+    """
+    from lxml import etree
+
+    for _event, elem in etree.iterparse(source, events=("end",), tag="{*}Ntry", huge_tree=True):
+        entry = _Entry(elem)
+        try:
+            if entry.text("CdtDbtInd") != "CRDT" or entry.text("Sts", "Sts/Cd") in ("PDNG", "INFO"):
+                continue
+
+            booking_date = _parse_date(entry.text("BookgDt/Dt", "BookgDt/DtTm"))
+            entry_ref = entry.text("AcctSvcrRef", "NtryRef")
+            tx_details = [_Entry(tx) for tx in entry.fields.get("TxDtls", ())]
+
+            if len(tx_details) <= 1:
+                amount = entry.amount("Amt")
+                if amount is not None:
+                    yield (tx_details[0] if tx_details else entry).credit(amount, booking_date, entry_ref)
+                continue
+
+            for tx in tx_details:
+                amount = tx.amount("Amt", "AmtDtls/TxAmt/Amt")
+                if amount is not None:
+                    yield tx.credit(amount, booking_date, entry_ref)
+        finally:
+            # Atlaisvinam jau apdorotus mazgus (ir ankstesnius brolius), kad medis neaugtų
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+
+class OpenInvoiceIndex:
+    """Neapmokėtos sąskaitos atmintyje: numeris → (id, suma). Užkraunama viena užklausa."""
+
+    def __init__(self):
+        self.by_number = {
+            number.upper(): (pk, Decimal(total))
+            for pk, number, total in Invoice.objects.filter(paid=False).values_list("id", "number", "total_amount")
+        }
+        self.paid_in_statement = set()
+
+    def match(self, credit: BankCredit) -> tuple[int | None, str]:
+        """Grąžina (invoice_id, numeris) arba (None, priežastis)."""
+        if credit.currency != INVOICE_CURRENCY:
+            return None, f"Įplauka {credit.currency or 'be valiutos'}, sąskaitos – {INVOICE_CURRENCY}."
+        candidates = [n for n in _NUMBER_RE.findall(credit.remittance.upper()) if n in self.by_number]
+        if not candidates:
+            return None, "Mokėjimo paskirtyje nerastas neapmokėtos sąskaitos numeris."
+
+        for number in candidates:
+            pk, total = self.by_number[number]
+            if total == credit.amount:
+                if pk in self.paid_in_statement:
+                    return None, f"Sąskaita {number} šiame išraše jau apmokėta."
+                self.paid_in_statement.add(pk)
+                return pk, number
+
+        totals = ", ".join(f"{n} – {self.by_number[n][1]:.2f}" for n in candidates)
+        return None, f"Suma {credit.amount:.2f} nesutampa ({totals})."
+
+
+def import_statements(sources, *, dry_run: bool = False) -> StatementReport:
+    """Sutikrina įplaukas su neapmokėtomis sąskaitomis ir pažymi jas apmokėtomis vienu UPDATE."""
+    report = StatementReport()
+    index = OpenInvoiceIndex()
+    paid = {}
+
+    for source in sources:
+        for credit in iter_credits(source):
+            report.credits += 1
+            invoice_id, detail = index.match(credit)
+            if invoice_id is None:
+                report.unmatched.append((credit, detail))
+                continue
+            report.matched.append((credit, detail))
+            paid[invoice_id] = credit
+
+    if paid and not dry_run:
+        with transaction.atomic():
+            report.marked_paid = Invoice.objects.filter(id__in=list(paid), paid=False).update(
+                paid=True,
+                paid_date=Case(
+                    *[When(id=pk, then=Value(credit.booking_date)) for pk, credit in paid.items()],
+                    output_field=DateField(),
+                ),
+                payment_reference=Case(
+                    *[When(id=pk, then=Value(credit.reference[:100])) for pk, credit in paid.items()],
+                    default=Value(""),
+                ),
+                updated_at=timezone.now(),
+            )
+
+    return report
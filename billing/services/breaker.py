@@ -0,0 +1,160 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+
+class CircuitOpenError(Exception):
+    """Grandinė atidaryta – išorinė paslauga laikinai nekviečiama."""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"{name}: paslauga laikinai nepasiekiama, bandysim po {int(retry_in)} s")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker su adaptyviu timeout'u išorinei paslaugai.
+
+    - Po `failure_threshold` iš eilės nepavykusių kvietimų grandinė atidaroma `cooldown` sekundėms –
+      tuo metu call() iš karto kelia CircuitOpenError (nelaukiama timeout'o).
+    - Praėjus cooldown leidžiamas vienas bandomasis kvietimas (half-open): pavyko – grandinė uždaroma,
+      nepavyko – vėl atidaroma.
+    - Timeout skaičiuojamas iš stebėto vėlinimo kaip TCP RTO: srtt + 4 * rttvar, ribose [min_timeout, max_timeout].
+
+    Būsena laikoma Django cache, todėl su bendru cache (Redis, Memcached) ji bendra visiems procesams.
+    Nesėkmių ir kvietimų skaitikliai – atskiri raktai, didinami atomiškai (cache.add + cache.incr),
+    atidarymo laikas – atskiras raktas. Vėlinimo statistika (srtt, rttvar) ir paskutinė klaida –
+    apytikslės: lygiagrečiai įrašant laimi paskutinis (timeout'ui to pakanka).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        cooldown: float = 60.0,
+        min_timeout: float = 3.0,
+        max_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+    # --- būsena ---
+
+    @property
+    def _key(self) -> str:
+        return f"circuit:{self.name}"
+
+    def _keys(self) -> dict:
+        return {
+            "stats": self._key,
+            "failures": f"{self._key}:failures",
+            "opened_until": f"{self._key}:opened_until",
+            "calls": f"{self._key}:calls",
+            "errors": f"{self._key}:errors",
+        }
+
+    def _incr(self, key: str) -> int:
+        cache.add(key, 0, timeout=None)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Raktas išmestas tarp add ir incr
+            cache.add(key, 1, timeout=None)
+            return 1
+
+    def state(self) -> dict:
+        keys = self._keys()
+        values = cache.get_many(keys.values())
+        stats = values.get(keys["stats"]) or {}
+        return {
+            "failures": values.get(keys["failures"], 0),
+            "opened_until": values.get(keys["opened_until"]),
+            "srtt": stats.get("srtt"),
+            "rttvar": stats.get("rttvar"),
+            "last_latency": stats.get("last_latency"),
+            "calls": values.get(keys["calls"], 0),
+            "errors": values.get(keys["errors"], 0),
+            "last_error": stats.get("last_error", ""),
+        }
+
+    def status(self, now: float | None = None) -> str:
+        """"closed" / "open" / "half-open"."""
+        opened_until = cache.get(self._keys()["opened_until"])
+        if opened_until is None:
+            return "closed"
+        return "open" if (now or time.time()) < opened_until else "half-open"
+
+    def timeout(self) -> float:
+        state = self.state()
+        if state["srtt"] is None:
+            return self.max_timeout
+        rto = state["srtt"] + 4 * state["rttvar"]
+        return min(self.max_timeout, max(self.min_timeout, rto))
+
+    def reset(self) -> None:
+        cache.delete_many([*self._keys().values(), f"{self._key}:probe"])
+
+    # --- kvietimas ---
+
+    def before_call(self) -> None:
+        now = time.time()
+        opened_until = cache.get(self._keys()["opened_until"])
+        if opened_until is None:
+            return
+        if now < opened_until:
+            raise CircuitOpenError(self.name, opened_until - now)
+        # half-open: tik vienas bandomasis kvietimas (cache.add – atominis tarp procesų)
+        if not cache.add(f"{self._key}:probe", 1, timeout=int(self.max_timeout) + 1):
+            raise CircuitOpenError(self.name, self.max_timeout)
+
+    def record_success(self, latency: float) -> None:
+        keys = self._keys()
+        self._incr(keys["calls"])
+        cache.set(keys["failures"], 0, timeout=None)
+        cache.delete_many([keys["opened_until"], f"{self._key}:probe"])
+
+        stats = cache.get(keys["stats"]) or {}
+        if stats.get("srtt") is None:
+            stats["srtt"], stats["rttvar"] = latency, latency / 2
+        else:
+            stats["rttvar"] = 0.75 * stats["rttvar"] + 0.25 * abs(stats["srtt"] - latency)
+            stats["srtt"] = 0.875 * stats["srtt"] + 0.125 * latency
+        stats["last_latency"] = latency
+        cache.set(keys["stats"], stats, timeout=None)
+
+    def record_failure(self, error: str) -> None:
+        keys = self._keys()
+        self._incr(keys["calls"])
+        self._incr(keys["errors"])
+        failures = self._incr(keys["failures"])
+        # Nepavykęs bandomasis (half-open) kvietimas grandinę vėl atidaro
+        if failures >= self.failure_threshold or cache.get(keys["opened_until"]) is not None:
+            cache.set(keys["opened_until"], time.time() + self.cooldown, timeout=None)
+        cache.delete(f"{self._key}:probe")
+
+        stats = cache.get(keys["stats"]) or {}
+        stats["last_error"] = error[:500]
+        cache.set(keys["stats"], stats, timeout=None)
+
+    @contextmanager
+    def call(self):
+        """
+        with breaker.call() as timeout:
+            urlopen(..., timeout=timeout)
+
+        Išimtis bloke skaitoma kaip nesėkmė (ir perkeliama toliau).
+        """
+        self.before_call()
+        started = time.monotonic()
+        try:
+            yield self.timeout()
+        except Exception as exc:
+            self.record_failure(str(exc) or exc.__class__.__name__)
+            raise
+        self.record_success(time.monotonic() - started)
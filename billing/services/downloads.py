@@ -0,0 +1,151 @@
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+PDF_TOKEN_SALT = "billing.invoice-pdf"
+
+# Kiek sekundžių galioja pasirašyta PDF nuoroda (default: 7 d.)
+DEFAULT_LINK_MAX_AGE = 7 * 24 * 3600
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def invoice_pdf_token(invoice) -> str:
+    return signing.TimestampSigner(salt=PDF_TOKEN_SALT).sign(str(invoice.pk))
+
+
+def invoice_pdf_url(invoice) -> str:
+    return reverse("billing:invoice_pdf", args=[invoice_pdf_token(invoice)])
+
+
+def invoice_id_from_token(token: str) -> int:
+    """Grąžina sąskaitos ID. Kelia signing.SignatureExpired / signing.BadSignature."""
+    max_age = getattr(settings, "INVOICE_PDF_LINK_MAX_AGE", DEFAULT_LINK_MAX_AGE)
+    return int(signing.TimestampSigner(salt=PDF_TOKEN_SALT).unsign(token, max_age=max_age))
+
+
+def pdf_response(request, fieldfile, filename: str, *, asynchronous: bool = False) -> HttpResponse:
+    """
+    Atiduoda PDF failą.
+
+    Jei nustatytas INVOICE_PDF_SENDFILE ("nginx" / "apache"), baitus siunčia priekinis serveris
+    (X-Accel-Redirect / X-Sendfile), o Python worker'is tik patikrina teises. Kitu atveju – srautu
+    iš storage su Range (206) ir If-None-Match / If-Modified-Since (304) palaikymu.
+
+    asynchronous=True – atsakymo turinys yra async iteratorius (ASGI), kad Django nesurinktų
+    viso failo į atmintį prieš siųsdamas.
+    """
+    disposition = f'inline; filename="{filename}"'
+    mode = (getattr(settings, "INVOICE_PDF_SENDFILE", "") or "").strip().lower()
+
+    if mode == "nginx":
+        prefix = getattr(settings, "INVOICE_PDF_ACCEL_PREFIX", "/protected-media/")
+        response = HttpResponse(content_type="application/pdf")
+        response["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{fieldfile.name}"
+        response["Content-Disposition"] = disposition
+        return response
+
+    if mode == "apache":
+        response = HttpResponse(content_type="application/pdf")
+        response["X-Sendfile"] = fieldfile.path
+        response["Content-Disposition"] = disposition
+        return response
+
+    return _ranged_response(request, fieldfile, disposition, asynchronous=asynchronous)
+
+
+def _ranged_response(request, fieldfile, disposition: str, *, asynchronous: bool = False) -> HttpResponse:
+    storage = fieldfile.storage
+    size = storage.size(fieldfile.name)
+    last_modified = int(storage.get_modified_time(fieldfile.name).timestamp())
+    etag = quote_etag(f"{size:x}-{last_modified:x}")
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+
+    start, end = 0, size - 1
+    status = 200
+
+    range_header = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range", "")
+    range_applies = range_header and (not if_range or if_range in (etag, http_date(last_modified)))
+    if range_applies:
+        m = _RANGE_RE.match(range_header.strip())
+        parsed = _parse_range(m, size) if m else None
+        if parsed is None:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        start, end = parsed
+        status = 206
+
+    length = end - start + 1
+    iterator = _aiter_file if asynchronous else _iter_file
+    response = StreamingHttpResponse(
+        iterator(fieldfile, start, length),
+        status=status,
+        content_type="application/pdf",
+    )
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Content-Disposition"] = disposition
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def _parse_range(m, size: int) -> tuple[int, int] | None:
+    first, last = m.group(1), m.group(2)
+    if not first and not last:
+        return None
+    if not first:
+        # "bytes=-500" – paskutiniai 500 baitų
+        suffix = int(last)
+        if suffix == 0:
+            return None
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+def _iter_file(fieldfile, start: int, length: int):
+    with fieldfile.storage.open(fieldfile.name, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def _aiter_file(fieldfile, start: int, length: int):
+    # Failo skaitymas blokuoja – kiekvienas gabalas skaitomas thread pool'e, event loop'as laisvas
+    f = await sync_to_async(fieldfile.storage.open, thread_sensitive=False)(fieldfile.name, "rb")
+    try:
+        await sync_to_async(f.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await sync_to_async(f.read, thread_sensitive=False)(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(f.close, thread_sensitive=False)()
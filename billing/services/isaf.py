@@ -0,0 +1,159 @@
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from billing.models import Invoice
+
+ISAF_NS = "http://www.vmi.lt/cms/imas/isaf"
+ISAF_VERSION = "iSAF1.2"
+DEFAULT_CHUNK_SIZE = 1000
+
+# PVM tarifas → i.SAF mokesčio kodas (VMI PVM klasifikatorius)
+TAX_CODES = {
+    Decimal("21"): "PVM1",
+    Decimal("9"): "PVM2",
+    Decimal("5"): "PVM3",
+}
+# 0 % / be PVM: Lietuvos pirkėjui – PVM neapmokestinamos paslaugos (PVM5), užsienio pirkėjui –
+# paslaugos, kurių teikimo vieta ne Lietuva (PVM14).
+# Kitokiems atvejams kodai keičiami settings.ISAF_ZERO_RATE_TAX_CODES.
+ZERO_RATE_TAX_CODES = {"domestic": "PVM5", "foreign": "PVM14"}
+
+_INVOICE_FIELDS = (
+    "id",
+    "number",
+    "issued_date",
+    "net_amount",
+    "vat_rate",
+    "vat_amount",
+    "client_id",
+    "client__name",
+    "client__company_code",
+    "client__vat_code",
+    "client__country",
+)
+
+
+class IsafError(Exception):
+    """Sąskaitos negalima įtraukti į i.SAF (pvz. nežinomas PVM tarifas)."""
+
+
+def _q(tag: str) -> str:
+    return f"{{{ISAF_NS}}}{tag}"
+
+
+def isaf_invoices(date_from: date, date_to: date):
+    # Išankstinės (hosting) sąskaitos nėra PVM sąskaitos faktūros – į registrą neįtraukiamos
+    return Invoice.objects.filter(issued_date__range=(date_from, date_to)).exclude(invoice_type="hosting")
+
+
+def write_isaf(fileobj, date_from: date, date_to: date, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Išrašytų sąskaitų registras (i.SAF, DataType „S“) rašomas srautu per lxml xmlfile: atmintyje
+    vienu metu tik vienos sąskaitos elementas ir chunk_size sąskaitų paketas. Grąžina sąskaitų skaičių.
+    """
+    from lxml import etree
+
+    seller = settings.BILLING_SELLER
+    ids = list(isaf_invoices(date_from, date_to).order_by("issued_date", "number").values_list("id", flat=True))
+
+    with etree.xmlfile(fileobj, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element(_q("iSAFFile"), nsmap={None: ISAF_NS}):
+            xf.write(_header(etree, seller, date_from, date_to))
+            with xf.element(_q("SourceDocuments")), xf.element(_q("SalesInvoices")):
+                for start in range(0, len(ids), chunk_size):
+                    rows = (
+                        Invoice.objects.filter(id__in=ids[start : start + chunk_size])
+                        .order_by("issued_date", "number")
+                        .values_list(*_INVOICE_FIELDS)
+                        .iterator(chunk_size=chunk_size)
+                    )
+                    for row in rows:
+                        xf.write(_invoice(etree, *row))
+                    xf.flush()
+    return len(ids)
+
+
+def _sub(etree, parent, tag: str, text=None):
+    el = etree.SubElement(parent, _q(tag))
+    if text is not None:
+        el.text = str(text)
+    return el
+
+
+def _header(etree, seller: dict, date_from: date, date_to: date):
+    header = etree.Element(_q("Header"), nsmap={None: ISAF_NS})
+    desc = _sub(etree, header, "FileDescription")
+    _sub(etree, desc, "FileVersion", ISAF_VERSION)
+    _sub(etree, desc, "FileDateCreated", timezone.localtime().replace(microsecond=0, tzinfo=None).isoformat())
+    _sub(etree, desc, "DataType", "S")
+    _sub(etree, desc, "SoftwareCompanyName", seller["name"])
+    _sub(etree, desc, "SoftwareName", "invoices_project")
+    _sub(etree, desc, "SoftwareVersion", "1.0")
+    _sub(etree, desc, "RegistrationNumber", seller["company_code"])
+    _sub(etree, desc, "NumberOfParts", 1)
+    _sub(etree, desc, "PartNumber", 1)
+    criteria = _sub(etree, desc, "SelectionCriteria")
+    _sub(etree, criteria, "SelectionStartDate", date_from.isoformat())
+    _sub(etree, criteria, "SelectionEndDate", date_to.isoformat())
+    return header
+
+
+def _tax_code(number: str, percentage: Decimal, country: str) -> str:
+    if not percentage:
+        codes = {**ZERO_RATE_TAX_CODES, **getattr(settings, "ISAF_ZERO_RATE_TAX_CODES", {})}
+        return codes["domestic" if country == "LT" else "foreign"]
+    tax_code = TAX_CODES.get(percentage)
+    if tax_code is None:
+        raise IsafError(f"Sąskaita {number}: nežinomas PVM tarifas {percentage} %")
+    return tax_code
+
+
+def _invoice(
+    etree, pk, number, issued_date, net_amount, vat_rate, vat_amount, client_id, name, company_code, vat_code, country
+):
+    country = (country or "LT").strip().upper()
+    percentage = (Decimal(vat_rate) * 100).normalize()
+    tax_code = _tax_code(number, percentage, country)
+
+    invoice = etree.Element(_q("Invoice"), nsmap={None: ISAF_NS})
+    _sub(etree, invoice, "InvoiceNo", number)
+    customer = _sub(etree, invoice, "CustomerInfo")
+    _sub(etree, customer, "CustomerID", client_id)
+    # Kodo neturintiems pirkėjams i.SAF reikalauja „ND“ (nėra duomenų)
+    _sub(etree, customer, "VATRegistrationNumber", (vat_code or "").strip() or "ND")
+    _sub(etree, customer, "RegistrationNumber", (company_code or "").strip() or "ND")
+    _sub(etree, customer, "Country", country)
+    _sub(etree, customer, "Name", name)
+    _sub(etree, invoice, "InvoiceDate", issued_date.isoformat())
+    _sub(etree, invoice, "InvoiceType", "SF")
+    _sub(etree, invoice, "SpecialTaxation", "")
+    _sub(etree, invoice, "References")
+    _sub(etree, invoice, "VATPointDate", issued_date.isoformat())
+    totals = _sub(etree, invoice, "DocumentTotals")
+    total = _sub(etree, totals, "DocumentTotal")
+    _sub(etree, total, "TaxableValue", f"{Decimal(net_amount):.2f}")
+    _sub(etree, total, "TaxCode", tax_code)
+    _sub(etree, total, "TaxPercentage", f"{percentage:f}")
+    _sub(etree, total, "Amount", f"{Decimal(vat_amount):.2f}")
+    return invoice
+
+
+def validate_isaf(path, xsd_path) -> int:
+    """
+    Tikrina failą pagal XSD srautu (iterparse su schema) – medis atmintyje nestatomas.
+    Kelia lxml.etree.XMLSyntaxError su pirmąja klaida. Grąžina patikrintų sąskaitų skaičių.
+    """
+    from lxml import etree
+
+    schema = etree.XMLSchema(etree.parse(str(xsd_path)))
+    count = 0
+    for _event, el in etree.iterparse(str(path), events=("end",), tag=_q("Invoice"), schema=schema):
+        count += 1
+        el.clear()
+        while el.getprevious() is not None:
+            del el.getparent()[0]
+    return count
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def advisory_lock(name: str, timeout: int = 0):
+    """
+    MySQL GET_LOCK() užraktas, bendras visiems procesams / serveriams, jungiantiems į tą pačią DB.
+
+    Grąžina True, jei užraktą gavom, False – jei jį laiko kitas procesas (po `timeout` s).
+    Užraktas laikomas iki bloko pabaigos, todėl visą darbą (transakciją + laiškus) reikia daryti jo viduje.
+
+    Kitose DB (pvz. SQLite lokaliai) užraktas neturi prasmės – visada grąžinam True.
+    """
+    if connection.vendor != "mysql":
+        yield True
+        return
+
+    # MySQL užrakto vardas ribojamas 64 simboliais
+    name = name[:64]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", [name, timeout])
+        acquired = cursor.fetchone()[0] == 1
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", [name])
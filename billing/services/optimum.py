@@ -0,0 +1,481 @@
+"""Optimum (api.optimum.lt) SOAP klientas.
+
+Atskirtas nuo billing/admin.py, kad `manage.py` paleidimas (migrate, shell ir pan.)
+nekrautų urllib/ssl/certifi – modulis importuojamas tik pirmą kartą eksportuojant.
+"""
+import os
+import ssl
+import urllib.error
+import urllib.request
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+import certifi
+from django.conf import settings
+from django.utils import timezone
+
+from billing.services.breaker import CircuitBreaker, CircuitOpenError
+
+
+# --- Eksportas į Optimum (viena eilutė) ---
+# Pagal Optimum dokumentaciją, WSDL ir SOAP veikia ir per HTTP.
+# Kai kuriuose tinkluose / momentais HTTPS sertifikatas api.optimum.lt gali turėti hostname mismatch,
+# todėl leidžiam konfigūruoti URL per ENV ir (jei reikia) naudoti HTTP.
+
+OPTIMUM_TRD_URL = (os.getenv("OPTIMUM_TRD_URL") or "https://api.optimum.lt/v1/lt/Trd.asmx").strip()
+OPTIMUM_NS = "http://api.optimum.lt/v1/lt/Trd/"
+SOAPENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+# Optimum reikalauja sandėlio kodo kiekvienai eilutei (InvArticle.StrFllCode)
+OPTIMUM_STR_FLL_CODE = (os.getenv("OPTIMUM_STR_FLL_CODE") or getattr(settings, "OPTIMUM_STR_FLL_CODE", "") or "S").strip()
+
+# Kai kuriose Optimum instaliacijose taip pat reikalaujamas atsakingo darbuotojo kodas (invoice.RspEmpCode)
+OPTIMUM_EMP_CODE = (os.getenv("OPTIMUM_EMP_CODE") or getattr(settings, "OPTIMUM_EMP_CODE", "") or "vmil").strip()
+
+# Kai Optimum lėtas ar nepasiekiamas: po N nesėkmių iš eilės grandinė atidaroma ir likusios sąskaitos
+# iš karto atidedamos ("deferred"), o ne kiekviena laukia pilno timeout'o. Timeout – pagal stebėtą vėlinimą.
+optimum_breaker = CircuitBreaker(
+    "optimum",
+    failure_threshold=int(getattr(settings, "OPTIMUM_BREAKER_FAILURES", 3)),
+    cooldown=float(getattr(settings, "OPTIMUM_BREAKER_COOLDOWN", 120)),
+    min_timeout=float(getattr(settings, "OPTIMUM_TIMEOUT_MIN", 3)),
+    max_timeout=float(getattr(settings, "OPTIMUM_TIMEOUT_MAX", 30)),
+)
+
+# Masiniai skaitymai (GetInvoices sutikrinimui) trunka ilgiau nei vienos sąskaitos eksportas:
+# atskira grandinė su fiksuotu timeout'u, kad jų vėlinimas ir nesėkmės neatidarytų eksporto grandinės.
+_bulk_timeout = float(getattr(settings, "OPTIMUM_BULK_TIMEOUT", 120))
+optimum_bulk_breaker = CircuitBreaker(
+    "optimum-bulk",
+    failure_threshold=int(getattr(settings, "OPTIMUM_BREAKER_FAILURES", 3)),
+    cooldown=float(getattr(settings, "OPTIMUM_BREAKER_COOLDOWN", 120)),
+    min_timeout=_bulk_timeout,
+    max_timeout=_bulk_timeout,
+)
+
+
+def _optimum_ssl_context():
+    """SSL context for Optimum SOAP calls.
+
+    Notes:
+    - Context is only used for HTTPS.
+    - Uses certifi CA bundle to avoid missing/old OS CA stores.
+    - You may TEMPORARILY disable verification by setting OPTIMUM_SSL_VERIFY=0 (NOT recommended).
+    - If you get hostname mismatch errors, preferred fix is either:
+        a) use OPTIMUM_TRD_URL=http://api.optimum.lt/v1/lt/Trd.asmx (no TLS), or
+        b) ask Optimum/IT to fix TLS / disable SSL inspection for api.optimum.lt.
+    """
+    if not OPTIMUM_TRD_URL.lower().startswith("https://"):
+        return None
+
+    verify = (getattr(settings, "OPTIMUM_SSL_VERIFY", None) or os.getenv("OPTIMUM_SSL_VERIFY", "1")).strip()
+    if verify in {"0", "false", "False", "no", "NO"}:
+        return ssl._create_unverified_context()
+
+    ctx = ssl.create_default_context(cafile=certifi.where())
+    ctx.check_hostname = True
+    ctx.verify_mode = ssl.CERT_REQUIRED
+    return ctx
+
+
+def _xml_escape(s: str) -> str:
+    return (
+        (s or "")
+        .replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&apos;")
+    )
+
+
+# --- Optimum SOAP helpers ---
+def _optimum_request(api_key: str, soap_action: str, body_xml: str, *, breaker: CircuitBreaker | None = None) -> bytes:
+    """Send a SOAP 1.1 request to Optimum and return raw response bytes (breaker: default optimum_breaker)."""
+    envelope = f'''<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:soap="{SOAPENV_NS}">
+  <soap:Header>
+    <Header xmlns="{OPTIMUM_NS}">
+      <Key>{_xml_escape(api_key)}</Key>
+    </Header>
+  </soap:Header>
+  <soap:Body>
+{body_xml}
+  </soap:Body>
+</soap:Envelope>'''
+
+    data = envelope.encode("utf-8")
+    req = urllib.request.Request(
+        OPTIMUM_TRD_URL,
+        data=data,
+        headers={
+            "Content-Type": "text/xml; charset=utf-8",
+            "SOAPAction": soap_action,
+        },
+        method="POST",
+    )
+
+    ctx = _optimum_ssl_context()
+    kwargs = {} if ctx is None else {"context": ctx}
+
+    # Kelia CircuitOpenError, jei grandinė atidaryta. Į nesėkmes skaičiuojami tik ryšio klaidos,
+    # timeout'ai ir 502/503/504 – SOAP Fault (500) reiškia, kad serveris atsakė.
+    answered_error = None
+    with (breaker or optimum_breaker).call() as timeout:
+        try:
+            with urllib.request.urlopen(req, timeout=timeout, **kwargs) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as exc:
+            if exc.code in (502, 503, 504):
+                raise
+            answered_error = exc
+    raise answered_error
+
+
+
+# Debug helper for dumping SOAP request/response for troubleshooting.
+def _dump_optimum_soap(prefix: str, request_xml: str, response_bytes: bytes | None) -> None:
+    """Best-effort dump of SOAP request/response for debugging (API key should already be masked by caller if needed)."""
+    try:
+        with open(f"{prefix}_request.xml", "w", encoding="utf-8") as f:
+            f.write(request_xml)
+    except Exception:
+        pass
+
+    if response_bytes is not None:
+        try:
+            with open(f"{prefix}_response.xml", "wb") as f:
+                f.write(response_bytes)
+        except Exception:
+            pass
+
+
+def _optimum_insert_cmp_transaction(api_key: str, *, no: str, date_dt: datetime, notes: str = "") -> dict:
+    """Create a company transaction in Optimum and return dict with Status/Result/Error.
+
+    Result is expected to be TransactionId (int) on success.
+    """
+    body_xml = f'''    <InsertCmpTransaction xmlns="{OPTIMUM_NS}">
+      <transaction>
+        <Date>{date_dt.isoformat()}</Date>
+        <No>{_xml_escape(no)}</No>
+        <Notes>{_xml_escape(notes)}</Notes>
+      </transaction>
+    </InsertCmpTransaction>'''
+
+    debug_dump = (os.getenv("OPTIMUM_DEBUG_SOAP", "0").strip() in {"1", "true", "True", "yes", "YES"})
+    dump_prefix = f"soap_optimum_trn_{_xml_escape(no).replace('/', '_')}"
+
+    try:
+        # Reconstruct full envelope for debugging dumps (API key masked)
+        masked_key = "***"
+        envelope_for_dump = f'''<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:soap="{SOAPENV_NS}">
+  <soap:Header>
+    <Header xmlns="{OPTIMUM_NS}">
+      <Key>{masked_key}</Key>
+    </Header>
+  </soap:Header>
+  <soap:Body>
+{body_xml}
+  </soap:Body>
+</soap:Envelope>'''
+
+        resp_bytes = _optimum_request(
+            api_key=api_key,
+            soap_action="http://api.optimum.lt/v1/lt/Trd/InsertCmpTransaction",
+            body_xml=body_xml,
+        )
+    except CircuitOpenError as exc:
+        return _deferred(exc)
+    except Exception as exc:
+        if debug_dump:
+            _dump_optimum_soap(dump_prefix, envelope_for_dump, None)
+        return {"Status": "Error", "Result": None, "Error": f"HTTP/SOAP klaida (InsertCmpTransaction): {exc}"}
+
+    try:
+        root = ET.fromstring(resp_bytes)
+        ns = {"soap": SOAPENV_NS, "opt": OPTIMUM_NS}
+        res = root.find(".//opt:InsertCmpTransactionResult", ns)
+        if res is None:
+            if debug_dump:
+                _dump_optimum_soap(dump_prefix, envelope_for_dump, resp_bytes)
+            return {"Status": "Error", "Result": None, "Error": "Nepavyko nuskaityti InsertCmpTransactionResult iš SOAP atsakymo."}
+
+        status = (res.findtext("opt:Status", default="", namespaces=ns) or "").strip()
+        result = (res.findtext("opt:Result", default="", namespaces=ns) or "").strip() or None
+        err = (res.findtext("opt:Error", default="", namespaces=ns) or "").strip() or None
+
+        if status.lower() == "success":
+            return {"Status": "Success", "Result": result, "Error": None}
+        if debug_dump:
+            _dump_optimum_soap(dump_prefix, envelope_for_dump, resp_bytes)
+        return {"Status": "Error", "Result": result, "Error": err or "Nežinoma Optimum klaida."}
+    except Exception as exc:
+        if debug_dump:
+            _dump_optimum_soap(dump_prefix, envelope_for_dump, resp_bytes)
+        return {"Status": "Error", "Result": None, "Error": f"SOAP parse klaida (InsertCmpTransaction): {exc}"}
+
+
+def export_invoice_to_optimum_single_line(invoice, *, description: str = "Suteiktos paslaugos (per mėn.)") -> dict:
+    """Export a single invoice to Optimum (InsertInvoice) using ONE article line.
+
+    - Uses client identifiers from our DB (company_code/vat_code/name).
+    - Sends ONE InvArticle with Qty=1 and UntPrice/ExtPrice = invoice.net_amount.
+    - VatTariff is sent as 0.21 (Optimum expects 21% as 0.21).
+
+    Returns dict: {"Status": "Success"|"Error"|"Deferred", "Result": <str|None>, "Error": <str|None>}.
+    "Deferred" – Optimum circuit breaker is open, the invoice was not sent (retry later).
+    """
+    api_key = (getattr(settings, "OPTIMUM_API_KEY", None) or "").strip()
+    if not api_key:
+        return {"Status": "Error", "Result": None, "Error": "Nėra nustatytas OPTIMUM_API_KEY (settings/ENV)."}
+
+    client = invoice.client
+
+    # Optimum customer identification:
+    # - If you later add a dedicated field (e.g. client.optimum_code), swap it here.
+    cst_code = (getattr(client, "company_code", None) or "").strip() or (getattr(client, "vat_code", None) or "").strip()
+    cst_vat = (getattr(client, "vat_code", None) or "").strip()
+    cst_name = (getattr(client, "name", None) or "").strip()
+
+    if not cst_code and not cst_name:
+        return {"Status": "Error", "Result": None, "Error": f"Klientui {client!r} trūksta company_code/vat_code ir name."}
+
+    # Dates
+    inv_date = getattr(invoice, "issued_date", None) or timezone.localdate()
+
+    # Amounts
+    net_amount = (invoice.net_amount or Decimal("0.00")).quantize(Decimal("0.01"))
+    if net_amount <= Decimal("0.00"):
+        return {"Status": "Error", "Result": None, "Error": f"Sąskaitos {invoice.number} neto suma yra 0.00 – nėra ką eksportuoti."}
+
+    # VAT: Optimum expects 21% as 0.21
+    vat_tariff = Decimal("0.21")
+
+    str_fll_code = OPTIMUM_STR_FLL_CODE
+    if not str_fll_code:
+        return {"Status": "Error", "Result": None, "Error": "Nėra nustatytas OPTIMUM_STR_FLL_CODE (sandėlio kodas)."}
+
+    rsp_emp_code = OPTIMUM_EMP_CODE
+    if not rsp_emp_code:
+        return {"Status": "Error", "Result": None, "Error": "Nėra nustatytas OPTIMUM_EMP_CODE (RspEmpCode)."}
+
+    cst_grp = (getattr(client, "optimum_cst_group", None) or "K")
+    cst_grp = (str(cst_grp)).strip() or "K"
+
+    # Optimum DB pas tave turi FK į dbo.Transactions (fkInvoices01), todėl prieš InsertInvoice
+    # susikuriam Transaction ir jo ID perduodam į Invoice.TransactionId.
+    trn_no = f"TRN-{invoice.number}"
+    trn_resp = _optimum_insert_cmp_transaction(
+        api_key,
+        no=trn_no,
+        date_dt=datetime.now(),
+        notes=f"Auto transaction for invoice {invoice.number}",
+    )
+    if trn_resp.get("Status") == "Deferred":
+        return trn_resp
+    if trn_resp.get("Status") != "Success" or not trn_resp.get("Result"):
+        return {"Status": "Error", "Result": None, "Error": f"Optimum Transaction nesukurtas: {trn_resp.get('Error')}"}
+
+    try:
+        transaction_id = int(str(trn_resp.get("Result")).strip())
+    except Exception:
+        return {"Status": "Error", "Result": None, "Error": f"Netinkamas TransactionId iš Optimum: {trn_resp.get('Result')}"}
+
+    # Build SOAP body XML (SOAP 1.1) and send
+    body_xml = f'''    <InsertInvoice xmlns="{OPTIMUM_NS}">
+      <invoice>
+        <Date>{inv_date.isoformat()}T00:00:00</Date>
+        <No>{_xml_escape(invoice.number)}</No>
+        <TransactionId>{transaction_id}</TransactionId>
+        <CstCompany>
+          <Code>{_xml_escape(cst_code)}</Code>
+          <VatCode>{_xml_escape(cst_vat)}</VatCode>
+          <Name>{_xml_escape(cst_name)}</Name>
+          <CstGrpFllCode>{_xml_escape(cst_grp)}</CstGrpFllCode>
+        </CstCompany>
+        <RspEmpCode>{_xml_escape(rsp_emp_code)}</RspEmpCode>
+        <Notes>{_xml_escape(description)}</Notes>
+        <Articles>
+          <InvArticle>
+            <ArtCode>PRIEZ</ArtCode>
+            <StrFllCode>{_xml_escape(str_fll_code)}</StrFllCode>
+            <Quantity>1</Quantity>
+            <UntPrice>{net_amount}</UntPrice>
+            <Discount>0</Discount>
+            <VatTariff>{vat_tariff}</VatTariff>
+            <ExtPrice>{net_amount}</ExtPrice>
+            <Notes>{_xml_escape(description)}</Notes>
+          </InvArticle>
+        </Articles>
+      </invoice>
+    </InsertInvoice>'''
+
+    try:
+        body = _optimum_request(
+            api_key=api_key,
+            soap_action="http://api.optimum.lt/v1/lt/Trd/InsertInvoice",
+            body_xml=body_xml,
+        )
+    except CircuitOpenError as exc:
+        return _deferred(exc)
+    except Exception as exc:
+        return {"Status": "Error", "Result": None, "Error": f"HTTP/SOAP klaida: {exc}"}
+
+    # Parse response
+    try:
+        root = ET.fromstring(body)
+        # Find InsertInvoiceResult node
+        ns = {
+            "soap": SOAPENV_NS,
+            "opt": OPTIMUM_NS,
+        }
+        res = root.find(".//opt:InsertInvoiceResult", ns)
+        if res is None:
+            return {"Status": "Error", "Result": None, "Error": "Nepavyko nuskaityti InsertInvoiceResult iš SOAP atsakymo."}
+
+        status = (res.findtext("opt:Status", default="", namespaces=ns) or "").strip()
+        result = (res.findtext("opt:Result", default="", namespaces=ns) or "").strip() or None
+        err = (res.findtext("opt:Error", default="", namespaces=ns) or "").strip() or None
+
+        # Normalize
+        if status.lower() == "success":
+            return {"Status": "Success", "Result": result, "Error": None}
+        return {"Status": "Error", "Result": result, "Error": err or "Nežinoma Optimum klaida."}
+    except Exception as exc:
+        return {"Status": "Error", "Result": None, "Error": f"SOAP parse klaida: {exc}"}
+
+
+# --- Sąskaitų sąrašas iš Optimum (sutikrinimui) ---
+
+@dataclass
+class OptimumInvoice:
+    number: str
+    date: date | None
+    net_amount: Decimal
+
+
+def _parse_optimum_invoice(node, ns: dict) -> OptimumInvoice:
+    """
+    GetInvoices grąžina tą patį Invoice tipą, kurį siunčiam InsertInvoice (No, Date, Articles/InvArticle).
+    Kitokia struktūra – RuntimeError, kad sutikrinimas nepalaikytų visų sąskaitų „trūkstamomis“.
+    """
+    number = (node.findtext("opt:No", default="", namespaces=ns) or "").strip()
+    if not number:
+        raise RuntimeError("Netikėta GetInvoices atsakymo struktūra: Invoice be No.")
+
+    raw_date = (node.findtext("opt:Date", default="", namespaces=ns) or "").strip()
+    try:
+        inv_date = datetime.fromisoformat(raw_date).date() if raw_date else None
+    except ValueError:
+        inv_date = None
+
+    # Neto suma – eilučių ExtPrice suma (taip, kaip ją siunčia export_invoice_to_optimum_single_line)
+    net = Decimal("0.00")
+    prices = node.findall("opt:Articles/opt:InvArticle/opt:ExtPrice", ns)
+    if not prices:
+        raise RuntimeError(f"Netikėta GetInvoices atsakymo struktūra: sąskaita {number} be Articles/InvArticle/ExtPrice.")
+    for price in prices:
+        try:
+            net += Decimal((price.text or "0").strip())
+        except InvalidOperation:
+            raise RuntimeError(f"Optimum sąskaitos {number} ExtPrice neišparsuojama: {price.text!r}")
+
+    return OptimumInvoice(number=number, date=inv_date, net_amount=net.quantize(Decimal("0.01")))
+
+
+def fetch_optimum_invoices(date_from: date, date_to: date, *, chunk_days: int = 31) -> dict[str, OptimumInvoice]:
+    """
+    Parsiunčia Optimum pardavimo sąskaitas už laikotarpį (GetInvoices) ir grąžina indeksą {numeris: OptimumInvoice}.
+
+    Laikotarpis skaidomas į chunk_days dienų langus – vienas SOAP kvietimas langui, o ne po vieną
+    bandomąjį InsertInvoice kiekvienai sąskaitai. Kelia RuntimeError / CircuitOpenError, jei nepavyksta
+    arba atsakymo struktūra ne tokia, kokios tikimasi. OPTIMUM_DEBUG_SOAP=1 – kiekvieno lango atsakymas
+    įrašomas į soap_optimum_getinvoices_<nuo>_response.xml (struktūrai patikrinti su tikru Optimum).
+    """
+    api_key = (getattr(settings, "OPTIMUM_API_KEY", None) or "").strip()
+    if not api_key:
+        raise RuntimeError("Nėra nustatytas OPTIMUM_API_KEY (settings/ENV).")
+
+    ns = {"soap": SOAPENV_NS, "opt": OPTIMUM_NS}
+    debug_dump = os.getenv("OPTIMUM_DEBUG_SOAP", "0").strip() in {"1", "true", "True", "yes", "YES"}
+    index = {}
+
+    window_from = date_from
+    while window_from <= date_to:
+        window_to = min(window_from + timedelta(days=chunk_days - 1), date_to)
+        body_xml = f'''    <GetInvoices xmlns="{OPTIMUM_NS}">
+      <filter>
+        <DateFrom>{window_from.isoformat()}T00:00:00</DateFrom>
+        <DateTill>{window_to.isoformat()}T23:59:59</DateTill>
+      </filter>
+    </GetInvoices>'''
+
+        try:
+            body = _optimum_request(
+                api_key=api_key,
+                soap_action="http://api.optimum.lt/v1/lt/Trd/GetInvoices",
+                body_xml=body_xml,
+                breaker=optimum_bulk_breaker,
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as exc:
+            raise RuntimeError(f"HTTP/SOAP klaida (GetInvoices {window_from}–{window_to}): {exc}")
+        if debug_dump:
+            _dump_optimum_soap(f"soap_optimum_getinvoices_{window_from:%Y%m%d}", body_xml, body)
+
+        try:
+            root = ET.fromstring(body)
+        except ET.ParseError as exc:
+            raise RuntimeError(f"SOAP parse klaida (GetInvoices): {exc}")
+
+        res = root.find(".//opt:GetInvoicesResult", ns)
+        if res is None:
+            raise RuntimeError("Nepavyko nuskaityti GetInvoicesResult iš SOAP atsakymo.")
+        status = (res.findtext("opt:Status", default="", namespaces=ns) or "").strip()
+        if status.lower() != "success":
+            err = (res.findtext("opt:Error", default="", namespaces=ns) or "").strip()
+            raise RuntimeError(f"Optimum GetInvoices klaida: {err or 'nežinoma klaida'}")
+
+        result = res.find("opt:Result", ns)
+        for node in () if result is None else result:
+            if node.tag != f"{{{OPTIMUM_NS}}}Invoice":
+                raise RuntimeError(f"Netikėta GetInvoices atsakymo struktūra: Result/{node.tag} (tikėtasi Invoice).")
+            parsed = _parse_optimum_invoice(node, ns)
+            index[parsed.number] = parsed
+
+        window_from = window_to + timedelta(days=1)
+
+    return index
+
+
+def _deferred(exc: CircuitOpenError) -> dict:
+    return {"Status": "Deferred", "Result": None, "Error": f"Atidėta: {exc}"}
+
+
+def is_duplicate_error(error: str | None) -> bool:
+    """Optimum atmeta jau įkeltą numerį – tokią sąskaitą laikom eksportuota."""
+    err = (error or "").lower()
+    return "duplicate" in err or "besidubliuoj" in err
+
+
+def record_export_result(invoice, res: dict) -> str:
+    """Įrašo eksporto rezultatą į Invoice.optimum_* laukus ir grąžina naują būseną."""
+    from billing.models import Invoice
+
+    now = timezone.now()
+    if res.get("Status") == "Success" or is_duplicate_error(res.get("Error")):
+        fields = {"optimum_status": "exported", "optimum_exported_at": now, "optimum_error": ""}
+    elif res.get("Status") == "Deferred":
+        fields = {"optimum_status": "deferred", "optimum_error": res.get("Error") or ""}
+    else:
+        fields = {"optimum_status": "failed", "optimum_error": res.get("Error") or ""}
+
+    Invoice.objects.filter(pk=invoice.pk).update(updated_at=now, **fields)
+    for name, value in fields.items():
+        setattr(invoice, name, value)
+    return fields["optimum_status"]
@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from billing.models import Invoice, OptimumExportTask
+
+DEFAULT_BATCH_SIZE = 20
+MAX_ATTEMPTS = 5
+
+# „running“ įrašas, kurio drainer'is nebaigė per tiek laiko (procesas nukrito), vėl paimamas.
+# started_at pažymimas prieš kiekvieną SOAP kvietimą, todėl langas turi viršyti tik vieną kvietimą
+# (≤ 2 × OPTIMUM_TIMEOUT_MAX), ne visą paketą. Jei sąskaita jau buvo nusiųsta, Optimum atsakys
+# „duplicate“ – tai laikoma sėkme.
+STALE_RUNNING_AFTER = timedelta(minutes=10)
+
+
+@dataclass
+class DrainReport:
+    exported: int = 0
+    deferred: int = 0
+    retry: int = 0
+    failed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.exported + self.deferred + self.retry + self.failed
+
+
+def claim_tasks(batch_size: int = DEFAULT_BATCH_SIZE, *, invoice_ids=None) -> list[OptimumExportTask]:
+    """
+    Paima iki batch_size laukiančių užduočių (SELECT ... FOR UPDATE SKIP LOCKED) ir pažymi jas „running“.
+
+    Transakcija trumpa – užrakinta tik kol keičiama būsena, o SOAP kvietimai vyksta jau po commit,
+    todėl lygiagretūs drainer'iai vienas kito nelaukia ir tos pačios užduoties nepaima.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = OptimumExportTask.objects.select_for_update(skip_locked=True).filter(
+            Q(status="pending", available_at__lte=now)
+            | Q(status="running", started_at__lt=now - STALE_RUNNING_AFTER)
+        )
+        if invoice_ids is not None:
+            qs = qs.filter(invoice_id__in=invoice_ids)
+        ids = list(qs.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return []
+        OptimumExportTask.objects.filter(id__in=ids).update(status="running", started_at=now, attempts=F("attempts") + 1)
+    return list(OptimumExportTask.objects.filter(id__in=ids).order_by("id"))
+
+
+def drain_optimum_outbox(batch_size: int = DEFAULT_BATCH_SIZE, *, invoice_ids=None) -> DrainReport:
+    """Išsiunčia vieną paketą užduočių į Optimum ir įrašo rezultatus (sąskaitoje ir užduotyje)."""
+    from billing.services.optimum import export_invoice_to_optimum_single_line, optimum_breaker, record_export_result
+
+    report = DrainReport()
+    tasks = claim_tasks(batch_size, invoice_ids=invoice_ids)
+    invoices = Invoice.objects.select_related("client").in_bulk([task.invoice_id for task in tasks])
+
+    for task in tasks:
+        # Prieš siunčiant – nauja started_at žymė. Jei ankstesni paketo kvietimai užtruko ilgiau nei
+        # STALE_RUNNING_AFTER ir užduotį jau paėmė kitas drainer'is, ji čia praleidžiama.
+        started_at = timezone.now()
+        claimed = OptimumExportTask.objects.filter(pk=task.pk, status="running", started_at=task.started_at)
+        if not claimed.update(started_at=started_at):
+            continue
+        task.started_at = started_at
+
+        invoice = invoices[task.invoice_id]
+        res = export_invoice_to_optimum_single_line(invoice)
+        status = record_export_result(invoice, res)
+        now = timezone.now()
+
+        if status == "exported":
+            fields = {"status": "done", "finished_at": now, "last_error": ""}
+            report.exported += 1
+        elif status == "deferred":
+            # Grandinė atidaryta – bandymas neskaičiuojamas, grįžtam po cooldown
+            fields = {
+                "status": "pending",
+                "attempts": F("attempts") - 1,
+                "available_at": now + timedelta(seconds=optimum_breaker.cooldown),
+                "last_error": res.get("Error") or "",
+            }
+            report.deferred += 1
+        elif task.attempts < MAX_ATTEMPTS:
+            fields = {
+                "status": "pending",
+                "available_at": now + timedelta(minutes=2 ** task.attempts),
+                "last_error": res.get("Error") or "",
+            }
+            report.retry += 1
+        else:
+            fields = {"status": "failed", "finished_at": now, "last_error": res.get("Error") or ""}
+            report.failed += 1
+
+        OptimumExportTask.objects.filter(pk=task.pk).update(**fields)
+
+    return report
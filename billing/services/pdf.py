@@ -1,6 +1,5 @@
-import os
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import threading
+from functools import lru_cache
 from django.conf import settings
 from pathlib import Path
 from io import BytesIO
@@ -9,17 +8,34 @@ from decimal import Decimal
 from django.core.files.base import ContentFile
 from django.utils import timezone
 
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+# reportlab importuojamas tik generuojant PDF (žr. _ensure_fonts / generate_invoice_pdf),
+# kad `manage.py migrate`, `shell` ir pan. nemokėtų už ~1 MB TTF šriftų parsinimą.
 
 FONT_PATH = Path(settings.BASE_DIR) / "billing" / "assets" / "fonts" / "DejaVuSans.ttf"
 FONT_PATH2 = Path(settings.BASE_DIR) / "billing" / "assets" / "fonts" / "DejaVuSans-Bold.ttf"
 
 LOGO_PATH = Path(settings.BASE_DIR) / "billing" / "assets" / "logo.png"
 
-pdfmetrics.registerFont(TTFont("DejaVu", FONT_PATH))
-pdfmetrics.registerFont(TTFont("DejaVu-Bold", FONT_PATH2))
+_fonts_lock = threading.Lock()
+_fonts_registered = False
+
+
+def _ensure_fonts() -> None:
+    """Užregistruoja DejaVu šriftus reportlab'e (tik vieną kartą procesui)."""
+    global _fonts_registered
+    if _fonts_registered:
+        return
+
+    with _fonts_lock:
+        if _fonts_registered:
+            return
+
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        pdfmetrics.registerFont(TTFont("DejaVu", FONT_PATH))
+        pdfmetrics.registerFont(TTFont("DejaVu-Bold", FONT_PATH2))
+        _fonts_registered = True
 
 def amount_to_words_lt(amount):
     from decimal import Decimal
@@ -57,8 +73,31 @@ def generate_invoice_pdf(invoice) -> ContentFile:
     """
     Sugeneruoja PDF į memory ir grąžina ContentFile, kurį galima priskirti invoice.pdf.save(...)
     """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    _ensure_fonts()
+
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
+    _draw_invoice(c, invoice)
+    c.save()
+
+    pdf_bytes = buffer.getvalue()
+    buffer.close()
+
+    filename = f"{invoice.number}.pdf"
+    return ContentFile(pdf_bytes, name=filename)
+
+
+def _draw_invoice(c, invoice) -> None:
+    """
+    Nupiešia sąskaitą į jau sukurtą canvas (nuo naujo puslapio) ir baigia paskutinį jos puslapį.
+    Tas pats canvas gali gauti daug sąskaitų iš eilės (billing.services.archive – spausdinimo PDF).
+    Šriftai turi būti užregistruoti (_ensure_fonts).
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
 
     width, height = A4
     x = 40
@@ -130,18 +169,10 @@ def generate_invoice_pdf(invoice) -> ContentFile:
     # Client lines (right column)
     client_y = block_top_y - 14
     c.setFont("DejaVu", 10)
-    client_lines = [invoice.client.name]
-
-    if getattr(invoice.client, "company_code", ""):
-        client_lines.append(f"Įmonės kodas: {invoice.client.company_code}")
+    # Pavadinimas, kodai, adresas – iš jau užkrauto invoice.client (be užklausų)
+    from billing.services.profiles import address_block
 
-    if getattr(invoice.client, "vat_code", ""):
-        client_lines.append(f"PVM kodas: {invoice.client.vat_code}")
-
-    if getattr(invoice.client, "address", ""):
-        # trumpai, kad neišvažiuotų į šoną
-        addr = (invoice.client.address or "").replace("\n", ", ")
-        client_lines.append(f"Adresas: {addr[:120]}")
+    client_lines = address_block(invoice.client)
 
     for s in client_lines:
         c.drawString(right_x, client_y, s)
@@ -152,44 +183,48 @@ def generate_invoice_pdf(invoice) -> ContentFile:
 
 
     # Table header
-    c.setFont("DejaVu-Bold", 10)
-    c.drawString(x, y, "Aprašymas")
-    c.drawString(x + 330, y, "Kiekis")
-    c.drawString(x + 400, y, "Kaina")
-    c.drawString(x + 470, y, "Suma")
-    y -= 10
-    c.line(x, y, width - 40, y)
-    y -= 15
+    y = _draw_table_header(c, x, y, width)
 
     # Lines
     c.setFont("DejaVu", 10)
 
-    # 1) Lentelėje rodome tik realias paslaugų/prekių eilutes (ne PVM eilutę, jei ji buvo sukurta kaip InvoiceLine)
-    lines_qs = invoice.lines.all()
+    # 1) Lentelėje rodome tik realias paslaugų/prekių eilutes (ne PVM eilutę, jei ji buvo sukurta kaip InvoiceLine).
+    # Eilutės skaitomos paketais (_iter_lines), ilgi aprašymai laužomi į kelias eilutes; netilpus –
+    # puslapio apačioje tarpinė suma, kitame puslapyje ji perkeliama ir kartojama lentelės antraštė.
     table_total = Decimal("0.00")
+    page_no = 1
+    continued_title = f"{doc_title} Nr. {invoice.number}" if show_number else doc_title
 
-    for line in lines_qs:
+    for description, quantity, unit_price, total in _iter_lines(invoice):
         # Jei kažkur anksčiau PVM buvo sukurtas kaip atskira eilutė – jos nerodom lentelėje
-        desc_raw = (line.description or "").strip()
+        desc_raw = (description or "").strip()
         if desc_raw.lower().startswith("pvm") or desc_raw.lower() in {"vat", "vat 21%", "pvm 21%"}:
             continue
 
-        desc = desc_raw
-        if len(desc) > 55:
-            desc = desc[:52] + "..."
+        rows = _wrap(desc_raw, DESCRIPTION_WIDTH)
+        if y - (len(rows) - 1) * LINE_HEIGHT < TABLE_BOTTOM:
+            page_no += 1
+            y = _continue_on_next_page(c, x, y, width, height, continued_title, page_no, table_total)
+            y = _draw_table_header(c, x, y, width)
+            c.setFont("DejaVu", 10)
 
-        c.drawString(x, y, desc)
-        c.drawRightString(x + 370, y, f"{line.quantity}")
-        c.drawRightString(x + 450, y, f"{Decimal(str(line.unit_price)).quantize(Decimal('0.01')):.2f}")
-        c.drawRightString(x + 530, y, f"{Decimal(str(line.total)).quantize(Decimal('0.01')):.2f}")
+        # Skaičiai lygiuojami dešinėn pagal kešuotą plotį (drawRightString kaskart matuotų iš naujo)
+        for right, text in (
+            (x + 370, f"{quantity}"),
+            (x + 450, f"{Decimal(str(unit_price)).quantize(Decimal('0.01')):.2f}"),
+            (x + 530, f"{Decimal(str(total)).quantize(Decimal('0.01')):.2f}"),
+        ):
+            c.drawString(right - _text_width(text, "DejaVu", 10), y, text)
+        for row in rows:
+            c.drawString(x, y, row)
+            y -= LINE_HEIGHT
 
-        table_total += Decimal(str(line.total or 0))
+        table_total += Decimal(str(total or 0))
 
-        y -= 14
-        if y < 120:
-            c.showPage()
-            y = height - 60
-            c.setFont("DejaVu", 10)
+    # Sumų blokui reikia ~TOTALS_HEIGHT – netilpus, jis keliamas į naują puslapį
+    if y - TOTALS_HEIGHT < PAGE_BOTTOM:
+        page_no += 1
+        y = _continue_on_next_page(c, x, y, width, height, continued_title, page_no, table_total)
 
     # 2) Skaičiuojam sumas (be PVM, PVM, su PVM)
     # Jei modelyje jau turi laukus (invoice.net_amount / invoice.vat_amount / invoice.vat_rate / invoice.total_amount) – naudojam juos.
@@ -251,10 +286,225 @@ def generate_invoice_pdf(invoice) -> ContentFile:
     c.drawString(x, 40, f"Sugeneruota: {timezone.now().strftime('%Y-%m-%d %H:%M')}")
 
     c.showPage()
-    c.save()
 
-    pdf_bytes = buffer.getvalue()
-    buffer.close()
 
-    filename = f"{invoice.number}.pdf"
-    return ContentFile(pdf_bytes, name=filename)
\ No newline at end of file
+# Lentelės matmenys (pt)
+LINE_HEIGHT = 14
+DESCRIPTION_WIDTH = 280
+# Žemiau šios ribos lentelės eilutės nebepiešiamos (vieta tarpinei sumai ir poraštei)
+TABLE_BOTTOM = 120
+PAGE_BOTTOM = 60
+TOTALS_HEIGHT = 110
+LINES_CHUNK_SIZE = 1000
+
+
+def _iter_lines(invoice):
+    """
+    (aprašymas, kiekis, kaina, suma) id tvarka. Jei eilutės jau užkrautos (prefetch_related paketams) –
+    imamos iš jų, kitaip skaitomos paketais po LINES_CHUNK_SIZE pagal id (pymysql rezultatą
+    buferizuoja visą, todėl ir 10 000 eilučių sąskaita atmintyje laikoma tik po paketą).
+    """
+    prefetched = getattr(invoice, "_prefetched_objects_cache", {}).get("lines")
+    if prefetched is not None:
+        for line in prefetched:
+            yield line.description, line.quantity, line.unit_price, line.total
+        return
+
+    last_id = 0
+    while True:
+        chunk = list(
+            invoice.lines.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "description", "quantity", "unit_price", "total")[:LINES_CHUNK_SIZE]
+        )
+        if not chunk:
+            return
+        for _pk, *row in chunk:
+            yield row
+        last_id = chunk[-1][0]
+
+
+@lru_cache(maxsize=8192)
+def _text_width(text: str, font: str, size: int) -> float:
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    return stringWidth(text, font, size)
+
+
+@lru_cache(maxsize=4096)
+def _wrap(text: str, max_width: float, font: str = "DejaVu", size: int = 10) -> tuple[str, ...]:
+    """
+    Laužo tekstą pagal plotį (žodžiais; per ilgas žodis – raidėmis). TTF pločiai sumuojasi, todėl
+    kiekvienas žodis matuojamas vieną kartą (be reportlab C greitintuvo stringWidth – brangus);
+    darbų aprašymai dažnai kartojasi, todėl ir rezultatas kešuojamas.
+    """
+    if _text_width(text, font, size) <= max_width:
+        return (text,)
+
+    space = _text_width(" ", font, size)
+    rows, current, current_width = [], "", 0.0
+    for word in text.split():
+        word_width = _text_width(word, font, size)
+        if current and current_width + space + word_width <= max_width:
+            current, current_width = f"{current} {word}", current_width + space + word_width
+            continue
+        if current:
+            rows.append(current)
+        # Žodis ilgesnis už stulpelį (pvz. URL) – skaidomas raidėmis
+        while word_width > max_width:
+            cut = len(word) - 1
+            while cut > 1 and _text_width(word[:cut], font, size) > max_width:
+                cut -= 1
+            rows.append(word[:cut])
+            word = word[cut:]
+            word_width = _text_width(word, font, size)
+        current, current_width = word, word_width
+    if current:
+        rows.append(current)
+    return tuple(rows) or ("",)
+
+
+def _draw_table_header(c, x, y, width):
+    c.setFont("DejaVu-Bold", 10)
+    c.drawString(x, y, "Aprašymas")
+    c.drawString(x + 330, y, "Kiekis")
+    c.drawString(x + 400, y, "Kaina")
+    c.drawString(x + 470, y, "Suma")
+    y -= 10
+    c.line(x, y, width - 40, y)
+    return y - 15
+
+
+def _continue_on_next_page(c, x, y, width, height, title, page_no, carried):
+    """Tarpinė suma puslapio apačioje, naujas puslapis su tęsinio antrašte ir perkelta suma. Grąžina y."""
+    c.line(x, y + 4, width - 40, y + 4)
+    c.setFont("DejaVu-Bold", 10)
+    c.drawRightString(width - 40, y - 10, f"Perkelta į kitą puslapį: {carried:.2f} €")
+    c.showPage()
+
+    y = height - 50
+    c.setFont("DejaVu-Bold", 11)
+    c.drawString(x, y, f"{title} (tęsinys, {page_no} psl.)")
+    y -= 20
+    c.setFont("DejaVu", 10)
+    c.drawRightString(width - 40, y, f"Perkelta iš ankstesnio puslapio: {carried:.2f} €")
+    return y - 22
+
+
+class RenderedPdf:
+    """
+    Vieną kartą sugeneruotas sąskaitos PDF atmintyje.
+
+    Tie patys baitai naudojami įrašymui į storage (galima fone – save_async), visiems el. laiškų
+    priedams (attach_to) ir eksporto žingsniams (content), todėl failas iš disko atgal neskaitomas.
+    """
+
+    def __init__(self, invoice, content: bytes | None = None, *, stored: bool = False):
+        self.invoice = invoice
+        self._content = content
+        self.stored = stored
+        self._pending = None
+
+    @property
+    def content(self) -> bytes:
+        # Jau įrašytas PDF perskaitomas tik pirmą kartą prireikus baitų
+        if self._content is None:
+            with self.invoice.pdf.open("rb") as f:
+                self._content = f.read()
+        return self._content
+
+    @property
+    def filename(self) -> str:
+        return f"{self.invoice.number}.pdf"
+
+    @classmethod
+    def render(cls, invoice) -> "RenderedPdf":
+        return cls(invoice, generate_invoice_pdf(invoice).read())
+
+    @classmethod
+    def for_invoice(cls, invoice) -> "RenderedPdf":
+        """Jau įrašytas PDF skaitomas (vieną kartą) tik prireikus; jei jo nėra – sugeneruojamas (bet dar neįrašomas)."""
+        if getattr(invoice, "pdf", None) is not None and invoice.pdf:
+            return cls(invoice, stored=True)
+        return cls.render(invoice)
+
+    def as_file(self) -> ContentFile:
+        return ContentFile(self.content, name=self.filename)
+
+    def attach_to(self, message) -> None:
+        message.attach(self.filename, self.content, "application/pdf")
+
+    def save(self) -> None:
+        """
+        Įrašo PDF į storage ir Invoice.pdf (sinchroniškai). Atnaujinamas tik pdf laukas (UPDATE),
+        kad pasenęs objektas neperrašytų kitų laukų; pergeneruojant senas failas ištrinamas.
+        """
+        if self.stored:
+            return
+        if self._pending is not None:
+            self.wait()
+            return
+        previous = self.invoice.pdf.name
+        self.invoice.pdf.save(self.filename, self.as_file(), save=False)
+        type(self.invoice).objects.filter(pk=self.invoice.pk).update(pdf=self.invoice.pdf.name, updated_at=timezone.now())
+        if previous and previous != self.invoice.pdf.name:
+            self.invoice.pdf.storage.delete(previous)
+        self.stored = True
+
+    def save_async(self) -> None:
+        """Pradeda įrašymą fone; prieš žymint žingsnį atliktu reikia wait()."""
+        if self.stored or self._pending is not None:
+            return
+        self._pending = _storage_executor().submit(_store_pdf, self.invoice.pk, self.invoice.pdf, self.filename, self.content)
+
+    def wait(self) -> None:
+        """Palaukia fone vykdomo įrašymo (klaida perkeliama kvietėjui)."""
+        if self._pending is None:
+            return
+        name = self._pending.result()
+        self._pending = None
+        self.invoice.pdf.name = name
+        self.stored = True
+
+
+_storage_executor_lock = threading.Lock()
+_storage_executor_instance = None
+
+
+def _storage_executor():
+    global _storage_executor_instance
+    with _storage_executor_lock:
+        if _storage_executor_instance is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            _storage_executor_instance = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf-storage")
+        return _storage_executor_instance
+
+
+def _store_pdf(invoice_pk, fieldfile, filename: str, content: bytes) -> str:
+    # Fono gijoje neliečiam bendro Invoice objekto – tik storage ir vienas UPDATE
+    from django.db import connections
+
+    from billing.models import Invoice
+
+    try:
+        previous = fieldfile.name
+        name = fieldfile.field.generate_filename(fieldfile.instance, filename)
+        name = fieldfile.storage.save(name, ContentFile(content), max_length=fieldfile.field.max_length)
+        Invoice.objects.filter(pk=invoice_pk).update(pdf=name, updated_at=timezone.now())
+        if previous and previous != name:
+            fieldfile.storage.delete(previous)
+        return name
+    finally:
+        connections.close_all()
+
+
+def ensure_invoice_pdf(invoice, *, force: bool = False) -> RenderedPdf:
+    """Ensure invoice.pdf is generated and saved (force=True re-renders it, replacing the old file).
+
+    Returns the RenderedPdf, so callers can attach the same bytes to emails without reading
+    the stored file back.
+    """
+    pdf = RenderedPdf.render(invoice) if force else RenderedPdf.for_invoice(invoice)
+    pdf.save()
+    return pdf
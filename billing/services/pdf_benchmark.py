@@ -0,0 +1,207 @@
+import hashlib
+import json
+import platform
+import re
+import statistics
+import time
+import tracemalloc
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+
+from billing.models import Client, Invoice, InvoiceLine
+
+# PDF generavimo (billing.services.pdf) greičio ir išvesties regresijų rinkinys: sintetinės sąskaitos
+# be DB įrašų, bazinės reikšmės – BASELINE_PATH. Naudoja `manage.py benchmark_pdf` ir billing/tests.py.
+# Teksto ištraukimui reikia pypdf (importuojamas tik lyginant).
+
+BASELINE_PATH = Path(settings.BASE_DIR) / "billing" / "benchmarks" / "pdf_baseline.json"
+
+# Atvejis → (eilučių skaičius, ilgi lietuviški tekstai)
+CASES = {
+    "lines_1": (1, False),
+    "lines_20": (20, False),
+    "lines_500": (500, False),
+    "lines_5000": (5000, False),
+    "lithuanian_long": (60, True),
+}
+
+DEFAULT_TOLERANCE = 0.2
+
+# Neigiami id – niekada nesutampa su tikrais klientais
+_CLIENT_ID = -1
+_LONG_TEXT_CLIENT_ID = -2
+
+_WORK = (
+    "Serverio priežiūra",
+    "Programavimo darbai",
+    "Konsultacija telefonu",
+    "Duomenų bazės atsarginės kopijos",
+    "Svetainės turinio atnaujinimas",
+    "El. pašto dėžučių konfigūravimas",
+)
+
+_LONG_LT = (
+    "Įmonės buhalterinės apskaitos sistemos integracijos su elektroninių sąskaitų faktūrų posisteme "
+    "(i.SAF, UBL) diegimas, vartotojų mokymai, konfigūracijos pakeitimai pagal užsakovo pageidavimus "
+    "bei nenumatytų klaidų šalinimas – ąčęėįšųūž ĄČĘĖĮŠŲŪŽ https://pavyzdys.lt/labai/ilgas/kelias/be/tarpu"
+)
+
+# „Sugeneruota: <laikas>“ keičiasi kiekvieną kartą – lyginant tekstą pakeičiama pastoviu žymekliu
+_GENERATED_RE = re.compile(r"Sugeneruota: [0-9: -]+")
+
+
+def synthetic_invoice(line_count: int, *, long_text: bool = False) -> Invoice:
+    """Sąskaita su klientu ir eilutėmis atmintyje (eilutės – kaip prefetch_related, _iter_lines jas ima iš ten)."""
+    client_id = _LONG_TEXT_CLIENT_ID if long_text else _CLIENT_ID
+    client = Client(
+        pk=client_id,
+        name="UAB „Žemaitijos šiluminės energetikos paslaugų ir inžinerinių sprendimų centras“"
+        if long_text
+        else "UAB Testinis klientas",
+        company_code="300000000",
+        vat_code="LT300000000",
+        address="Vilniaus g. 1-23\nLT-01234 Vilnius" if not long_text else "Šiaulių pl. 123-45, Kuršėnų sen.\nŠiaulių r. sav.",
+    )
+
+    lines = []
+    for no in range(line_count):
+        if long_text:
+            description = f"{no + 1}. {_LONG_LT}"[:255]
+        else:
+            description = f"{_WORK[no % len(_WORK)]} ({no + 1})"
+        quantity = Decimal(1 + no % 4) / 2
+        unit_price = Decimal(25 + no % 7 * 5).quantize(Decimal("0.01"))
+        lines.append(
+            InvoiceLine(
+                description=description,
+                quantity=quantity.quantize(Decimal("0.01")),
+                unit_price=unit_price,
+                total=(quantity * unit_price).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+            )
+        )
+
+    net_amount = sum((line.total for line in lines), Decimal("0.00"))
+    vat_rate = Decimal("0.21")
+    vat_amount = (net_amount * vat_rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    invoice = Invoice(
+        pk=-line_count,
+        number=f"BENCH-{line_count:05d}",
+        client=client,
+        invoice_type="monthly",
+        period_from=date(2026, 1, 1),
+        period_to=date(2026, 1, 31),
+        issued_date=date(2026, 2, 1),
+        due_date=date(2026, 2, 15),
+        net_amount=net_amount,
+        vat_rate=vat_rate,
+        vat_amount=vat_amount,
+        total_amount=net_amount + vat_amount,
+    )
+    invoice._prefetched_objects_cache = {"lines": lines}
+    return invoice
+
+
+def render(invoice) -> bytes:
+    from billing.services.pdf import generate_invoice_pdf
+
+    return generate_invoice_pdf(invoice).read()
+
+
+def extract_text(content: bytes) -> str:
+    """PDF tekstas puslapiais (atskirti \\f), be kintančio generavimo laiko."""
+    from pypdf import PdfReader
+
+    pages = [page.extract_text() for page in PdfReader(BytesIO(content)).pages]
+    return _GENERATED_RE.sub("Sugeneruota: <laikas>", "\f".join(pages))
+
+
+def measure(invoice, *, min_time: float = 1.0, min_rounds: int = 3, memory: bool = True) -> dict:
+    """
+    Vienos sąskaitos matavimas: renders/s pagal generavimo laikų medianą (kartojama, kol praeina
+    min_time ir bent min_rounds kartų; mediana mažiau jautri kitų procesų triukšmui), didžiausia atmintis (tracemalloc, atskiras generavimas – jis ~10x lėtesnis), PDF dydis ir tekstas.
+    """
+    content = render(invoice)  # apšilimas: šriftai, pločių cache
+
+    timings, start = [], time.perf_counter()
+    while len(timings) < min_rounds or time.perf_counter() - start < min_time:
+        began = time.perf_counter()
+        render(invoice)
+        timings.append(time.perf_counter() - began)
+
+    result = {"renders_per_s": round(1 / statistics.median(timings), 2), "size_bytes": len(content)}
+    if memory:
+        tracemalloc.start()
+        try:
+            render(invoice)
+            result["peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        finally:
+            tracemalloc.stop()
+
+    text = extract_text(content)
+    result["pages"] = text.count("\f") + 1
+    result["text_sha256"] = hashlib.sha256(text.encode()).hexdigest()
+    result["text"] = text
+    return result
+
+
+def run(cases=None, **options) -> dict[str, dict]:
+    results = {}
+    for name in cases or CASES:
+        line_count, long_text = CASES[name]
+        results[name] = measure(synthetic_invoice(line_count, long_text=long_text), **options)
+    return results
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(results: dict[str, dict], path: Path = BASELINE_PATH) -> None:
+    """Įrašo bazines reikšmes (be paties teksto – tik jo sha256). Esami kiti atvejai paliekami."""
+    from reportlab import Version as reportlab_version
+
+    baseline = load_baseline(path)
+    cases = baseline.get("cases", {})
+    for name, result in results.items():
+        cases[name] = {key: value for key, value in result.items() if key != "text"}
+    baseline = {
+        "environment": {
+            "python": platform.python_version(),
+            "reportlab": reportlab_version,
+            "machine": platform.machine(),
+        },
+        "cases": dict(sorted(cases.items())),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+
+def compare(results: dict[str, dict], baseline: dict, *, tolerance: float = DEFAULT_TOLERANCE, speed: bool = True) -> list[str]:
+    """
+    Regresijos: pasikeitęs tekstas ar puslapių skaičius (visada klaida), PDF dydis ar atmintis
+    daugiau nei tolerance virš bazinės, renders/s daugiau nei tolerance žemiau (jei speed).
+    """
+    problems = []
+    cases = baseline.get("cases", {})
+    for name, result in results.items():
+        expected = cases.get(name)
+        if expected is None:
+            problems.append(f"{name}: nėra bazinės reikšmės (benchmark_pdf --update-baseline)")
+            continue
+        if result["text_sha256"] != expected["text_sha256"]:
+            problems.append(f"{name}: PDF tekstas pasikeitė")
+        if result["pages"] != expected["pages"]:
+            problems.append(f"{name}: puslapių {result['pages']}, buvo {expected['pages']}")
+        if result["size_bytes"] > expected["size_bytes"] * (1 + tolerance):
+            problems.append(f"{name}: PDF {result['size_bytes']} B, buvo {expected['size_bytes']} B")
+        if "peak_kb" in result and result["peak_kb"] > expected["peak_kb"] * (1 + tolerance):
+            problems.append(f"{name}: atmintis {result['peak_kb']} KB, buvo {expected['peak_kb']} KB")
+        if speed and result["renders_per_s"] < expected["renders_per_s"] * (1 - tolerance):
+            problems.append(f"{name}: {result['renders_per_s']} PDF/s, buvo {expected['renders_per_s']} PDF/s")
+    return problems
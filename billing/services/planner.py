@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from billing.models import Invoice, Subscription, WorkLog
+
+VAT_RATE = Decimal("0.21")
+
+
+@dataclass
+class PlannedLine:
+    description: str
+    quantity: Decimal
+    unit_price: Decimal
+    total: Decimal
+    work_log_id: int | None = None
+
+
+@dataclass
+class ClientPlan:
+    """Kas būtų išrašyta vienam klientui už laikotarpį (skaičiuojama atmintyje, be jokių įrašų į DB)."""
+
+    client: object
+    lines: list[PlannedLine] = field(default_factory=list)
+    existing_number: str | None = None
+    vat_rate: Decimal = VAT_RATE
+
+    @property
+    def billable(self) -> bool:
+        return bool(self.lines)
+
+    @property
+    def net_amount(self) -> Decimal:
+        return sum((line.total for line in self.lines), Decimal("0.00"))
+
+    @property
+    def vat_amount(self) -> Decimal:
+        return (self.net_amount * self.vat_rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    @property
+    def total_amount(self) -> Decimal:
+        return (self.net_amount + self.vat_amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    @property
+    def work_log_ids(self) -> list[int]:
+        return [line.work_log_id for line in self.lines if line.work_log_id is not None]
+
+
+def build_monthly_plan(clients, period_from: date, period_to: date) -> dict[int, ClientPlan]:
+    """
+    Suskaičiuoja mėnesinių sąskaitų eilutes visiems klientams keliomis bendromis užklausomis
+    (abonementai, neapmokėti darbai, jau esamos sąskaitos), o ne po kelias užklausas kiekvienam klientui.
+
+    Grąžina {client_id: ClientPlan}. Eilučių tvarka ir sumos – tokios pat, kaip generate_for_client.
+    """
+    plans = {client.pk: ClientPlan(client=client) for client in clients}
+    if not plans:
+        return plans
+
+    client_ids = list(plans)
+
+    for client_id, number in (
+        Invoice.objects.filter(
+            client_id__in=client_ids,
+            invoice_type="monthly",
+            period_from=period_from,
+            period_to=period_to,
+        )
+        .order_by("id")
+        .values_list("client_id", "number")
+    ):
+        plans[client_id].existing_number = number
+
+    # 1) Abonementai (gali būti keli) — praleidžiam 0.00
+    for sub in Subscription.objects.filter(client_id__in=client_ids, active=True).order_by("client_id", "id"):
+        sub_fee = Decimal(str(sub.monthly_fee)).quantize(Decimal("0.01"))
+        if sub_fee == Decimal("0.00"):
+            continue
+        plans[sub.client_id].lines.append(
+            PlannedLine(
+                description=f"{sub.title}",
+                quantity=Decimal("1.00"),
+                unit_price=sub_fee,
+                total=sub_fee,
+            )
+        )
+
+    # 2) Papildomi darbai (be PVM)
+    work_logs = WorkLog.objects.filter(
+        client_id__in=client_ids,
+        billed=False,
+        date__range=(period_from, period_to),
+    ).order_by("client_id", "id")
+    for work in work_logs:
+        plans[work.client_id].lines.append(
+            PlannedLine(
+                description=work.description,
+                quantity=Decimal(str(work.quantity)),
+                unit_price=Decimal(str(work.unit_price)),
+                total=Decimal(str(work.total_price())),
+                work_log_id=work.pk,
+            )
+        )
+
+    return plans
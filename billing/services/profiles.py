@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.db import transaction
+
+from billing.models import ClientEmail
+
+# Kliento sąskaitų „profilis“ (el. laiškų gavėjai) laikomas bendrame Django cache (CACHE_URL) ir
+# perskaitomas tik pasikeitus Client / ClientEmail (billing.signals). Abonementai ir kainos čia nelaikomi –
+# sąskaitų suma visada skaičiuojama iš DB (billing.services.planner). PDF pirkėjo blokas (address_block)
+# sudaromas iš jau užkrauto Client, be cache.
+# Pastaba: queryset.update() ir bulk_create signalų nesiunčia – po tokių pakeitimų kvieskit invalidate_profile().
+
+CACHE_KEY = "billing:profile:v3:{}"
+CACHE_TIMEOUT = getattr(settings, "BILLING_PROFILE_CACHE_TIMEOUT", 24 * 3600)
+
+
+@dataclass(frozen=True)
+class BillingProfile:
+    client_id: int
+    email: str
+    # ClientEmail adresai (id tvarka)
+    emails: tuple[str, ...]
+
+    @property
+    def recipients(self) -> list[str]:
+        """Sąskaitos gavėjai: ClientEmail adresai, o jei jų nėra – Client.email."""
+        if self.emails:
+            return list(self.emails)
+        return [self.email] if self.email else []
+
+    @property
+    def all_recipients(self) -> list[str]:
+        """Client.email ir visi ClientEmail adresai (be pasikartojimų)."""
+        return [email for email in dict.fromkeys((self.email, *self.emails)) if email]
+
+
+def profile_key(client_id: int) -> str:
+    return CACHE_KEY.format(client_id)
+
+
+def address_block(client) -> tuple[str, ...]:
+    """Pirkėjo eilutės PDF'e."""
+    lines = [client.name]
+    if client.company_code:
+        lines.append(f"Įmonės kodas: {client.company_code}")
+    if client.vat_code:
+        lines.append(f"PVM kodas: {client.vat_code}")
+    if client.address:
+        # trumpai, kad neišvažiuotų į šoną
+        addr = client.address.replace("\n", ", ")
+        lines.append(f"Adresas: {addr[:120]}")
+    return tuple(lines)
+
+
+def _shared_cache() -> bool:
+    """
+    Ar cache bendras visiems procesams. Proceso LocMemCache neišmetamas kituose procesuose
+    (billing_worker, kiti gunicorn workeriai) – su juo profiliai kaskart sudaromi iš DB.
+    """
+    from django.core.cache.backends.locmem import LocMemCache
+
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def _build_profiles(clients) -> dict[int, BillingProfile]:
+    """Profiliai neužkešuotiems klientams – viena bendra užklausa visiems (ne po vieną kiekvienam)."""
+    client_ids = [client.pk for client in clients]
+    emails = {pk: [] for pk in client_ids}
+
+    for client_id, email in (
+        ClientEmail.objects.filter(client_id__in=client_ids).order_by("client_id", "id").values_list("client_id", "email")
+    ):
+        if email and email not in emails[client_id]:
+            emails[client_id].append(email)
+
+    return {
+        client.pk: BillingProfile(
+            client_id=client.pk,
+            email=client.email or "",
+            emails=tuple(emails[client.pk]),
+        )
+        for client in clients
+    }
+
+
+def get_profiles(clients) -> dict[int, BillingProfile]:
+    """{client_id: BillingProfile}. Užkešuoti imami vienu cache.get_many, trūkstami sudaromi ir įrašomi."""
+    clients = {client.pk: client for client in clients}
+    if not clients:
+        return {}
+    if not _shared_cache():
+        return _build_profiles(list(clients.values()))
+
+    keys = {profile_key(pk): pk for pk in clients}
+    profiles = {keys[key]: profile for key, profile in cache.get_many(list(keys)).items()}
+
+    missing = [client for pk, client in clients.items() if pk not in profiles]
+    if missing:
+        built = _build_profiles(missing)
+        cache.set_many({profile_key(pk): profile for pk, profile in built.items()}, timeout=CACHE_TIMEOUT)
+        profiles.update(built)
+    return profiles
+
+
+def get_profile(client) -> BillingProfile:
+    return get_profiles([client])[client.pk]
+
+
+def invalidate_profile(client_id: int, *, using: str | None = None) -> None:
+    """
+    Išmeta profilį iš cache iškart ir dar kartą po transakcijos commit – kad lygiagretus procesas,
+    perskaitęs senus duomenis prieš commit, nepaliktų pasenusio profilio.
+    """
+    key = profile_key(client_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key), using=using)
@@ -0,0 +1,177 @@
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Q
+from django.db.models.expressions import RawSQL
+
+from billing.models import Client, SearchToken, WorkLog
+
+# Kurie laukai indeksuojami. MySQL FULLTEXT indeksai (migracija 0019) sukurti lygiai tiems patiems
+# stulpeliams – MATCH(...) stulpelių sąrašas turi sutapti su indeksu.
+SEARCH_FIELDS = {
+    Client: ("name", "company_code", "vat_code"),
+    WorkLog: ("description",),
+}
+
+# InnoDB innodb_ft_min_token_size (default 3): trumpesni žodžiai į FULLTEXT indeksą nepatenka
+FULLTEXT_MIN_TOKEN = 3
+TOKEN_MAX_LENGTH = 32
+INDEX_CHUNK_SIZE = 2000
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Mažosios raidės be diakritikų: „Sąskaita“ → „saskaita“ (kaip ir *_ci kolacijos MySQL)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def words(text: str) -> list[str]:
+    """Unikalūs žodžiai (mažosiomis raidėmis, su diakritikais) teksto eilės tvarka."""
+    return list(dict.fromkeys(_WORD_RE.findall((text or "").lower())))
+
+
+def tokenize(text: str) -> list[str]:
+    """Unikalūs normalizuoti žodžiai teksto eilės tvarka (SearchToken indeksui)."""
+    return list(dict.fromkeys(word[:TOKEN_MAX_LENGTH] for word in _WORD_RE.findall(normalize(text or ""))))
+
+
+def uses_fulltext(using: str = DEFAULT_DB_ALIAS) -> bool:
+    return connections[using].vendor == "mysql"
+
+
+def _kind(model) -> str:
+    return model._meta.model_name
+
+
+def _like_filter(fields, term: str) -> Q:
+    return reduce(or_, (Q(**{f"{field}__icontains": term}) for field in fields))
+
+
+def search(queryset, term: str):
+    """
+    Filtruoja queryset pagal paieškos frazę: kiekvienas frazės žodis turi būti kurio nors
+    indeksuoto lauko žodžio pradžia (AND tarp žodžių, prefiksinė paieška).
+
+    - MySQL: MATCH ... AGAINST ('+žodis* ...' IN BOOLEAN MODE) per FULLTEXT indeksą. Žodžiai
+      perduodami su diakritikais – indekse originalus tekstas, lyginama pagal stulpelio kolaciją.
+    - Kitos DB: SearchToken lentelė (indeksuotas intervalas token >= 'žodis' AND token < 'žodis\\uffff'),
+      žodžiai ir frazė normalizuojami be diakritikų.
+
+    Frazė be žodžių (pvz. tik skyrybos ženklai) ieškoma senuoju LIKE '%...%' būdu.
+    """
+    model = queryset.model
+    fields = SEARCH_FIELDS[model]
+    if not words(term):
+        term = term.strip()
+        return queryset.filter(_like_filter(fields, term)) if term else queryset
+
+    if uses_fulltext(queryset.db):
+        return _search_fulltext(queryset, fields, words(term))
+
+    # Paieška tik skaito (ir iš replikos): indeksą palaiko billing.signals, sync_index ir rebuild_search_index
+    for token in tokenize(term):
+        matching = SearchToken.objects.using(queryset.db).filter(
+            kind=_kind(model), token__gte=token, token__lt=token + "\uffff"
+        )
+        queryset = queryset.filter(pk__in=matching.values("object_id"))
+    return queryset
+
+
+def _search_fulltext(queryset, fields, tokens):
+    model = queryset.model
+    long_tokens = [t for t in tokens if len(t) >= FULLTEXT_MIN_TOKEN]
+    if long_tokens:
+        connection = connections[queryset.db]
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ", ".join(connection.ops.quote_name(model._meta.get_field(f).column) for f in fields)
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        queryset = queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT {pk} FROM {table} WHERE MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)",
+                [" ".join(f"+{t}*" for t in long_tokens)],
+            )
+        )
+    # Trumpų žodžių FULLTEXT nerastų – jie tikrinami LIKE, bet jau susiaurintoje aibėje
+    for token in tokens:
+        if len(token) < FULLTEXT_MIN_TOKEN:
+            queryset = queryset.filter(_like_filter(fields, token))
+    return queryset
+
+
+# --- SearchToken indeksas (ne MySQL) ---
+
+
+def _tokens_for(values) -> set[str]:
+    return {token for value in values for token in tokenize(str(value or ""))}
+
+
+def _watermark(kind: str, using: str) -> int:
+    return (
+        SearchToken.objects.using(using).filter(kind=kind, token="").aggregate(m=Max("object_id"))["m"] or 0
+    )
+
+
+def _write_tokens(kind: str, rows, using: str) -> None:
+    SearchToken.objects.using(using).bulk_create(
+        [SearchToken(kind=kind, object_id=pk, token=token) for pk, tokens in rows for token in tokens if token],
+        ignore_conflicts=True,
+    )
+
+
+def sync_index(model=None, *, using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Suindeksuoja naujus objektus (id didesnis už žymą) – bulk_create įrašytus darbus, kuriems
+    signalai nesiunčiami (worklog_import, `manage.py rebuild_search_index`). Vykdoma paketais po INDEX_CHUNK_SIZE, žyma perkeliama po kiekvieno,
+    todėl nutrauktas indeksavimas tęsiamas nuo ten, kur sustojo. Grąžina suindeksuotų objektų skaičių.
+    """
+    if uses_fulltext(using):
+        return 0
+
+    total = 0
+    for model in [model] if model else SEARCH_FIELDS:
+        kind, fields = _kind(model), SEARCH_FIELDS[model]
+        last_id = _watermark(kind, using)
+        while True:
+            chunk = list(
+                model._default_manager.using(using)
+                .filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", *fields)[:INDEX_CHUNK_SIZE]
+            )
+            if not chunk:
+                break
+            with transaction.atomic(using=using):
+                _write_tokens(kind, [(row[0], _tokens_for(row[1:])) for row in chunk], using)
+                last_id = chunk[-1][0]
+                SearchToken.objects.using(using).filter(kind=kind, token="").delete()
+                SearchToken.objects.using(using).create(kind=kind, object_id=last_id, token="")
+            total += len(chunk)
+    return total
+
+
+def reindex_object(instance, *, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Perrašo naujo ar pakeisto objekto žodžius. Žyma nekeičiama – kitaip ji „peršoktų“ bulk_create
+    įrašytus, bet dar nesuindeksuotus objektus (sync_index pasikartojančius žodžius praleidžia).
+    """
+    model = type(instance)
+    if model not in SEARCH_FIELDS or uses_fulltext(using):
+        return
+    kind, fields = _kind(model), SEARCH_FIELDS[model]
+    with transaction.atomic(using=using):
+        SearchToken.objects.using(using).filter(kind=kind, object_id=instance.pk).exclude(token="").delete()
+        _write_tokens(kind, [(instance.pk, _tokens_for(getattr(instance, f) for f in fields))], using)
+
+
+def rebuild_index(model=None, *, using: str = DEFAULT_DB_ALIAS) -> int:
+    """Išvalo ir suindeksuoja iš naujo (kartu išmeta ištrintų objektų žodžius)."""
+    if uses_fulltext(using):
+        return 0
+    models = [model] if model else list(SEARCH_FIELDS)
+    SearchToken.objects.using(using).filter(kind__in=[_kind(m) for m in models]).delete()
+    return sum(sync_index(m, using=using) for m in models)
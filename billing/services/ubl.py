@@ -0,0 +1,322 @@
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+# UBL 2.1 Invoice pagal Peppol BIS Billing 3.0 (EN 16931) profilį.
+# lxml importuojamas tik generuojant (kaip reportlab pdf.py).
+
+UBL_NS = "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+CAC_NS = "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+CBC_NS = "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2"
+NSMAP = {None: UBL_NS, "cac": CAC_NS, "cbc": CBC_NS}
+
+CUSTOMIZATION_ID = "urn:cen.eu:en16931:2017#compliant#urn:fdc:peppol.eu:2017:poacc:billing:3.0"
+PROFILE_ID = "urn:fdc:peppol.eu:2017:poacc:billing:01:1.0"
+CURRENCY = "EUR"
+
+# UNCL1001: 380 – sąskaita faktūra. Ir išankstinės (hosting) sąskaitos siunčiamos kaip 380:
+# 325 (proforma) Peppol BIS 3.0 neleidžiamas.
+INVOICE_TYPE_CODE = "380"
+
+DEFAULT_CHUNK_SIZE = 200
+
+# Peppol EAS (elektroninio adreso schema) pagal šalį, kai adresas – PVM kodas.
+# Lietuvos įmonė adresuojama įmonės kodu (0200); kitos – PVM kodu; neturint nė vieno – el. paštu (EM).
+LT_COMPANY_CODE_SCHEME = "0200"
+VAT_ENDPOINT_SCHEMES = {
+    "AT": "9914", "BE": "9925", "BG": "9926", "CY": "9928", "CZ": "9929", "DE": "9930", "DK": "0198",
+    "EE": "9931", "ES": "9920", "FI": "0213", "FR": "9957", "GR": "9933", "HR": "9934", "HU": "9910",
+    "IE": "9935", "IT": "0211", "LT": "9937", "LU": "9938", "LV": "9939", "MT": "9943", "NL": "9944",
+    "PL": "9945", "PT": "9946", "RO": "9947", "SE": "9955", "SI": "9949", "SK": "9950",
+    "CH": "9927", "GB": "9932",
+}
+EU_COUNTRIES = frozenset("AT BE BG CY CZ DE DK EE ES FI FR GR HR HU IE IT LT LU LV MT NL PL PT RO SE SI SK".split())
+
+# PVM kategorijos (UNCL5305) 0 % sąskaitoms – tie patys atvejai kaip i.SAF ZERO_RATE_TAX_CODES:
+# Lietuvos pirkėjui – PVM neapmokestinama (E, i.SAF PVM5); užsienio pirkėjui paslaugų teikimo vieta
+# ne Lietuva (PVM14): ES PVM mokėtojui – atvirkštinis apmokestinimas (AE), kitiems – už ES ribų (G).
+# (kategorija, VATEX kodas, priežastis); S – standartinis tarifas.
+ZERO_RATE_CATEGORIES = {
+    "domestic": ("E", None, "PVM neapmokestinama"),
+    "reverse_charge": ("AE", "VATEX-EU-AE", "Atvirkštinis apmokestinimas"),
+    "export": ("G", "VATEX-EU-G", "Paslaugos teikiamos už ES ribų"),
+}
+
+
+def _cac(tag: str) -> str:
+    return f"{{{CAC_NS}}}{tag}"
+
+
+def _cbc(tag: str) -> str:
+    return f"{{{CBC_NS}}}{tag}"
+
+
+def _money(value) -> str:
+    return f"{Decimal(value):.2f}"
+
+
+# --- iš anksto sukompiliuoti fragmentai ---
+# Nesikeičiančios dalys (tiekėjas, PVM kategorijos) sudaromos vieną kartą procesui kaip
+# (tag, attrib, text, children) medžiai ir tik „atkartojamos“ į kiekvieną failą per xmlfile –
+# taip išvengiama pakartotinių xmlns deklaracijų, kurias duotų xf.write(element).
+
+
+def _node(tag: str, text=None, *children, **attrib) -> tuple:
+    return (tag, attrib, None if text is None else str(text), tuple(c for c in children if c is not None))
+
+
+def _replay(xf, node: tuple) -> None:
+    tag, attrib, text, children = node
+    with xf.element(tag, attrib):
+        if text is not None:
+            xf.write(text)
+        for child in children:
+            _replay(xf, child)
+
+
+def _endpoint(*, company_code, vat_code, country, email="") -> tuple | None:
+    """(schemeID, adresas) Peppol EndpointID pagal šalį: LT įmonės kodas, šalies PVM kodo schema arba el. paštas."""
+    if country == "LT" and company_code:
+        return LT_COMPANY_CODE_SCHEME, company_code
+    if vat_code and country in VAT_ENDPOINT_SCHEMES:
+        return VAT_ENDPOINT_SCHEMES[country], vat_code
+    if email:
+        return "EM", email
+    return None
+
+
+def _party(wrapper: str, *, name, company_code, vat_code, address, country, email="") -> tuple:
+    endpoint = _endpoint(company_code=company_code, vat_code=vat_code, country=country, email=email)
+    return _node(
+        _cac(wrapper),
+        None,
+        _node(
+            _cac("Party"),
+            None,
+            _node(_cbc("EndpointID"), endpoint[1], schemeID=endpoint[0]) if endpoint else None,
+            _node(_cac("PartyName"), None, _node(_cbc("Name"), name)),
+            _node(
+                _cac("PostalAddress"),
+                None,
+                _node(_cbc("StreetName"), address) if address else None,
+                _node(_cac("Country"), None, _node(_cbc("IdentificationCode"), country)),
+            ),
+            _node(
+                _cac("PartyTaxScheme"),
+                None,
+                _node(_cbc("CompanyID"), vat_code),
+                _node(_cac("TaxScheme"), None, _node(_cbc("ID"), "VAT")),
+            )
+            if vat_code
+            else None,
+            _node(
+                _cac("PartyLegalEntity"),
+                None,
+                _node(_cbc("RegistrationName"), name),
+                _node(_cbc("CompanyID"), company_code) if company_code else None,
+            ),
+        ),
+    )
+
+
+@lru_cache(maxsize=1)
+def _supplier_party() -> tuple:
+    seller = settings.BILLING_SELLER
+    return _party(
+        "AccountingSupplierParty",
+        name=seller["name"],
+        company_code=seller["company_code"],
+        vat_code=seller["vat_code"],
+        address=seller["address"],
+        country=seller.get("country", "LT"),
+    )
+
+
+def _zero_rate_case(*, country, vat_code) -> str:
+    if country == "LT":
+        return "domestic"
+    return "reverse_charge" if country in EU_COUNTRIES and vat_code else "export"
+
+
+@lru_cache(maxsize=None)
+def _tax_category(wrapper: str, percent: Decimal, zero_rate_case: str) -> tuple:
+    # Atleidimo priežastis rašoma tik dokumento lygio TaxCategory (eilučių ClassifiedTaxCategory jos neturi)
+    category, reason_code, reason = ("S", None, None) if percent else ZERO_RATE_CATEGORIES[zero_rate_case]
+    exemption = wrapper == "TaxCategory"
+    return _node(
+        _cac(wrapper),
+        None,
+        _node(_cbc("ID"), category),
+        _node(_cbc("Percent"), f"{percent:f}"),
+        _node(_cbc("TaxExemptionReasonCode"), reason_code) if exemption and reason_code else None,
+        _node(_cbc("TaxExemptionReason"), reason) if exemption and reason else None,
+        _node(_cac("TaxScheme"), None, _node(_cbc("ID"), "VAT")),
+    )
+
+
+# --- generavimas ---
+
+
+def _leaf(xf, tag: str, text, attrib=None) -> None:
+    with xf.element(tag, attrib or {}):
+        xf.write(str(text))
+
+
+def render_ubl(invoice, lines=None) -> bytes:
+    """
+    Sąskaitos UBL 2.1 XML. `lines` – jau užkrautos eilutės (paketiniam generavimui);
+    jei nepaduota – imamos iš invoice.lines.
+    """
+    from lxml import etree
+
+    if lines is None:
+        lines = list(invoice.lines.order_by("id"))
+    client = invoice.client
+    country = (client.country or "LT").strip().upper()
+    vat_code = (client.vat_code or "").strip()
+    percent = (Decimal(invoice.vat_rate) * 100).normalize()
+    zero_rate_case = _zero_rate_case(country=country, vat_code=vat_code)
+    eur = {"currencyID": CURRENCY}
+
+    buffer = BytesIO()
+    with etree.xmlfile(buffer, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element(f"{{{UBL_NS}}}Invoice", nsmap=NSMAP):
+            _leaf(xf, _cbc("CustomizationID"), CUSTOMIZATION_ID)
+            _leaf(xf, _cbc("ProfileID"), PROFILE_ID)
+            _leaf(xf, _cbc("ID"), invoice.number)
+            _leaf(xf, _cbc("IssueDate"), invoice.issued_date.isoformat())
+            _leaf(xf, _cbc("DueDate"), invoice.due_date.isoformat())
+            _leaf(xf, _cbc("InvoiceTypeCode"), INVOICE_TYPE_CODE)
+            _leaf(xf, _cbc("DocumentCurrencyCode"), CURRENCY)
+            # Peppol R003: privaloma BuyerReference arba OrderReference – pirkėjo nuoroda neturim, dedam numerį
+            _leaf(xf, _cbc("BuyerReference"), invoice.number)
+            with xf.element(_cac("InvoicePeriod")):
+                _leaf(xf, _cbc("StartDate"), invoice.period_from.isoformat())
+                _leaf(xf, _cbc("EndDate"), invoice.period_to.isoformat())
+
+            _replay(xf, _supplier_party())
+            _replay(
+                xf,
+                _party(
+                    "AccountingCustomerParty",
+                    name=client.name,
+                    company_code=(client.company_code or "").strip(),
+                    vat_code=vat_code,
+                    address=(client.address or "").replace("\n", ", ").strip(),
+                    country=country,
+                    email=(client.email or "").strip(),
+                ),
+            )
+
+            with xf.element(_cac("PaymentMeans")):
+                # 58 – SEPA kredito pervedimas
+                _leaf(xf, _cbc("PaymentMeansCode"), "58")
+                _leaf(xf, _cbc("PaymentID"), invoice.number)
+                with xf.element(_cac("PayeeFinancialAccount")):
+                    _leaf(xf, _cbc("ID"), settings.BILLING_SELLER["iban"])
+
+            with xf.element(_cac("TaxTotal")):
+                _leaf(xf, _cbc("TaxAmount"), _money(invoice.vat_amount), eur)
+                with xf.element(_cac("TaxSubtotal")):
+                    _leaf(xf, _cbc("TaxableAmount"), _money(invoice.net_amount), eur)
+                    _leaf(xf, _cbc("TaxAmount"), _money(invoice.vat_amount), eur)
+                    _replay(xf, _tax_category("TaxCategory", percent, zero_rate_case))
+
+            with xf.element(_cac("LegalMonetaryTotal")):
+                _leaf(xf, _cbc("LineExtensionAmount"), _money(invoice.net_amount), eur)
+                _leaf(xf, _cbc("TaxExclusiveAmount"), _money(invoice.net_amount), eur)
+                _leaf(xf, _cbc("TaxInclusiveAmount"), _money(invoice.total_amount), eur)
+                _leaf(xf, _cbc("PayableAmount"), _money(invoice.total_amount), eur)
+
+            line_tax = _tax_category("ClassifiedTaxCategory", percent, zero_rate_case)
+            for no, line in enumerate(lines, start=1):
+                with xf.element(_cac("InvoiceLine")):
+                    _leaf(xf, _cbc("ID"), no)
+                    # C62 – vienetas (UN/ECE Rec 20)
+                    _leaf(xf, _cbc("InvoicedQuantity"), f"{Decimal(line.quantity):f}", {"unitCode": "C62"})
+                    _leaf(xf, _cbc("LineExtensionAmount"), _money(line.total), eur)
+                    with xf.element(_cac("Item")):
+                        _leaf(xf, _cbc("Name"), line.description)
+                        _replay(xf, line_tax)
+                    with xf.element(_cac("Price")):
+                        _leaf(xf, _cbc("PriceAmount"), _money(line.unit_price), eur)
+
+    return buffer.getvalue()
+
+
+class RenderedUbl:
+    """Sąskaitos UBL XML atmintyje – kaip RenderedPdf: tie patys baitai storage įrašui ir laiškų priedams."""
+
+    def __init__(self, invoice, content: bytes | None = None, *, stored: bool = False):
+        self.invoice = invoice
+        self._content = content
+        self.stored = stored
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            with self.invoice.ubl.open("rb") as f:
+                self._content = f.read()
+        return self._content
+
+    @property
+    def filename(self) -> str:
+        return f"{self.invoice.number}.xml"
+
+    @classmethod
+    def render(cls, invoice, lines=None) -> "RenderedUbl":
+        return cls(invoice, render_ubl(invoice, lines))
+
+    @classmethod
+    def for_invoice(cls, invoice) -> "RenderedUbl":
+        if invoice.ubl:
+            return cls(invoice, stored=True)
+        return cls.render(invoice)
+
+    def attach_to(self, message) -> None:
+        message.attach(self.filename, self.content, "application/xml")
+
+    def save(self) -> None:
+        """Įrašo XML į storage šalia PDF (Invoice.ubl)."""
+        if self.stored:
+            return
+        previous = self.invoice.ubl.name
+        self.invoice.ubl.save(self.filename, ContentFile(self.content), save=False)
+        type(self.invoice).objects.filter(pk=self.invoice.pk).update(ubl=self.invoice.ubl.name, updated_at=timezone.now())
+        # Pergeneruojant (--force) senas failas nebereikalingas
+        if previous and previous != self.invoice.ubl.name:
+            self.invoice.ubl.storage.delete(previous)
+        self.stored = True
+
+
+def ensure_invoice_ubl(invoice) -> RenderedUbl:
+    """Sugeneruoja ir įrašo UBL, jei jo dar nėra. Grąžina RenderedUbl (priedams be skaitymo iš disko)."""
+    ubl = RenderedUbl.for_invoice(invoice)
+    ubl.save()
+    return ubl
+
+
+def iter_rendered_ubl(queryset, *, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Paketinis generavimas (pvz. visam mėnesio run'ui): sąskaitos su klientais ir eilutėmis
+    užkraunamos paketais po chunk_size (3 užklausos paketui), XML generuojamas tame pačiame procese.
+    """
+    from django.db.models import Prefetch
+
+    from billing.models import InvoiceLine
+
+    ids = list(queryset.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), chunk_size):
+        invoices = (
+            queryset.model.objects.filter(id__in=ids[start : start + chunk_size])
+            .select_related("client")
+            .prefetch_related(Prefetch("lines", queryset=InvoiceLine.objects.order_by("id")))
+            .order_by("id")
+        )
+        for invoice in invoices:
+            yield RenderedUbl.render(invoice, list(invoice.lines.all()))
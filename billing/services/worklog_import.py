@@ -0,0 +1,200 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator
+
+from django.db import IntegrityError, transaction
+
+from billing.models import Client, WorkLog
+from billing.services.search import sync_index
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class BatchReport:
+    batch: int
+    accepted: int = 0
+    duplicates: int = 0
+    rejected: list[dict] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "batch": self.batch,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+        }
+
+
+def read_rows(data: bytes | str, fmt: str) -> Iterator[dict]:
+    """Nuskaito eilutes iš JSON (sąrašas arba {"rows": [...]}) arba CSV (su antrašte)."""
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+
+    if fmt == "csv":
+        yield from csv.DictReader(io.StringIO(data))
+        return
+
+    payload = json.loads(data)
+    if isinstance(payload, dict):
+        payload = payload.get("rows", [])
+    if not isinstance(payload, list):
+        raise ValueError("JSON turi būti eilučių sąrašas arba objektas su 'rows'.")
+    yield from payload
+
+
+def _client_index() -> tuple[set[int], dict[str, int]]:
+    ids = set()
+    by_code = {}
+    for pk, code in Client.objects.values_list("id", "company_code"):
+        ids.add(pk)
+        if code:
+            by_code[code.strip()] = pk
+    return ids, by_code
+
+
+def _decimal(value, name: str, errors: dict, *, default=None) -> Decimal | None:
+    if value in (None, ""):
+        if default is None:
+            errors[name] = "Privalomas laukas."
+        return default
+    try:
+        return Decimal(str(value).replace(",", "."))
+    except InvalidOperation:
+        errors[name] = f"Netinkamas skaičius: {value!r}"
+        return None
+
+
+def _build_worklog(row: dict, client_ids: set[int], clients_by_code: dict[str, int]) -> tuple[WorkLog | None, dict]:
+    errors = {}
+
+    client_id = None
+    raw_client_id = row.get("client_id")
+    raw_client_code = (row.get("client_code") or "").strip()
+    if raw_client_id not in (None, ""):
+        try:
+            client_id = int(raw_client_id)
+        except (TypeError, ValueError):
+            errors["client_id"] = f"Netinkamas kliento ID: {raw_client_id!r}"
+        else:
+            if client_id not in client_ids:
+                errors["client_id"] = f"Klientas {client_id} nerastas."
+    elif raw_client_code:
+        client_id = clients_by_code.get(raw_client_code)
+        if client_id is None:
+            errors["client_code"] = f"Klientas su kodu {raw_client_code!r} nerastas."
+    else:
+        errors["client_id"] = "Reikia client_id arba client_code."
+
+    work_date = None
+    try:
+        work_date = date.fromisoformat(str(row.get("date") or "").strip())
+    except ValueError:
+        errors["date"] = f"Netinkama data (YYYY-MM-DD): {row.get('date')!r}"
+
+    description = str(row.get("description") or "").strip()
+    if not description:
+        errors["description"] = "Privalomas laukas."
+    elif len(description) > 255:
+        errors["description"] = "Ilgesnis nei 255 simboliai."
+
+    quantity = _decimal(row.get("quantity"), "quantity", errors, default=Decimal("1"))
+    unit_price = _decimal(row.get("unit_price"), "unit_price", errors)
+
+    key = str(row.get("idempotency_key") or "").strip() or None
+    if key and len(key) > 100:
+        errors["idempotency_key"] = "Ilgesnis nei 100 simbolių."
+
+    if errors:
+        return None, errors
+
+    return (
+        WorkLog(
+            client_id=client_id,
+            date=work_date,
+            description=description,
+            quantity=quantity.quantize(Decimal("0.01")),
+            unit_price=unit_price.quantize(Decimal("0.01")),
+            idempotency_key=key,
+        ),
+        errors,
+    )
+
+
+def import_worklogs(rows: Iterable[dict], *, batch_size: int = DEFAULT_BATCH_SIZE) -> list[BatchReport]:
+    """
+    Validuoja ir įrašo WorkLog eilutes paketais per bulk_create.
+
+    Eilutės su idempotency_key, kuris jau yra DB (ar pasikartoja tame pačiame importe), praleidžiamos
+    kaip dublikatai – tą patį failą galima siųsti pakartotinai. Grąžina ataskaitą kiekvienam paketui.
+    """
+    client_ids, clients_by_code = _client_index()
+    seen_keys = set()
+    reports = []
+
+    batch = []
+    for row_no, row in enumerate(rows, start=1):
+        batch.append((row_no, row))
+        if len(batch) >= batch_size:
+            reports.append(_import_batch(len(reports) + 1, batch, client_ids, clients_by_code, seen_keys))
+            batch = []
+    if batch:
+        reports.append(_import_batch(len(reports) + 1, batch, client_ids, clients_by_code, seen_keys))
+
+    # bulk_create signalų nesiunčia – naujus darbus į paieškos indeksą (ne MySQL) įtraukiam iškart,
+    # paieška pati indekso nepildo
+    sync_index(WorkLog)
+    return reports
+
+
+def _existing_keys(keys: list[str]) -> set[str]:
+    if not keys:
+        return set()
+    return set(WorkLog.objects.filter(idempotency_key__in=keys).values_list("idempotency_key", flat=True))
+
+
+def _import_batch(batch_no, batch, client_ids, clients_by_code, seen_keys) -> BatchReport:
+    report = BatchReport(batch=batch_no)
+    candidates = []
+
+    for row_no, row in batch:
+        if not isinstance(row, dict):
+            report.rejected.append({"row": row_no, "errors": {"row": "Eilutė turi būti objektas."}})
+            continue
+        work_log, errors = _build_worklog(row, client_ids, clients_by_code)
+        if errors:
+            report.rejected.append({"row": row_no, "errors": errors})
+            continue
+        candidates.append(work_log)
+
+    existing = _existing_keys([wl.idempotency_key for wl in candidates if wl.idempotency_key])
+
+    to_create = []
+    for wl in candidates:
+        key = wl.idempotency_key
+        if key:
+            if key in existing or key in seen_keys:
+                report.duplicates += 1
+                continue
+            seen_keys.add(key)
+        to_create.append(wl)
+
+    while True:
+        try:
+            with transaction.atomic():
+                WorkLog.objects.bulk_create(to_create)
+            break
+        except IntegrityError:
+            # Tą patį raktą ką tik įrašė lygiagretus importas: perskaitom, kurie raktai jau yra,
+            # jų eilutes skaičiuojam kaip dublikatus ir įrašom likusias
+            taken = _existing_keys([wl.idempotency_key for wl in to_create if wl.idempotency_key])
+            if not taken:
+                raise
+            report.duplicates += sum(1 for wl in to_create if wl.idempotency_key in taken)
+            to_create = [wl for wl in to_create if wl.idempotency_key not in taken]
+    report.accepted = len(to_create)
+    return report
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from billing.models import Client, ClientEmail, Invoice, InvoiceLine, WorkLog
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=WorkLog)
+def reindex_search_tokens(sender, instance, using, **kwargs):
+    # Nauji ir pakeisti objektai; bulk_create įrašytus papildo sync_index
+    from billing.services.search import reindex_object
+
+    reindex_object(instance, using=using)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=ClientEmail)
+@receiver(post_delete, sender=ClientEmail)
+def invalidate_billing_profile(sender, instance, using, **kwargs):
+    from billing.services.profiles import invalidate_profile
+
+    invalidate_profile(instance.pk if sender is Client else instance.client_id, using=using)
+
+
+@receiver(post_save, sender=InvoiceLine)
+@receiver(post_delete, sender=InvoiceLine)
+def touch_invoice(sender, instance, using, **kwargs):
+    # API ETag / Last-Modified remiasi Invoice.updated_at – pakeitus eilutę sąskaita laikoma pasikeitusia
+    Invoice.objects.using(using).filter(pk=instance.invoice_id).update(updated_at=timezone.now())
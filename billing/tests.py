@@ -1,3 +1,1454 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+def create_invoice(client, number: str, net_amount: str = "100.00", **fields):
+    """Išrašyta mėnesinė sąskaita su 21 % PVM (testams)."""
+    from billing.models import Invoice
+
+    net = Decimal(net_amount)
+    vat_rate = fields.pop("vat_rate", Decimal("0.21"))
+    vat = (net * vat_rate).quantize(Decimal("0.01"))
+    values = {
+        "invoice_type": "monthly",
+        "period_from": date(2026, 9, 1),
+        "period_to": date(2026, 9, 30),
+        "issued_date": date(2026, 10, 1),
+        "due_date": date(2026, 10, 15),
+        "net_amount": net,
+        "vat_rate": vat_rate,
+        "vat_amount": vat,
+        "total_amount": net + vat,
+        **fields,
+    }
+    return Invoice.objects.create(client=client, number=number, **values)
+
+
+class StartupImportTimeTests(SimpleTestCase):
+    """Saugo šaltą Django paleidimą (`manage.py migrate`, `shell`, worker'iai) nuo sunkių importų."""
+
+    # Moduliai, kurie turi būti kraunami tik pirmą kartą naudojant (PDF, Optimum eksportas)
+    LAZY_MODULES = (
+        "reportlab",
+        "num2words",
+        "certifi",
+        "billing.services.pdf",
+        "billing.services.optimum",
+    )
+
+    # Bendras importų biudžetas (ms) django.setup() metu; galima keisti per ENV lėtesnėse mašinose
+    IMPORT_BUDGET_MS = int(os.getenv("BILLING_IMPORT_BUDGET_MS", "1500"))
+
+    def _import_times(self, code: str = "import django; django.setup()") -> dict[str, int]:
+        env = os.environ.copy()
+        env.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        # Eilutės formatas: "import time: <self us> | <cumulative us> | <indent><module>"
+        times = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, _cumulative_us, name = line[len("import time:"):].split("|")
+            if not self_us.strip().isdigit():
+                continue  # antraštės eilutė
+            times[name.strip()] = int(self_us)
+        return times
+
+    def _setup_import_times(self) -> dict[str, int]:
+        """Importai, kuriuos prideda django.setup() (be to, ką interpretatorius krauna per site/.pth)."""
+        interpreter = self._import_times("pass")
+        return {name: us for name, us in self._import_times().items() if name not in interpreter}
+
+    def test_heavy_modules_are_not_imported_on_setup(self):
+        times = self._setup_import_times()
+        loaded = sorted(
+            name
+            for name in times
+            if any(name == mod or name.startswith(f"{mod}.") for mod in self.LAZY_MODULES)
+        )
+        self.assertEqual(loaded, [], f"Šie moduliai turi būti importuojami tik pirmą kartą naudojant: {loaded}")
+
+    def test_setup_import_budget(self):
+        total_ms = sum(self._setup_import_times().values()) / 1000
+        self.assertLess(
+            total_ms,
+            self.IMPORT_BUDGET_MS,
+            f"django.setup() importai užtruko {total_ms:.0f} ms (biudžetas {self.IMPORT_BUDGET_MS} ms)",
+        )
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    class FakeConnection:
+        def __init__(self):
+            self.alive = True
+            self.closed = False
+
+        def ping(self, reconnect=False):
+            if not self.alive:
+                raise OSError("MySQL server has gone away")
+
+        def close(self):
+            self.closed = True
+
+    def pool(self, **options):
+        from config.mysql_pool.base import DEFAULT_POOL_OPTIONS, ConnectionPool
+
+        return ConnectionPool(**{**DEFAULT_POOL_OPTIONS, **options})
+
+    def test_released_connection_is_reused(self):
+        pool = self.pool(max_size=2)
+        first = pool.acquire(self.FakeConnection)
+        pool.release(first)
+
+        self.assertIs(pool.acquire(self.FakeConnection), first)
+        self.assertEqual((pool.stats["created"], pool.stats["reused"]), (1, 1))
+
+    def test_exhausted_pool_times_out(self):
+        from django.db.utils import OperationalError
+
+        pool = self.pool(max_size=1, timeout=0.01)
+        pool.acquire(self.FakeConnection)
+        with self.assertRaises(OperationalError):
+            pool.acquire(self.FakeConnection)
+
+    def test_dead_old_and_discarded_connections_are_replaced(self):
+        pool = self.pool(max_size=1, health_check_after=0)
+        dead = pool.acquire(self.FakeConnection)
+        dead.alive = False
+        pool.release(dead)
+        fresh = pool.acquire(self.FakeConnection)
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+
+        # Nebaigta transakcija – į pool'ą negrąžinama, vieta atlaisvinama
+        pool.release(fresh, discard=True)
+        replacement = pool.acquire(self.FakeConnection)
+        self.assertIsNot(replacement, fresh)
+
+        pool.max_lifetime = 0
+        pool.release(replacement)
+        self.assertIsNot(pool.acquire(self.FakeConnection), replacement)
+        self.assertEqual(pool.stats["discarded"], 3)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """config.db_router: kur eina skaitymai ir rašymai (be DB – tik maršruto sprendimai)."""
+
+    def setUp(self):
+        from config.db_router import ReplicaRouter
+
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def _serve(self, request, view):
+        from config.db_router import ReplicaRoutingMiddleware
+
+        with override_settings(DB_REPLICA_ALIAS="replica", DB_REPLICA_READ_PATHS=["/admin/", "/api/"]):
+            return ReplicaRoutingMiddleware(view)(request)
+
+    def test_outside_request_reads_from_primary(self):
+        from billing.models import Invoice
+
+        with override_settings(DB_REPLICA_ALIAS="replica"):
+            self.assertIsNone(self.router.db_for_read(Invoice))
+            self.assertEqual(self.router.db_for_write(Invoice), "default")
+
+    def test_use_replica_until_first_write(self):
+        from billing.models import Invoice
+        from config.db_router import use_primary, use_replica
+
+        with override_settings(DB_REPLICA_ALIAS="replica"), use_replica():
+            self.assertEqual(self.router.db_for_read(Invoice), "replica")
+            with use_primary():
+                self.assertIsNone(self.router.db_for_read(Invoice))
+            self.router.db_for_write(Invoice)
+            # Read-your-writes: po rašymo – pagrindinė DB
+            self.assertIsNone(self.router.db_for_read(Invoice))
+
+    def test_without_replica_alias_reads_from_primary(self):
+        from billing.models import Invoice
+        from config.db_router import reporting_db, use_replica
+
+        with override_settings(DB_REPLICA_ALIAS=None), use_replica():
+            self.assertIsNone(self.router.db_for_read(Invoice))
+            self.assertEqual(reporting_db(), "default")
+
+    def test_replica_is_not_migrated(self):
+        with override_settings(DB_REPLICA_ALIAS="replica"):
+            self.assertTrue(self.router.allow_migrate("default", "billing"))
+            self.assertFalse(self.router.allow_migrate("replica", "billing"))
+
+    def test_get_on_read_paths_uses_replica(self):
+        from billing.models import Invoice
+
+        seen = {}
+
+        def view(request):
+            seen[f"{request.method} {request.path}"] = self.router.db_for_read(Invoice)
+            return HttpResponse()
+
+        for path in ("/admin/billing/invoice/", "/api/invoices/"):
+            response = self._serve(self.factory.get(path), view)
+            self.assertNotIn("db_pin", response.cookies)
+        self._serve(self.factory.get("/other/"), view)
+        self._serve(self.factory.post("/api/invoices/"), view)
+
+        self.assertEqual(seen["GET /admin/billing/invoice/"], "replica")
+        self.assertEqual(seen["GET /api/invoices/"], "replica")
+        self.assertIsNone(seen["GET /other/"])
+        self.assertIsNone(seen["POST /api/invoices/"])
+
+    def test_write_pins_following_requests_to_primary(self):
+        from billing.models import Invoice
+        from config.db_router import PIN_COOKIE
+
+        def writing_view(request):
+            self.router.db_for_write(Invoice)
+            return HttpResponse()
+
+        response = self._serve(self.factory.post("/admin/billing/invoice/1/change/"), writing_view)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Invoice))
+            return HttpResponse()
+
+        request = self.factory.get("/admin/billing/invoice/")
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self._serve(request, view)
+        self.assertEqual(seen, [None])
+
+    def test_async_view_write_in_worker_thread_pins(self):
+        from asgiref.sync import async_to_sync, sync_to_async
+
+        from billing.models import Invoice
+        from config.db_router import PIN_COOKIE, ReplicaRoutingMiddleware
+
+        async def view(request):
+            await sync_to_async(self.router.db_for_write, thread_sensitive=False)(Invoice)
+            return HttpResponse()
+
+        with override_settings(DB_REPLICA_ALIAS="replica"):
+            response = async_to_sync(ReplicaRoutingMiddleware(view))(self.factory.post("/api/invoices/1/pdf/"))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+
+@skipUnless(getattr(settings, "DB_REPLICA_ALIAS", None), "Reikia DB_REPLICA_ALIAS (pvz. antros SQLite DB)")
+class ReplicaQueriesTests(TransactionTestCase):
+    """
+    Tikros užklausos per dvi DB. Lokaliai: DATABASES su "default" ir "replica" SQLite failais,
+    replikai "TEST": {"MIRROR": "default"} (testuose mato tuos pačius duomenis), DB_REPLICA_ALIAS = "replica".
+    """
+
+    # TransactionTestCase: SQLite replikos prisijungimas nemato neužbaigtos TestCase transakcijos.
+    # Be replikos alias klasė praleidžiama, bet `databases` tikrinamas jau įkeliant testus – tik esami alias.
+    replica = getattr(settings, "DB_REPLICA_ALIAS", None)
+    databases = {"default", replica} if replica else {"default"}
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        from billing.models import Client
+        from config.db_router import use_replica
+
+        with use_replica():
+            with CaptureQueriesContext(connections[self.replica]) as replica, CaptureQueriesContext(
+                connections["default"]
+            ) as primary:
+                list(Client.objects.all()[:1])
+                self.assertEqual((len(replica), len(primary)), (1, 0))
+
+                Client.objects.create(name="UAB Replika")
+                list(Client.objects.all()[:1])
+            # Po rašymo skaitoma iš pagrindinės DB
+            client_queries = [q for q in primary.captured_queries if "billing_client" in q["sql"]]
+            self.assertEqual(len(replica), 1)
+            self.assertEqual(len(client_queries), 2)
+
+
+class BillingProfileTests(TestCase):
+    def setUp(self):
+        from billing.models import Client
+
+        # Bendras procesams cache (kaip Redis / Memcached per CACHE_URL)
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        backend = "django.core.cache.backends.filebased.FileBasedCache"
+        self.enterContext(override_settings(CACHES={"default": {"BACKEND": backend, "LOCATION": location.name}}))
+        self.client_obj = Client.objects.create(name="UAB Profilis", email="info@profilis.lt")
+
+    def test_profile_is_cached_until_client_email_changes(self):
+        from billing.models import ClientEmail
+        from billing.services.profiles import get_profile
+
+        self.assertEqual(get_profile(self.client_obj).recipients, ["info@profilis.lt"])
+        with self.assertNumQueries(0):
+            get_profile(self.client_obj)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ClientEmail.objects.create(client=self.client_obj, email="buhalterija@profilis.lt")
+        self.assertEqual(get_profile(self.client_obj).recipients, ["buhalterija@profilis.lt"])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_process_local_cache_is_not_used(self):
+        from django.core.cache import cache
+
+        from billing.services.profiles import get_profile, profile_key
+
+        get_profile(self.client_obj)
+        self.assertIsNone(cache.get(profile_key(self.client_obj.pk)))
+
+    def test_pdf_buyer_block_needs_no_queries(self):
+        from billing.services.pdf_benchmark import render, synthetic_invoice
+
+        invoice = synthetic_invoice(3)
+        with self.assertNumQueries(0):
+            content = render(invoice)
+        self.assertTrue(content.startswith(b"%PDF"))
+
+    def test_plan_uses_current_subscription_fee(self):
+        from billing.models import Subscription
+        from billing.services.planner import build_monthly_plan
+
+        sub = Subscription.objects.create(client=self.client_obj, title="Priežiūra", monthly_fee=Decimal("50.00"))
+        build_monthly_plan([self.client_obj], date(2026, 9, 1), date(2026, 9, 30))
+        Subscription.objects.filter(pk=sub.pk).update(monthly_fee=Decimal("65.00"))
+
+        plan = build_monthly_plan([self.client_obj], date(2026, 9, 1), date(2026, 9, 30))[self.client_obj.pk]
+        self.assertEqual([line.total for line in plan.lines], [Decimal("65.00")])
+
+
+class MonthlyPlanTests(TestCase):
+    def setUp(self):
+        from billing.models import Client, Subscription, WorkLog
+
+        self.billable = Client.objects.create(name="UAB Planas")
+        Subscription.objects.create(client=self.billable, title="Priežiūra", monthly_fee=Decimal("50.00"))
+        Subscription.objects.create(client=self.billable, title="Nemokama", monthly_fee=Decimal("0.00"))
+        Subscription.objects.create(client=self.billable, title="Nutraukta", monthly_fee=Decimal("80.00"), active=False)
+        work = {"client": self.billable, "description": "Programavimas", "quantity": 2, "unit_price": Decimal("30.00")}
+        self.work = WorkLog.objects.create(date=date(2026, 9, 10), **work)
+        WorkLog.objects.create(date=date(2026, 9, 11), billed=True, **work)
+        WorkLog.objects.create(date=date(2026, 10, 1), **work)
+
+        self.invoiced = Client.objects.create(name="UAB Jau išrašyta")
+        Subscription.objects.create(client=self.invoiced, title="Priežiūra", monthly_fee=Decimal("100.00"))
+        create_invoice(self.invoiced, "MEV-0900")
+        self.idle = Client.objects.create(name="UAB Nieko")
+
+    def test_plan_lines_and_totals(self):
+        from billing.models import Client
+        from billing.services.planner import build_monthly_plan
+
+        plans = build_monthly_plan(Client.objects.order_by("id"), date(2026, 9, 1), date(2026, 9, 30))
+
+        plan = plans[self.billable.pk]
+        self.assertEqual(
+            [(line.description, line.total) for line in plan.lines],
+            [("Priežiūra", Decimal("50.00")), ("Programavimas", Decimal("60.00"))],
+        )
+        self.assertEqual(plan.work_log_ids, [self.work.pk])
+        self.assertEqual(
+            (plan.net_amount, plan.vat_amount, plan.total_amount),
+            (Decimal("110.00"), Decimal("23.10"), Decimal("133.10")),
+        )
+        self.assertEqual(plans[self.invoiced.pk].existing_number, "MEV-0900")
+        self.assertFalse(plans[self.idle.pk].billable)
+
+    def test_plan_command_writes_nothing(self):
+        import csv
+
+        from django.core.management import call_command
+
+        from billing.models import Invoice
+
+        out = StringIO()
+        call_command("generate_monthly_invoices", plan=True, month="2026-09", plan_format="csv", stdout=out)
+
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        # Klientas su jau išrašyta sąskaita į sumas neįtraukiamas
+        self.assertEqual(
+            [(row["client"], row["lines"], row["existing_invoice"]) for row in rows[:-1]],
+            [("UAB Planas", "2", ""), ("UAB Jau išrašyta", "1", "MEV-0900"), ("UAB Nieko", "0", "")],
+        )
+        self.assertEqual(
+            [rows[-1][key] for key in ("client", "lines", "net_amount", "vat_amount", "total_amount")],
+            ["VISO", "2", "110.00", "23.10", "133.10"],
+        )
+        self.assertEqual(Invoice.objects.count(), 1)
+        self.work.refresh_from_db()
+        self.assertFalse(self.work.billed)
+
+
+class MonthlyRunTests(TransactionTestCase):
+    def setUp(self):
+        from billing.models import Client, Subscription
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, INVOICE_ADMIN_COPY_EMAIL="kopija@example.com"))
+        self.clients = []
+        for no in range(4):
+            client = Client.objects.create(name=f"UAB Klientas {no}", email=f"klientas{no}@example.com")
+            Subscription.objects.create(client=client, title="Priežiūra", monthly_fee=Decimal("40.00"))
+            self.clients.append(client)
+
+    def run_command(self, **options):
+        from django.core.management import call_command
+
+        call_command("generate_monthly_invoices", month="2026-09", issued_date="2026-10-01", stdout=StringIO(), **options)
+
+    def test_shard_processes_only_its_clients(self):
+        from billing.models import Invoice
+
+        self.run_command(shard="1/2")
+
+        self.assertEqual(
+            sorted(Invoice.objects.values_list("client_id", flat=True)),
+            [client.pk for client in self.clients if client.pk % 2 == 1],
+        )
+
+    def test_resume_runs_only_unfinished_steps(self):
+        from unittest import mock
+
+        from django.core import mail
+
+        from billing.management.commands.generate_monthly_invoices import Command
+        from billing.models import BillingRun, Invoice
+
+        failing = self.clients[1]
+        send = Command.send_invoice_email
+
+        def send_or_fail(command, invoice, *args, **kwargs):
+            if invoice.client_id == failing.pk:
+                raise ConnectionError("SMTP nepasiekiamas")
+            return send(command, invoice, *args, **kwargs)
+
+        with mock.patch.object(Command, "send_invoice_email", send_or_fail):
+            self.run_command()
+
+        run = BillingRun.objects.get()
+        self.assertEqual(run.status, "failed")
+        item = run.items.get(client=failing)
+        self.assertFalse(item.done)
+        self.assertIsNotNone(item.invoice_id)
+        self.assertIsNone(item.emailed_at)
+        self.assertIn("SMTP nepasiekiamas", item.last_error)
+        self.assertEqual(len(mail.outbox), 2 * 3)
+
+        mail.outbox.clear()
+        self.run_command(resume=run.pk)
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, "done")
+        self.assertEqual(Invoice.objects.count(), 4)
+        # Pakartotinai siunčiama tik nepavykusi sąskaita (laiškas ir kopija)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertTrue(all(item.invoice.number in message.subject for message in mail.outbox))
+        item.refresh_from_db()
+        self.assertTrue(item.done)
+        self.assertIsNotNone(item.pdf_rendered_at)
+        self.assertEqual(item.last_error, "")
+
+    def test_invalid_shard_is_rejected(self):
+        from django.core.management.base import CommandError
+
+        for shard in ("2/2", "1", "a/b"):
+            with self.subTest(shard=shard), self.assertRaises(CommandError):
+                self.run_command(shard=shard)
+
+
+class RenderedPdfTests(TestCase):
+    def setUp(self):
+        from billing.models import Client
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.invoice = create_invoice(Client.objects.create(name="UAB Vienas PDF"), "MEV-0500")
+
+    def test_pdf_is_rendered_once_for_storage_and_emails(self):
+        from unittest import mock
+
+        from django.core.mail import EmailMessage
+
+        from billing.services import pdf as pdf_service
+
+        with mock.patch.object(pdf_service, "generate_invoice_pdf", wraps=pdf_service.generate_invoice_pdf) as generate:
+            pdf = pdf_service.RenderedPdf.for_invoice(self.invoice)
+            messages = [EmailMessage(to=["a@example.com"]), EmailMessage(to=["b@example.com"])]
+            for message in messages:
+                pdf.attach_to(message)
+            pdf.save()
+            again = pdf_service.ensure_invoice_pdf(self.invoice)
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertTrue(again.stored)
+        with self.invoice.pdf.open("rb") as f:
+            stored = f.read()
+        self.assertTrue(stored.startswith(b"%PDF"))
+        self.assertEqual([message.attachments[0][1] for message in messages], [stored, stored])
+        self.assertEqual(again.content, stored)
+
+
+class HostingInvoiceTests(TestCase):
+    def setUp(self):
+        from billing.models import Client, Subscription
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, INVOICE_ADMIN_COPY_EMAIL="kopija@example.com"))
+        client = Client.objects.create(name="UAB Hostingas", email="info@hostingas.lt")
+        Subscription.objects.create(
+            client=client,
+            title="Hostingas",
+            monthly_fee=Decimal("0.00"),
+            hosting_yearly_fee=Decimal("120.00"),
+            hosting_valid_until=date(2026, 11, 5),
+        )
+
+    def test_hosting_pdf_is_rendered_once_and_attached_without_reading_storage(self):
+        from unittest import mock
+
+        from django.core import mail
+        from django.core.files.storage import FileSystemStorage
+        from django.core.management import call_command
+
+        from billing.models import Invoice
+        from billing.services import pdf as pdf_service
+
+        opened = []
+        storage_open = FileSystemStorage.open
+
+        def tracking_open(storage, name, mode="rb"):
+            opened.append(name)
+            return storage_open(storage, name, mode)
+
+        with mock.patch.object(
+            pdf_service, "generate_invoice_pdf", wraps=pdf_service.generate_invoice_pdf
+        ) as generate, mock.patch.object(FileSystemStorage, "open", tracking_open):
+            call_command("check_subscription", today="2026-10-20", stdout=StringIO())
+
+        invoice = Invoice.objects.get(invoice_type="hosting")
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual([name for name in opened if name.endswith(".pdf")], [])
+        with invoice.pdf.open("rb") as f:
+            stored = f.read()
+        attachments = [a[1] for message in mail.outbox for a in message.attachments if a[0].endswith(".pdf")]
+        self.assertEqual(attachments, [stored, stored])
+
+
+class InvoiceArchiveTests(TestCase):
+    def setUp(self):
+        from billing.models import Client
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        client = Client.objects.create(name="UAB Archyvas")
+        self.stored = create_invoice(client, "MEV-0001")
+        self.rendered = create_invoice(client, "MEV-0002", issued_date=date(2026, 10, 2))
+
+        from django.core.files.base import ContentFile
+        from reportlab.pdfgen.canvas import Canvas
+
+        buffer = BytesIO()
+        c = Canvas(buffer)
+        c.drawString(72, 720, "Israsytas originalas MEV-0001")
+        c.save()
+        self.stored.pdf.save("MEV-0001.pdf", ContentFile(buffer.getvalue()))
+
+    def test_print_pdf_uses_stored_files_and_numbers_pages(self):
+        from pypdf import PdfReader
+
+        from billing.models import Invoice
+        from billing.services.archive import write_print_pdf
+
+        output = BytesIO()
+        self.assertEqual(write_print_pdf(output, Invoice.objects.all(), chunk_size=1), (2, 2))
+        reader = PdfReader(output, strict=True)
+        self.assertEqual(reader.metadata.title, "Sąskaitos")
+        pages = [page.extract_text() for page in reader.pages]
+        self.assertIn("Israsytas originalas MEV-0001", pages[0])
+        self.assertIn("Psl. 1 iš 2", pages[0])
+        self.assertIn("MEV-0002", pages[1])
+        self.assertIn("Psl. 2 iš 2", pages[1])
+
+    def test_lines_prefetched_only_for_rendered_invoices(self):
+        from billing.models import Invoice
+        from billing.services.archive import iter_invoices
+
+        stored, rendered = iter_invoices(Invoice.objects.all())
+        self.assertNotIn("lines", getattr(stored, "_prefetched_objects_cache", {}))
+        self.assertIn("lines", rendered._prefetched_objects_cache)
+
+    def test_zip_contains_stored_pdf_unchanged(self):
+        import zipfile
+
+        from billing.models import Invoice
+        from billing.services.archive import iter_zip
+
+        archive = zipfile.ZipFile(BytesIO(b"".join(iter_zip(Invoice.objects.all()))))
+        self.assertEqual(archive.namelist(), ["MEV-0001.pdf", "MEV-0002.pdf"])
+        with self.stored.pdf.open("rb") as f:
+            self.assertEqual(archive.read("MEV-0001.pdf"), f.read())
+
+
+@override_settings(BILLING_API_TOKEN="tok", DB_REPLICA_ALIAS=None)
+class InvoiceApiConditionalTests(TestCase):
+    def setUp(self):
+        from billing.models import Client, InvoiceLine
+
+        self.client_obj = Client.objects.create(name="UAB ETag")
+        self.invoice = create_invoice(self.client_obj, "MEV-0100")
+        self.line = InvoiceLine.objects.create(
+            invoice=self.invoice, description="Priežiūra", quantity=1, unit_price=100, total=100
+        )
+
+    def _get(self, etag=None):
+        headers = {"HTTP_AUTHORIZATION": "Bearer tok"}
+        if etag:
+            headers["HTTP_IF_NONE_MATCH"] = etag
+        return self.client.get("/api/invoices/MEV-0100/", **headers)
+
+    def assertChanged(self, etag):
+        response = self._get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response["ETag"]
+
+    def test_etag_follows_invoice_client_and_lines(self):
+        from billing.models import InvoiceLine
+
+        etag = self._get()["ETag"]
+        self.assertEqual(self._get(etag).status_code, 304)
+
+        self.client_obj.address = "Vilniaus g. 1"
+        self.client_obj.save()
+        etag = self.assertChanged(etag)
+
+        self.line.description = "Priežiūra (spalis)"
+        self.line.save()
+        etag = self.assertChanged(etag)
+
+        # bulk_create signalų nesiunčia – pasikeičia eilučių skaičius
+        InvoiceLine.objects.bulk_create(
+            [InvoiceLine(invoice=self.invoice, description="Papildomai", quantity=1, unit_price=10, total=10)]
+        )
+        self.assertChanged(etag)
+
+
+@override_settings(DB_REPLICA_ALIAS=None)
+class InvoicePdfDownloadTests(TestCase):
+    CONTENT = b"%PDF-1.4 " + bytes(range(256)) * 4
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        from billing.models import Client
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.invoice = create_invoice(Client.objects.create(name="UAB Nuoroda"), "MEV-0200")
+        self.invoice.pdf.save("MEV-0200.pdf", ContentFile(self.CONTENT))
+
+    async def download(self, url=None, **headers):
+        from billing.services.downloads import invoice_pdf_url
+
+        response = await self.async_client.get(url or invoice_pdf_url(self.invoice), **headers)
+        if response.streaming:
+            response.body = b"".join([chunk async for chunk in response.streaming_content])
+        return response
+
+    async def test_signed_link_streams_with_range_and_validators(self):
+        response = await self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, self.CONTENT)
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="MEV-0200.pdf"')
+
+        partial = await self.download(headers={"Range": "bytes=9-18"})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.body, self.CONTENT[9:19])
+        self.assertEqual(partial["Content-Range"], f"bytes 9-18/{len(self.CONTENT)}")
+
+        not_modified = await self.download(headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(not_modified.status_code, 304)
+
+        unsatisfiable = await self.download(headers={"Range": f"bytes={len(self.CONTENT)}-"})
+        self.assertEqual(unsatisfiable.status_code, 416)
+
+    async def test_bad_or_expired_link_is_forbidden(self):
+        from django.urls import reverse
+
+        from billing.services.downloads import invoice_pdf_token
+
+        token = invoice_pdf_token(self.invoice)
+        response = await self.download(reverse("billing:invoice_pdf", args=[token + "0"]))
+        self.assertEqual(response.status_code, 403)
+
+        with override_settings(INVOICE_PDF_LINK_MAX_AGE=-1):
+            response = await self.download()
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(INVOICE_PDF_SENDFILE="nginx", INVOICE_PDF_ACCEL_PREFIX="/protected-media/")
+    async def test_nginx_serves_the_bytes(self):
+        response = await self.download()
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.invoice.pdf.name}")
+        self.assertEqual(response.content, b"")
+
+
+@override_settings(BILLING_API_TOKEN="tok", DB_REPLICA_ALIAS=None)
+class AsyncInvoiceViewsTests(TransactionTestCase):
+    # Lėtas darbas vyksta atskiroje gijoje su savo DB jungtimi – todėl TransactionTestCase
+    AUTH = {"Authorization": "Bearer tok"}
+
+    def setUp(self):
+        from billing.models import Client
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        client = Client.objects.create(name="UAB Async", company_code="300000003")
+        self.invoice = create_invoice(client, "MEV-0400")
+
+    async def test_render_pdf_returns_signed_link(self):
+        response = await self.async_client.post("/api/invoices/MEV-0400/pdf/")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.post("/api/invoices/MEV-0000/pdf/", headers=self.AUTH)
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.post("/api/invoices/MEV-0400/pdf/", headers=self.AUTH)
+        self.assertEqual(response.status_code, 200)
+        await self.invoice.arefresh_from_db()
+        self.assertTrue(self.invoice.pdf)
+
+        download = await self.async_client.get(response.json()["pdf_url"])
+        self.assertEqual(download.status_code, 200)
+        content = b"".join([chunk async for chunk in download.streaming_content])
+        self.assertTrue(content.startswith(b"%PDF"))
+
+    async def test_forced_render_replaces_the_old_file(self):
+        from django.core.files.storage import default_storage
+
+        response = await self.async_client.post("/api/invoices/MEV-0400/pdf/", headers=self.AUTH)
+        await self.invoice.arefresh_from_db()
+        old_name = self.invoice.pdf.name
+
+        response = await self.async_client.post("/api/invoices/MEV-0400/pdf/?force=1", headers=self.AUTH)
+        self.assertEqual(response.status_code, 200)
+        await self.invoice.arefresh_from_db()
+        self.assertNotEqual(self.invoice.pdf.name, old_name)
+        self.assertTrue(default_storage.exists(self.invoice.pdf.name))
+        self.assertFalse(default_storage.exists(old_name))
+
+    def test_saving_pdf_does_not_overwrite_other_fields(self):
+        from billing.models import Invoice
+        from billing.services.pdf import ensure_invoice_pdf
+
+        stale = Invoice.objects.select_related("client").get(pk=self.invoice.pk)
+        Invoice.objects.filter(pk=self.invoice.pk).update(optimum_status="exported")
+
+        ensure_invoice_pdf(stale, force=True)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.optimum_status, "exported")
+        self.assertEqual(self.invoice.pdf.name, stale.pdf.name)
+
+    async def test_optimum_export_status(self):
+        from unittest import mock
+
+        from asgiref.sync import sync_to_async
+
+        url = "/api/invoices/MEV-0400/optimum/"
+        deferred = {"Status": "Deferred", "Result": None, "Error": "Optimum: grandinė atidaryta"}
+        with mock.patch("billing.services.optimum.export_invoice_to_optimum_single_line", return_value=deferred):
+            response = await self.async_client.post(url, headers=self.AUTH)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(response.json()["optimum_status"], "deferred")
+
+        # Atidėta užduotis iki cooldown pabaigos iš eilės nepaimama
+        with mock.patch("billing.services.optimum.export_invoice_to_optimum_single_line") as export:
+            response = await self.async_client.post(url, headers=self.AUTH)
+        export.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+
+        url = "/api/invoices/MEV-0401/optimum/"
+        await sync_to_async(create_invoice)(self.invoice.client, "MEV-0401")
+        success = {"Status": "Success", "Result": "1", "Error": None}
+        with mock.patch("billing.services.optimum.export_invoice_to_optimum_single_line", return_value=success) as export:
+            response = await self.async_client.post(url, headers=self.AUTH)
+            self.assertEqual(response.status_code, 200)
+            # Jau eksportuota sąskaita be force nesiunčiama dar kartą
+            response = await self.async_client.post(url, headers=self.AUTH)
+            self.assertEqual(export.call_count, 1)
+            await self.async_client.post(f"{url}?force=1", headers=self.AUTH)
+            self.assertEqual(export.call_count, 2)
+
+        response = await self.async_client.get(url, headers=self.AUTH)
+        self.assertEqual(response.json()["optimum_status"], "exported")
+
+
+class SearchTests(TestCase):
+    def test_saved_objects_are_searchable_and_search_only_reads(self):
+        from django.db import connection
+
+        from billing.models import Client
+        from billing.services.search import search
+
+        client = Client.objects.create(name="UAB Ąžuolynas", company_code="304555111")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(list(search(Client.objects.all(), "azuolyn")), [client])
+        self.assertTrue(all(q["sql"].lstrip().upper().startswith("SELECT") for q in queries.captured_queries))
+
+        client.name = "UAB Beržynas"
+        client.save()
+        self.assertFalse(search(Client.objects.all(), "azuolyn").exists())
+        self.assertEqual(list(search(Client.objects.all(), "Berž 3045")), [client])
+
+    def test_fulltext_terms_keep_diacritics(self):
+        from billing.models import Client
+        from billing.services.search import _search_fulltext, words
+
+        queryset = _search_fulltext(Client.objects.all(), ("name",), words("Ąžuolų g"))
+        # MATCH tekstas – kaip FULLTEXT indekse; trumpas „g“ tikrinamas LIKE
+        sql = str(queryset.query)
+        self.assertIn("+ąžuolų*", sql)
+        self.assertNotIn("azuolu", sql)
+
+
+class ReconcileOptimumTests(TestCase):
+    def setUp(self):
+        from billing.models import Client
+
+        client = Client.objects.create(name="UAB Optimum")
+        self.invoices = [
+            create_invoice(client, f"MEV-02{no:02d}", optimum_status="exported") for no in range(4)
+        ]
+
+    def _reconcile(self, remote, **options):
+        from io import StringIO
+        from unittest import mock
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        with mock.patch("billing.services.optimum.fetch_optimum_invoices", return_value=remote):
+            call_command("reconcile_optimum", month="2026-10", format="csv", stdout=out, **options)
+        return out.getvalue()
+
+    def _remote(self, *invoices, net=None):
+        from billing.services.optimum import OptimumInvoice
+
+        return {
+            inv.number: OptimumInvoice(number=inv.number, date=inv.issued_date, net_amount=net or inv.net_amount)
+            for inv in invoices
+        }
+
+    def test_reports_missing_and_mismatched(self):
+        remote = self._remote(*self.invoices[:2]) | self._remote(self.invoices[2], net=Decimal("90.00"))
+        rows = self._reconcile(remote).splitlines()
+        self.assertIn("missing,MEV-0203,100.00,", rows)
+        self.assertIn("mismatch,MEV-0202,100.00,90.00", rows)
+
+    def test_empty_optimum_response_is_an_error(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaisesMessage(CommandError, "nė vienos"):
+            self._reconcile({})
+
+    def test_missing_share_over_threshold_is_an_error(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaisesMessage(CommandError, "trūksta 3 iš 4"):
+            self._reconcile(self._remote(self.invoices[0]))
+        self.assertIn("missing", self._reconcile(self._remote(self.invoices[0]), max_missing_share=Decimal("0.8")))
+
+    def test_hosting_invoices_are_not_expected_in_optimum(self):
+        create_invoice(self.invoices[0].client, "MEV-0290", invoice_type="hosting")
+
+        rows = self._reconcile(self._remote(*self.invoices)).splitlines()
+        self.assertEqual(rows, ["kind,number,local_net_amount,optimum_net_amount"])
+
+    def test_mark_and_enqueue_missing(self):
+        from billing.models import Invoice, OptimumExportTask
+
+        remote = self._remote(*self.invoices[:2]) | self._remote(self.invoices[2], net=Decimal("90.00"))
+        pending = create_invoice(self.invoices[0].client, "MEV-0204")
+        remote |= self._remote(pending)
+        self._reconcile(remote, mark=True, enqueue_missing=True)
+
+        statuses = dict(Invoice.objects.values_list("number", "optimum_status"))
+        self.assertEqual(
+            statuses,
+            {"MEV-0200": "exported", "MEV-0201": "exported", "MEV-0202": "failed", "MEV-0203": "", "MEV-0204": "exported"},
+        )
+        self.assertEqual(Invoice.objects.get(number="MEV-0202").optimum_error, "Optimum neto suma 90.00 ≠ 100.00")
+        self.assertEqual(
+            list(OptimumExportTask.objects.values_list("invoice__number", "status")), [("MEV-0203", "pending")]
+        )
+
+    @override_settings(OPTIMUM_API_KEY="key")
+    def test_fetch_parses_invoices_and_rejects_unexpected_shape(self):
+        from unittest import mock
+
+        from billing.services.optimum import OPTIMUM_NS, SOAPENV_NS, fetch_optimum_invoices
+
+        def response(result):
+            return (
+                f'<soap:Envelope xmlns:soap="{SOAPENV_NS}"><soap:Body><GetInvoicesResponse xmlns="{OPTIMUM_NS}">'
+                f"<GetInvoicesResult><Status>Success</Status><Result>{result}</Result></GetInvoicesResult>"
+                "</GetInvoicesResponse></soap:Body></soap:Envelope>"
+            ).encode()
+
+        invoice = (
+            "<Invoice><Date>2026-10-01T00:00:00</Date><No>MEV-0200</No><Articles>"
+            "<InvArticle><ExtPrice>60.00</ExtPrice></InvArticle><InvArticle><ExtPrice>40</ExtPrice></InvArticle>"
+            "</Articles></Invoice>"
+        )
+        with mock.patch("billing.services.optimum._optimum_request", return_value=response(invoice)) as request:
+            remote = fetch_optimum_invoices(date(2026, 10, 1), date(2026, 10, 31), chunk_days=16)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(remote["MEV-0200"].net_amount, Decimal("100.00"))
+        self.assertEqual(remote["MEV-0200"].date, date(2026, 10, 1))
+
+        for result in ("<Document><No>MEV-0200</No></Document>", "<Invoice><No>MEV-0200</No></Invoice>"):
+            with self.subTest(result=result), self.assertRaisesMessage(RuntimeError, "Netikėta GetInvoices"):
+                with mock.patch("billing.services.optimum._optimum_request", return_value=response(result)):
+                    fetch_optimum_invoices(date(2026, 10, 1), date(2026, 10, 31))
+
+
+    @override_settings(OPTIMUM_API_KEY="key")
+    def test_bulk_reads_use_their_own_breaker_with_fixed_timeout(self):
+        from unittest import mock
+
+        from billing.services.breaker import CircuitOpenError
+        from billing.services.optimum import fetch_optimum_invoices, optimum_breaker, optimum_bulk_breaker
+
+        self.addCleanup(optimum_breaker.reset)
+        self.addCleanup(optimum_bulk_breaker.reset)
+        with mock.patch("billing.services.optimum.urllib.request.urlopen", side_effect=OSError("timed out")) as urlopen:
+            for _ in range(optimum_bulk_breaker.failure_threshold):
+                with self.assertRaises(RuntimeError):
+                    fetch_optimum_invoices(date(2026, 10, 1), date(2026, 10, 31))
+            with self.assertRaises(CircuitOpenError):
+                fetch_optimum_invoices(date(2026, 10, 1), date(2026, 10, 31))
+
+        timeouts = {call.kwargs["timeout"] for call in urlopen.call_args_list}
+        self.assertEqual(timeouts, {optimum_bulk_breaker.max_timeout})
+        self.assertEqual(optimum_bulk_breaker.status(), "open")
+        self.assertEqual(optimum_breaker.status(), "closed")
+
+class BillingWorkerQueueTests(TestCase):
+    def _claim(self):
+        from io import StringIO
+
+        from billing.management.commands.billing_worker import Command
+
+        return Command(stdout=StringIO())._claim_next_job()
+
+    def test_stale_running_job_is_reclaimed_until_attempts_run_out(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from billing.models import BillingJob
+
+        long_ago = timezone.now() - timedelta(hours=3)
+        exhausted = BillingJob.objects.create(kind="pdf", status="running", started_at=long_ago, attempts=3)
+        stale = BillingJob.objects.create(kind="pdf", status="running", started_at=long_ago, attempts=1)
+        BillingJob.objects.create(kind="pdf", status="running", started_at=timezone.now(), attempts=1)
+
+        job = self._claim()
+        self.assertEqual((job.pk, job.status, job.attempts), (stale.pk, "running", 2))
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, "failed")
+        # Ką tik paimtas ir dar vykdomas darbas neimamas
+        self.assertIsNone(self._claim())
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        from billing.services.breaker import CircuitBreaker
+
+        self.breaker = CircuitBreaker("test", failure_threshold=2, cooldown=60, min_timeout=1, max_timeout=10)
+        self.addCleanup(self.breaker.reset)
+
+    def failed_call(self):
+        with self.assertRaises(OSError), self.breaker.call():
+            raise OSError("timeout")
+
+    def test_opens_after_failures_and_closes_after_successful_probe(self):
+        import time
+        from unittest import mock
+
+        from billing.services.breaker import CircuitOpenError
+
+        self.failed_call()
+        self.assertEqual(self.breaker.status(), "closed")
+        self.failed_call()
+        self.assertEqual(self.breaker.status(), "open")
+        with self.assertRaises(CircuitOpenError), self.breaker.call():
+            raise AssertionError("Atidaryta grandinė neturi kviesti paslaugos")
+
+        with mock.patch("billing.services.breaker.time.time", return_value=time.time() + 61):
+            self.assertEqual(self.breaker.status(), "half-open")
+            # half-open: tik vienas bandomasis kvietimas
+            self.breaker.before_call()
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.before_call()
+            self.breaker.record_success(0.2)
+
+        self.assertEqual(self.breaker.status(), "closed")
+        self.assertEqual(self.breaker.state()["failures"], 0)
+        self.assertEqual(self.breaker.timeout(), 1)
+
+    def test_failed_probe_reopens(self):
+        import time
+        from unittest import mock
+
+        self.failed_call()
+        self.failed_call()
+        with mock.patch("billing.services.breaker.time.time", return_value=time.time() + 61):
+            self.failed_call()
+            self.assertEqual(self.breaker.status(), "open")
+
+    def test_counters_are_not_lost_between_threads(self):
+        import threading
+
+        from billing.services.breaker import CircuitBreaker
+
+        # Atskiri objektai tuo pačiu vardu – kaip skirtingi procesai su bendru cache
+        breakers = [CircuitBreaker("test", failure_threshold=1000) for _ in range(8)]
+        threads = [
+            threading.Thread(target=lambda b=b: [b.record_failure("timeout") for _ in range(25)]) for b in breakers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        state = self.breaker.state()
+        self.assertEqual((state["failures"], state["calls"], state["errors"]), (200, 200, 200))
+
+    def test_timeout_follows_latency(self):
+        self.assertEqual(self.breaker.timeout(), 10)
+        self.breaker.record_success(2.0)
+        # srtt + 4 * rttvar = 2 + 4 * 1
+        self.assertEqual(self.breaker.timeout(), 6.0)
+
+
+class OptimumOutboxTests(TestCase):
+    def setUp(self):
+        from billing.models import Client, OptimumExportTask
+
+        client = Client.objects.create(name="UAB Outbox")
+        self.invoices = [create_invoice(client, f"MEV-03{no:02d}") for no in range(2)]
+        for invoice in self.invoices:
+            OptimumExportTask.enqueue(invoice)
+
+    def test_task_reclaimed_by_another_drainer_is_not_sent_twice(self):
+        from datetime import timedelta
+        from unittest import mock
+
+        from django.utils import timezone
+
+        from billing.models import OptimumExportTask
+        from billing.services.outbox import drain_optimum_outbox
+
+        sent = []
+
+        def export(invoice):
+            sent.append(invoice.number)
+            # Kol siunčiama pirmoji, antrąją (ilgai laukusią) paima kitas drainer'is
+            OptimumExportTask.objects.filter(invoice=self.invoices[1]).update(
+                started_at=timezone.now() + timedelta(seconds=1)
+            )
+            return {"Status": "Success"}
+
+        with mock.patch("billing.services.optimum.export_invoice_to_optimum_single_line", side_effect=export):
+            report = drain_optimum_outbox(batch_size=2)
+
+        self.assertEqual(sent, ["MEV-0300"])
+        self.assertEqual(report.exported, 1)
+        self.assertEqual(OptimumExportTask.objects.get(invoice=self.invoices[1]).status, "running")
+
+
+class WorklogImportTests(TestCase):
+    def setUp(self):
+        from billing.models import Client
+
+        self.client_obj = Client.objects.create(name="UAB Importas")
+
+    def _row(self, key):
+        return {
+            "client_id": self.client_obj.pk,
+            "date": "2026-10-01",
+            "description": f"Darbas {key}",
+            "quantity": "1",
+            "unit_price": "30",
+            "idempotency_key": key,
+        }
+
+    def test_rows_inserted_concurrently_count_as_duplicates(self):
+        from unittest import mock
+
+        from billing.models import WorkLog
+        from billing.services import worklog_import
+
+        # k2 įrašė lygiagretus importas jau po to, kai šis patikrino esamus raktus
+        WorkLog.objects.create(
+            client=self.client_obj,
+            date=date(2026, 10, 1),
+            description="Darbas k2",
+            quantity=1,
+            unit_price=30,
+            idempotency_key="k2",
+        )
+        existing_keys = worklog_import._existing_keys
+        with mock.patch.object(worklog_import, "_existing_keys", side_effect=[set(), existing_keys(["k2"])]):
+            (report,) = worklog_import.import_worklogs([self._row("k1"), self._row("k2"), self._row("k1")])
+
+        self.assertEqual((report.accepted, report.duplicates), (1, 2))
+        self.assertEqual(WorkLog.objects.filter(idempotency_key__in=["k1", "k2"]).count(), 2)
+
+
+class OverdueRemindersTests(TestCase):
+    def setUp(self):
+        from billing.models import Client
+
+        for no in range(2):
+            client = Client.objects.create(name=f"UAB Skolininkas {no}", email=f"s{no}@example.lt")
+            create_invoice(client, f"MEV-04{no:02d}")
+
+    def test_sent_reminders_are_marked_when_a_later_send_fails(self):
+        import smtplib
+        from io import StringIO
+        from unittest import mock
+
+        from django.core.management import call_command
+
+        from billing.models import Invoice
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=[1, smtplib.SMTPServerDisconnected("nutrūko")],
+        ):
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                call_command("send_overdue_reminders", today="2026-11-01", batch_size=10, stdout=StringIO())
+
+        marked = dict(Invoice.objects.values_list("number", "reminder_count"))
+        self.assertEqual(marked, {"MEV-0400": 1, "MEV-0401": 0})
+
+
+    @override_settings(ADMIN_INVOICE_EMAIL="admin@example.lt")
+    def test_test_mode_sends_only_to_admin(self):
+        from io import StringIO
+
+        from django.core import mail
+        from django.core.management import call_command
+
+        call_command("send_overdue_reminders", today="2026-11-01", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual({tuple(message.to) for message in mail.outbox}, {("admin@example.lt",)})
+
+class MediaRoutingTests(SimpleTestCase):
+    def _media_routes(self, **settings_overrides) -> list:
+        import importlib
+
+        import config.urls
+
+        # urlpatterns sudaromi importuojant – perkraunam su norimais nustatymais
+        self.addCleanup(importlib.reload, config.urls)
+        with override_settings(**settings_overrides):
+            urls = importlib.reload(config.urls)
+        return [p for p in urls.urlpatterns if str(p.pattern).startswith("^media")]
+
+    def test_invoice_files_are_not_served_with_debug(self):
+        self.assertEqual(self._media_routes(DEBUG=True, SERVE_MEDIA=False), [])
+
+    def test_serve_media_is_explicit_opt_in(self):
+        self.assertEqual(len(self._media_routes(DEBUG=True, SERVE_MEDIA=True)), 1)
+
+
+@override_settings(DB_REPLICA_ALIAS=None)
+class AccountingExportTests(TestCase):
+    def test_csv_totals_are_counted_once_per_invoice(self):
+        import csv
+
+        from django.core.management import call_command
+
+        from billing.models import Client, InvoiceLine
+
+        client = Client.objects.create(name="UAB Buhalterija", company_code="300000002")
+        invoice = create_invoice(client, "MEV-0800", "100.00")
+        InvoiceLine.objects.create(invoice=invoice, description="Priežiūra", quantity=1, unit_price=60, total=60)
+        InvoiceLine.objects.create(invoice=invoice, description="Konsultacija", quantity=2, unit_price=20, total=40)
+        create_invoice(client, "MEV-0801", "50.00")
+        create_invoice(client, "MEV-0802", "999.00", issued_date=date(2026, 11, 1))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "export.csv")
+            call_command("export_accounting", month="2026-10", output=path, chunk_size=1, stdout=StringIO())
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual([row["Sąskaitos nr."] for row in rows], ["MEV-0800", "MEV-0800", "MEV-0801"])
+        self.assertEqual([row["Eilutė"] for row in rows], ["Priežiūra", "Konsultacija", ""])
+
+        def column_total(name):
+            return sum((Decimal(row[name]) for row in rows if row[name]), Decimal("0"))
+
+        self.assertEqual(column_total("Eilutės suma be PVM (€)"), Decimal("100.00"))
+        self.assertEqual(column_total("Suma be PVM (€)"), Decimal("150.00"))
+        self.assertEqual(column_total("PVM suma (€)"), Decimal("31.50"))
+        self.assertEqual(column_total("Suma su PVM (€)"), Decimal("181.50"))
+
+
+class UblTests(TestCase):
+    def test_hosting_invoice_for_foreign_client(self):
+        from lxml import etree
+
+        from billing.models import Client, InvoiceLine
+        from billing.services.ubl import CAC_NS, CBC_NS, render_ubl
+
+        client = Client.objects.create(name="Kunde GmbH", vat_code="DE123456789", country="de")
+        invoice = create_invoice(client, "MEV-0500", "120.00", invoice_type="hosting")
+        InvoiceLine.objects.create(invoice=invoice, description="Hostingas", quantity=1, unit_price=120, total=120)
+
+        root = etree.fromstring(render_ubl(invoice))
+        ns = {"cac": CAC_NS, "cbc": CBC_NS}
+        self.assertEqual(root.findtext("cbc:InvoiceTypeCode", namespaces=ns), "380")
+        self.assertEqual(
+            root.findtext("cac:AccountingCustomerParty//cac:Country/cbc:IdentificationCode", namespaces=ns), "DE"
+        )
+        self.assertEqual(root.findtext("cac:LegalMonetaryTotal/cbc:PayableAmount", namespaces=ns), "145.20")
+        self.assertEqual(root.findtext("cac:InvoiceLine/cbc:LineExtensionAmount", namespaces=ns), "120.00")
+
+    def test_endpoints_buyer_reference_and_zero_rate_categories(self):
+        from lxml import etree
+
+        from billing.models import Client
+        from billing.services.ubl import CAC_NS, CBC_NS, render_ubl
+
+        ns = {"cac": CAC_NS, "cbc": CBC_NS}
+
+        def rendered(client, number, rate):
+            root = etree.fromstring(render_ubl(create_invoice(client, number, vat_rate=Decimal(rate))))
+            endpoint = root.find("cac:AccountingCustomerParty/cac:Party/cbc:EndpointID", namespaces=ns)
+            category = root.find("cac:TaxTotal/cac:TaxSubtotal/cac:TaxCategory", namespaces=ns)
+            return (
+                root.findtext("cbc:BuyerReference", namespaces=ns),
+                None if endpoint is None else (endpoint.get("schemeID"), endpoint.text),
+                category.findtext("cbc:ID", namespaces=ns),
+                category.findtext("cbc:TaxExemptionReasonCode", namespaces=ns),
+            )
+
+        local = Client.objects.create(name="UAB Vietinis", company_code="300000001", vat_code="LT100000001")
+        german = Client.objects.create(name="Kunde GmbH", vat_code="DE123456789", country="DE")
+        swiss = Client.objects.create(name="Kunde AG", country="CH", email="buchhaltung@kunde.ch")
+
+        self.assertEqual(rendered(local, "MEV-0510", "0.21"), ("MEV-0510", ("0200", "300000001"), "S", None))
+        self.assertEqual(rendered(local, "MEV-0511", "0"), ("MEV-0511", ("0200", "300000001"), "E", None))
+        self.assertEqual(
+            rendered(german, "MEV-0512", "0"), ("MEV-0512", ("9930", "DE123456789"), "AE", "VATEX-EU-AE")
+        )
+        self.assertEqual(
+            rendered(swiss, "MEV-0513", "0"), ("MEV-0513", ("EM", "buchhaltung@kunde.ch"), "G", "VATEX-EU-G")
+        )
+
+
+class IsafTests(TestCase):
+    def test_country_and_tax_codes(self):
+        from lxml import etree
+
+        from billing.models import Client
+        from billing.services.isaf import ISAF_NS, write_isaf
+
+        create_invoice(Client.objects.create(name="UAB Vietinis", company_code="300000001"), "MEV-0600", "100.00")
+        foreign = Client.objects.create(name="Kunde GmbH", vat_code="DE123456789", country="de")
+        create_invoice(foreign, "MEV-0601", "50.00", vat_rate=Decimal("0.00"))
+        create_invoice(foreign, "MEV-0602", "70.00", invoice_type="hosting")
+
+        buffer = BytesIO()
+        self.assertEqual(write_isaf(buffer, date(2026, 10, 1), date(2026, 10, 31)), 2)
+
+        ns = {"i": ISAF_NS}
+        invoices = {
+            el.findtext("i:InvoiceNo", namespaces=ns): (
+                el.findtext("i:CustomerInfo/i:Country", namespaces=ns),
+                el.findtext(".//i:TaxCode", namespaces=ns),
+                el.findtext(".//i:TaxableValue", namespaces=ns),
+                el.findtext(".//i:Amount", namespaces=ns),
+            )
+            for el in etree.fromstring(buffer.getvalue()).iterfind(".//i:Invoice", namespaces=ns)
+        }
+        self.assertEqual(
+            invoices,
+            {"MEV-0600": ("LT", "PVM1", "100.00", "21.00"), "MEV-0601": ("DE", "PVM14", "50.00", "0.00")},
+        )
+
+    @override_settings(ISAF_ZERO_RATE_TAX_CODES={"domestic": "PVM12"})
+    def test_zero_rate_codes_from_settings(self):
+        from billing.services.isaf import _tax_code
+
+        self.assertEqual(_tax_code("MEV-1", Decimal("0"), "LT"), "PVM12")
+        self.assertEqual(_tax_code("MEV-1", Decimal("0"), "LV"), "PVM14")
+
+
+class BankStatementTests(TestCase):
+    STATEMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>
+  <Ntry>
+    <Amt Ccy="EUR">181.50</Amt><CdtDbtInd>CRDT</CdtDbtInd><Sts>BOOK</Sts>
+    <BookgDt><Dt>2026-10-05</Dt></BookgDt><AcctSvcrRef>BATCH-1</AcctSvcrRef>
+    <NtryDtls>
+      <TxDtls>
+        <Refs><EndToEndId>E2E-1</EndToEndId></Refs>
+        <AmtDtls><TxAmt><Amt Ccy="EUR">121.00</Amt></TxAmt></AmtDtls>
+        <RltdPties><Dbtr><Nm>UAB Pirmas</Nm></Dbtr></RltdPties>
+        <RmtInf><Ustrd>Apmokejimas uz MEV-0700</Ustrd></RmtInf>
+      </TxDtls>
+      <TxDtls>
+        <Refs><EndToEndId>E2E-2</EndToEndId></Refs>
+        <Amt Ccy="EUR">60.50</Amt>
+        <RmtInf><Strd><CdtrRefInf><Ref>mev-0701</Ref></CdtrRefInf></Strd></RmtInf>
+      </TxDtls>
+    </NtryDtls>
+  </Ntry>
+  <Ntry>
+    <Amt Ccy="EUR">121.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><Sts><Cd>PDNG</Cd></Sts>
+    <BookgDt><Dt>2026-10-06</Dt></BookgDt><AcctSvcrRef>PENDING-1</AcctSvcrRef>
+    <NtryDtls><TxDtls><RmtInf><Ustrd>MEV-0702</Ustrd></RmtInf></TxDtls></NtryDtls>
+  </Ntry>
+  <Ntry>
+    <Amt Ccy="EUR">121.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><Sts><Cd>BOOK</Cd></Sts>
+    <BookgDt><Dt>2026-10-07</Dt></BookgDt><AcctSvcrRef>AGAIN-1</AcctSvcrRef>
+    <NtryDtls><TxDtls><RmtInf><Ustrd>MEV-0700 pakartotinai</Ustrd></RmtInf></TxDtls></NtryDtls>
+  </Ntry>
+  <Ntry>
+    <Amt Ccy="EUR">100.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><Sts>BOOK</Sts>
+    <BookgDt><Dt>2026-10-08</Dt></BookgDt><AcctSvcrRef>SHORT-1</AcctSvcrRef>
+    <NtryDtls><TxDtls><RmtInf><Ustrd>MEV-0703</Ustrd></RmtInf></TxDtls></NtryDtls>
+  </Ntry>
+  <Ntry>
+    <Amt Ccy="EUR">121.00</Amt><CdtDbtInd>DBIT</CdtDbtInd><Sts>BOOK</Sts>
+    <BookgDt><Dt>2026-10-09</Dt></BookgDt>
+    <NtryDtls><TxDtls><RmtInf><Ustrd>MEV-0703</Ustrd></RmtInf></TxDtls></NtryDtls>
+  </Ntry>
+</Stmt></BkToCstmrStmt></Document>
+"""
+
+    def setUp(self):
+        from billing.models import Client
+
+        client = Client.objects.create(name="UAB Pirmas")
+        self.invoices = {
+            number: create_invoice(client, number, net)
+            for number, net in (
+                ("MEV-0700", "100.00"),
+                ("MEV-0701", "50.00"),
+                ("MEV-0702", "100.00"),
+                ("MEV-0703", "100.00"),
+            )
+        }
+
+    def import_statement(self, **options):
+        from billing.services.bank_statement import import_statements
+
+        return import_statements([BytesIO(self.STATEMENT.encode())], **options)
+
+    def test_batched_credits_pay_invoices_once(self):
+        report = self.import_statement()
+
+        # PDNG ir DBIT įrašai praleidžiami, paketinio mokėjimo TxDtls – atskiros įplaukos
+        self.assertEqual(report.credits, 4)
+        self.assertEqual([detail for _credit, detail in report.matched], ["MEV-0700", "MEV-0701"])
+        self.assertEqual(report.marked_paid, 2)
+        unmatched = {credit.reference: detail for credit, detail in report.unmatched}
+        self.assertEqual(unmatched["AGAIN-1"], "Sąskaita MEV-0700 šiame išraše jau apmokėta.")
+        self.assertEqual(unmatched["SHORT-1"], "Suma 100.00 nesutampa (MEV-0703 – 121.00).")
+
+        for invoice in self.invoices.values():
+            invoice.refresh_from_db()
+        paid = {number: invoice for number, invoice in self.invoices.items() if invoice.paid}
+        self.assertEqual(sorted(paid), ["MEV-0700", "MEV-0701"])
+        self.assertEqual(paid["MEV-0700"].paid_date, date(2026, 10, 5))
+        self.assertEqual(paid["MEV-0700"].payment_reference, "E2E-1")
+        self.assertEqual(paid["MEV-0701"].payment_reference, "E2E-2")
+
+    def test_other_currency_is_not_matched(self):
+        from billing.models import Invoice
+        from billing.services.bank_statement import import_statements
+
+        statement = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"><BkToCstmrStmt><Stmt>
+  <Ntry>
+    <Amt Ccy="USD">121.00</Amt><CdtDbtInd>CRDT</CdtDbtInd><Sts>BOOK</Sts>
+    <BookgDt><Dt>2026-10-05</Dt></BookgDt><AcctSvcrRef>USD-1</AcctSvcrRef>
+    <NtryDtls><TxDtls><RmtInf><Ustrd>MEV-0700</Ustrd></RmtInf></TxDtls></NtryDtls>
+  </Ntry>
+</Stmt></BkToCstmrStmt></Document>
+"""
+        report = import_statements([BytesIO(statement.encode())])
+
+        self.assertEqual(report.matched, [])
+        self.assertEqual([detail for _credit, detail in report.unmatched], ["Įplauka USD, sąskaitos – EUR."])
+        self.assertFalse(Invoice.objects.filter(paid=True).exists())
+
+    def test_dry_run_changes_nothing(self):
+        from billing.models import Invoice
+
+        report = self.import_statement(dry_run=True)
+
+        self.assertEqual(len(report.matched), 2)
+        self.assertEqual(report.marked_paid, 0)
+        self.assertFalse(Invoice.objects.filter(paid=True).exists())
+
+
+class PdfRenderingRegressionTests(TestCase):
+    """
+    Sąskaitų PDF lyginamas su billing/benchmarks/pdf_baseline.json (atnaujinama `manage.py benchmark_pdf
+    --update-baseline`): tekstas ir puslapių skaičius – tiksliai, dydis ir atmintis – su tolerancija.
+    Greitis priklauso nuo mašinos, todėl tikrinamas tik su BILLING_PDF_BENCHMARK=1.
+    """
+
+    CHECK_SPEED = os.getenv("BILLING_PDF_BENCHMARK") == "1"
+
+    def test_output_matches_baseline(self):
+        from billing.services.pdf_benchmark import compare, load_baseline, run
+
+        baseline = load_baseline()
+        self.assertTrue(baseline, "Nėra bazinių reikšmių – paleiskit manage.py benchmark_pdf --update-baseline")
+        results = run(min_time=1.0 if self.CHECK_SPEED else 0, min_rounds=3 if self.CHECK_SPEED else 1)
+        self.assertEqual(compare(results, baseline, speed=self.CHECK_SPEED), [])
+
+    def test_long_descriptions_wrap_without_losing_text(self):
+        from billing.services.pdf import DESCRIPTION_WIDTH, _ensure_fonts, _text_width, _wrap
+        from billing.services.pdf_benchmark import _LONG_LT
+
+        _ensure_fonts()
+        rows = _wrap(_LONG_LT, DESCRIPTION_WIDTH)
+        self.assertGreater(len(rows), 1)
+        self.assertTrue(all(_text_width(row, "DejaVu", 10) <= DESCRIPTION_WIDTH for row in rows))
+        self.assertEqual("".join(rows).replace(" ", ""), _LONG_LT.replace(" ", ""))
@@ -0,0 +1,14 @@
+from django.urls import path
+
+from billing import views
+
+app_name = "billing"
+
+urlpatterns = [
+    path("worklogs/bulk/", views.worklog_bulk_import, name="worklog_bulk_import"),
+    path("invoices/", views.invoice_list, name="invoice_list"),
+    path("invoices/<str:number>/", views.invoice_detail, name="invoice_detail"),
+    path("invoices/<str:number>/pdf/", views.invoice_render_pdf, name="invoice_render_pdf"),
+    path("invoices/<str:number>/optimum/", views.invoice_optimum, name="invoice_optimum"),
+    path("pdf/<str:token>/", views.invoice_pdf, name="invoice_pdf"),
+]
@@ -1,3 +1,354 @@
-from django.shortcuts import render
+import base64
+import hashlib
+import hmac
+from datetime import date
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.db.models import Count, Max, Q
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from billing.models import Invoice, OptimumExportTask
+from billing.services.downloads import invoice_id_from_token, invoice_pdf_url, pdf_response
+from billing.services.worklog_import import DEFAULT_BATCH_SIZE, import_worklogs, read_rows
+
+INVOICE_PAGE_SIZE = 50
+INVOICE_PAGE_SIZE_MAX = 500
+
+
+def _api_authorized(request) -> bool:
+    """API raktas perduodamas `Authorization: Bearer <BILLING_API_TOKEN>`. Be nustatyto rakto API išjungtas."""
+    token = (getattr(settings, "BILLING_API_TOKEN", "") or "").strip()
+    if not token:
+        return False
+    header = request.headers.get("Authorization", "")
+    scheme, _, value = header.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(value.strip(), token)
+
+
+def _read_api_authorized(request) -> bool:
+    # Skaitymui tinka ir prisijungęs administratorius (GET – CSRF nesvarbu)
+    return bool(request.user.is_authenticated and request.user.is_staff) or _api_authorized(request)
+
+
+async def _aread_api_authorized(request) -> bool:
+    # request.user async kontekste neprieinamas – sesija / vartotojas kraunami per auser()
+    if _api_authorized(request):
+        return True
+    user = await request.auser()
+    return bool(user.is_authenticated and user.is_staff)
+
+
+def _in_worker_thread(func, *args, **kwargs):
+    """
+    Lėtas blokuojantis darbas (reportlab, Optimum SOAP) atskiroje thread pool gijoje
+    (sync_to_async(..., thread_sensitive=False)), kad nelauktų bendros sync gijos eilėje.
+    Gija turi savo DB jungtį – ją uždarom, kad neliktų kabančių jungčių.
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+@csrf_exempt
+@require_POST
+def worklog_bulk_import(request):
+    """
+    Masinis darbų (WorkLog) importas: JSON (sąrašas arba {"rows": [...]}) arba CSV (Content-Type: text/csv).
+
+    Eilutės laukai: client_id arba client_code, date (YYYY-MM-DD), description, quantity, unit_price,
+    idempotency_key (nebūtinas, bet rekomenduojamas – pakartotinai atsiųstos eilutės nebus dubliuojamos).
+    """
+    if not _api_authorized(request):
+        return JsonResponse({"error": "Neautorizuota."}, status=401)
+
+    fmt = "csv" if request.content_type in ("text/csv", "application/csv") else "json"
+    try:
+        batch_size = int(request.GET.get("batch_size") or DEFAULT_BATCH_SIZE)
+    except ValueError:
+        return JsonResponse({"error": "Netinkamas batch_size."}, status=400)
+
+    try:
+        reports = import_worklogs(read_rows(request.body, fmt), batch_size=max(1, batch_size))
+    except (ValueError, UnicodeDecodeError) as exc:
+        return JsonResponse({"error": f"Nepavyko nuskaityti {fmt.upper()}: {exc}"}, status=400)
+
+    return JsonResponse(
+        {
+            "accepted": sum(r.accepted for r in reports),
+            "duplicates": sum(r.duplicates for r in reports),
+            "rejected": sum(len(r.rejected) for r in reports),
+            "batches": [r.as_dict() for r in reports],
+        }
+    )
+
+
+# --- Sąskaitų skaitymo API ---
+
+
+def _encode_cursor(issued_date: date, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{issued_date.isoformat()}|{pk}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[date, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    date_str, pk_str = raw.split("|")
+    return date.fromisoformat(date_str), int(pk_str)
+
+
+def _serialize_invoice(invoice: Invoice) -> dict:
+    client = invoice.client
+    return {
+        "id": invoice.pk,
+        "number": invoice.number,
+        "invoice_type": invoice.invoice_type,
+        "period_from": invoice.period_from.isoformat(),
+        "period_to": invoice.period_to.isoformat(),
+        "issued_date": invoice.issued_date.isoformat(),
+        "due_date": invoice.due_date.isoformat(),
+        "net_amount": f"{invoice.net_amount:.2f}",
+        "vat_rate": f"{invoice.vat_rate}",
+        "vat_amount": f"{invoice.vat_amount:.2f}",
+        "total_amount": f"{invoice.total_amount:.2f}",
+        "paid": invoice.paid,
+        "has_pdf": bool(invoice.pdf),
+        "updated_at": invoice.updated_at.isoformat(),
+        "client": {
+            "id": client.pk,
+            "name": client.name,
+            "company_code": client.company_code,
+            "vat_code": client.vat_code,
+            "address": client.address,
+        },
+        "lines": [
+            {
+                "description": line.description,
+                "quantity": f"{line.quantity}",
+                "unit_price": f"{line.unit_price:.2f}",
+                "total": f"{line.total:.2f}",
+            }
+            for line in invoice.lines.all()
+        ],
+    }
+
+
+# Sąskaitos JSON versija: pati sąskaita, jos klientas ir eilutės. Eilučių pakeitimai pakelia
+# Invoice.updated_at (billing.signals), o be signalų pridėtos / ištrintos eilutės matomos iš jų skaičiaus ir max id.
+VERSION_FIELDS = ("id", "updated_at", "client__updated_at", "line_count", "line_max_id")
+
+
+def _with_versions(qs):
+    return qs.annotate(line_count=Count("lines"), line_max_id=Max("lines__id"))
+
+
+def _conditional(request, keys: list, extra: str = ""):
+    """
+    ETag / Last-Modified iš pigios VERSION_FIELDS užklausos – jei klientas turi aktualią versiją,
+    grąžinam 304 dar nekrovę eilučių ir neserializavę JSON.
+    """
+    digest = hashlib.sha1(f"{extra}|{keys!r}".encode()).hexdigest()
+    etag = quote_etag(digest)
+    last_modified = max(
+        (max(updated_at, client_updated_at) for _pk, updated_at, client_updated_at, *_lines in keys),
+        default=None,
+    )
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    return etag, last_modified_ts, not_modified
+
+
+def _with_validators(response: HttpResponse, etag: str, last_modified_ts: int | None) -> HttpResponse:
+    response["ETag"] = etag
+    if last_modified_ts is not None:
+        response["Last-Modified"] = http_date(last_modified_ts)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@require_GET
+def invoice_list(request):
+    """
+    Sąskaitos su eilutėmis ir klientu, naujausios pirmos.
+
+    Puslapiavimas – keyset (cursor) pagal (issued_date, id): `?cursor=<next_cursor>&limit=50`,
+    todėl atsakymo laikas nepriklauso nuo puslapio gylio. Filtrai: `client`, `paid` (0/1).
+    """
+    if not _read_api_authorized(request):
+        return JsonResponse({"error": "Neautorizuota."}, status=401)
+
+    try:
+        limit = min(max(int(request.GET.get("limit") or INVOICE_PAGE_SIZE), 1), INVOICE_PAGE_SIZE_MAX)
+    except ValueError:
+        return JsonResponse({"error": "Netinkamas limit."}, status=400)
+
+    qs = Invoice.objects.order_by("-issued_date", "-id")
+
+    if request.GET.get("client"):
+        try:
+            qs = qs.filter(client_id=int(request.GET["client"]))
+        except ValueError:
+            return JsonResponse({"error": "Netinkamas client."}, status=400)
+    if request.GET.get("paid") in ("0", "1"):
+        qs = qs.filter(paid=request.GET["paid"] == "1")
+
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            cursor_date, cursor_pk = _decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({"error": "Netinkamas cursor."}, status=400)
+        qs = qs.filter(Q(issued_date__lt=cursor_date) | Q(issued_date=cursor_date, id__lt=cursor_pk))
+
+    page_keys = list(_with_versions(qs).values_list("issued_date", *VERSION_FIELDS)[: limit + 1])
+    has_next = len(page_keys) > limit
+    page_keys = page_keys[:limit]
+
+    etag, last_modified_ts, not_modified = _conditional(
+        request,
+        [version for _issued, *version in page_keys],
+        extra=request.get_full_path(),
+    )
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified_ts)
+
+    invoices = {
+        inv.pk: inv
+        for inv in Invoice.objects.filter(id__in=[pk for _issued, pk, *_version in page_keys])
+        .select_related("client")
+        .prefetch_related("lines")
+    }
+
+    next_cursor = None
+    if has_next and page_keys:
+        last_issued, last_pk, *_version = page_keys[-1]
+        next_cursor = _encode_cursor(last_issued, last_pk)
+
+    response = JsonResponse(
+        {
+            "results": [_serialize_invoice(invoices[pk]) for _issued, pk, *_version in page_keys if pk in invoices],
+            "next_cursor": next_cursor,
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
+    return _with_validators(response, etag, last_modified_ts)
+
+
+@require_GET
+def invoice_detail(request, number):
+    if not _read_api_authorized(request):
+        return JsonResponse({"error": "Neautorizuota."}, status=401)
+
+    keys = list(_with_versions(Invoice.objects.filter(number=number)).values_list(*VERSION_FIELDS))
+    if not keys:
+        return JsonResponse({"error": "Sąskaita nerasta."}, status=404)
+
+    etag, last_modified_ts, not_modified = _conditional(request, keys)
+    if not_modified is not None:
+        return _with_validators(not_modified, etag, last_modified_ts)
+
+    invoice = Invoice.objects.select_related("client").prefetch_related("lines").get(pk=keys[0][0])
+    response = JsonResponse(_serialize_invoice(invoice), json_dumps_params={"ensure_ascii": False})
+    return _with_validators(response, etag, last_modified_ts)
+
+
+# --- PDF atsisiuntimas pagal pasirašytą nuorodą ---
+
+
+@require_GET
+async def invoice_pdf(request, token):
+    """Sąskaitos PDF pagal pasirašytą, ribotą laiką galiojančią nuorodą (žr. invoice_pdf_url)."""
+    try:
+        invoice_id = invoice_id_from_token(token)
+    except signing.SignatureExpired:
+        return HttpResponseForbidden("Nuoroda nebegalioja.")
+    except (signing.BadSignature, ValueError):
+        return HttpResponseForbidden("Netinkama nuoroda.")
+
+    invoice = await Invoice.objects.filter(pk=invoice_id).only("id", "number", "pdf").afirst()
+    if invoice is None or not invoice.pdf:
+        raise Http404("PDF nerastas.")
+
+    # storage.size / modified_time blokuoja – per thread pool; turinys siunčiamas async iteratoriumi
+    return await sync_to_async(pdf_response, thread_sensitive=False)(
+        request, invoice.pdf, f"{invoice.number}.pdf", asynchronous=True
+    )
+
+
+@csrf_exempt
+@require_POST
+async def invoice_render_pdf(request, number):
+    """
+    Sugeneruoja sąskaitos PDF (jei dar nėra; `?force=1` – pergeneruoja) ir grąžina pasirašytą nuorodą.
+    """
+    if not _api_authorized(request):
+        return JsonResponse({"error": "Neautorizuota."}, status=401)
+
+    invoice = await Invoice.objects.select_related("client").filter(number=number).afirst()
+    if invoice is None:
+        return JsonResponse({"error": "Sąskaita nerasta."}, status=404)
+
+    from billing.services.pdf import ensure_invoice_pdf
+
+    await sync_to_async(_in_worker_thread, thread_sensitive=False)(
+        ensure_invoice_pdf, invoice, force=request.GET.get("force") == "1"
+    )
+
+    return JsonResponse({"number": invoice.number, "pdf_url": invoice_pdf_url(invoice)})
+
+
+def _optimum_state(invoice: Invoice) -> dict:
+    return {
+        "number": invoice.number,
+        "optimum_status": invoice.optimum_status,
+        "optimum_exported_at": invoice.optimum_exported_at.isoformat() if invoice.optimum_exported_at else None,
+        "optimum_error": invoice.optimum_error,
+    }
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def invoice_optimum(request, number):
+    """
+    GET – sąskaitos eksporto į Optimum būsena.
+    POST – įtraukia sąskaitą į Optimum eilę ir iškart ją išsiunčia (jau eksportuotos praleidžiamos;
+    `?force=1` – siunčia dar kartą).
+    """
+    if request.method == "POST":
+        if not _api_authorized(request):
+            return JsonResponse({"error": "Neautorizuota."}, status=401)
+    elif not await _aread_api_authorized(request):
+        return JsonResponse({"error": "Neautorizuota."}, status=401)
+
+    invoice = await Invoice.objects.select_related("client").filter(number=number).afirst()
+    if invoice is None:
+        return JsonResponse({"error": "Sąskaita nerasta."}, status=404)
+
+    if request.method == "GET" or (invoice.optimum_status == "exported" and request.GET.get("force") != "1"):
+        return JsonResponse(_optimum_state(invoice), json_dumps_params={"ensure_ascii": False})
+
+    from billing.services.outbox import drain_optimum_outbox
+
+    # Per outbox, kaip ir visi kiti eksportai: jei sąskaitą jau siunčia drain_optimum_outbox,
+    # čia ji nepaimama (SKIP LOCKED) ir atsakymas – 202. SOAP laukiam thread pool'e, ne sync gijoje.
+    await sync_to_async(OptimumExportTask.enqueue)(invoice, requeue=request.GET.get("force") == "1")
+    await sync_to_async(_in_worker_thread, thread_sensitive=False)(drain_optimum_outbox, 1, invoice_ids=[invoice.pk])
+    await invoice.arefresh_from_db(fields=["optimum_status", "optimum_exported_at", "optimum_error"])
+    status = invoice.optimum_status
+
+    response = JsonResponse(
+        _optimum_state(invoice),
+        status={"exported": 200, "deferred": 503, "failed": 502}.get(status, 202),
+        json_dumps_params={"ensure_ascii": False},
+    )
+    if status == "deferred":
+        from billing.services.optimum import optimum_breaker
+
+        response["Retry-After"] = str(int(optimum_breaker.cooldown))
+    return response
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Skaitymo replika: sąrašai, ataskaitos, eksportai ir API GET skaito iš DB_REPLICA_ALIAS,
+# rašymai ir sąskaitų generavimo komandos – visada pagrindinėje DB.
+#
+# Būsena laikoma ContextVar'e kaip keičiamas objektas: sync_to_async gijos gauna konteksto kopiją,
+# bet tą patį objektą, todėl rašymas gijoje „prisegia“ ir visą užklausą (read-your-writes).
+
+PIN_COOKIE = "db_pin"
+
+
+class _RoutingState:
+    __slots__ = ("replica", "pinned")
+
+    def __init__(self, replica: bool):
+        self.replica = replica
+        self.pinned = False
+
+
+_state: ContextVar[_RoutingState | None] = ContextVar("db_routing_state", default=None)
+
+
+def replica_alias() -> str | None:
+    """Replikos alias (settings.DB_REPLICA_ALIAS), jei replika sukonfigūruota, kitaip None."""
+    return getattr(settings, "DB_REPLICA_ALIAS", None) or None
+
+
+def reporting_db() -> str:
+    """Alias ataskaitų/eksporto užklausoms su .using(): replika, jei yra, kitaip pagrindinė DB."""
+    return replica_alias() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_replica():
+    """
+    Bloke skaitymai eina į repliką (komandoms ir ataskaitoms). Po pirmo rašymo bloke skaitoma
+    iš pagrindinės DB – kad ką tik įrašyti duomenys būtų matomi.
+    """
+    token = _state.set(_RoutingState(replica=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Bloke visi skaitymai – iš pagrindinės DB (sąskaitų generavimas, paleistas iš admin GET)."""
+    token = _state.set(_RoutingState(replica=False))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+def pinned_to_primary() -> bool:
+    state = _state.get()
+    return state is not None and state.pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica or state.pinned:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replika – tos pačios DB kopija
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schema į repliką ateina replikacija
+        return db != replica_alias()
+
+
+def _reads_from_replica(request) -> bool:
+    if request.method not in ("GET", "HEAD") or replica_alias() is None:
+        return False
+    # Per DB_REPLICA_PIN_SECONDS po rašymo (pvz. admin POST → redirect → GET) skaitoma iš pagrindinės DB
+    if request.COOKIES.get(PIN_COOKIE):
+        return False
+    prefixes = getattr(settings, "DB_REPLICA_READ_PATHS", ())
+    return any(request.path.startswith(prefix) for prefix in prefixes)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    GET/HEAD užklausos DB_REPLICA_READ_PATHS keliuose (admin sąrašai, API) skaito iš replikos.
+    Užklausa, kuri ką nors įrašė, gauna trumpalaikį slapuką – kelios sekančios užklausos
+    skaito iš pagrindinės DB, kol replika pasivys.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _state.set(_RoutingState(replica=_reads_from_replica(request)))
+        try:
+            response = self.get_response(request)
+            return self._pin(response)
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = _state.set(_RoutingState(replica=_reads_from_replica(request)))
+        try:
+            response = await self.get_response(request)
+            return self._pin(response)
+        finally:
+            _state.reset(token)
+
+    def _pin(self, response):
+        if pinned_to_primary() and replica_alias() is not None:
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=getattr(settings, "DB_REPLICA_PIN_SECONDS", 5),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
@@ -0,0 +1,165 @@
+"""
+django.db.backends.mysql su procesų viduje laikomu prisijungimų pool'u.
+
+ENGINE = "config.mysql_pool", o pool'o nustatymai – OPTIONS["pool"]:
+
+    "pool": {
+        "max_size": 10,             # daugiausiai atvirų prisijungimų vienam alias'ui procese
+        "max_lifetime": 600,        # s; senesnis prisijungimas uždaromas ir atidaromas naujas
+        "health_check_after": 30,   # s; ilgiau nenaudotas prisijungimas prieš išduodant ping'inamas
+        "timeout": 10,              # s; kiek laukti laisvo prisijungimo, kai visi užimti
+    }
+
+Django connection.close() (užklausos pabaigoje, CONN_MAX_AGE = 0) prisijungimo neuždaro, o grąžina
+į pool'ą. Naujam „prisijungimui“ nereikia TCP/TLS rankos paspaudimo, autentifikacijos, init_command
+(SET NAMES) ir sesijos nustatymų – jie atlikti vieną kartą, kuriant prisijungimą.
+
+Pastaba: sesijos būsena (SET @kintamasis, SET SESSION ...) išlieka tarp užklausų – jos nekeiskit.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+from django.db.utils import OperationalError
+
+DEFAULT_POOL_OPTIONS = {
+    "max_size": 10,
+    "max_lifetime": 600.0,
+    "health_check_after": 30.0,
+    "timeout": 10.0,
+}
+
+
+class ConnectionPool:
+    """Thread-safe DB-API prisijungimų pool'as (LIFO – pirmiausia išduodamas „šilčiausias“)."""
+
+    def __init__(self, *, max_size, max_lifetime, health_check_after, timeout):
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self._idle = deque()  # (conn, created_at, released_at)
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "waited": 0}
+
+    def acquire(self, connect):
+        """Laisvas prisijungimas iš pool'o arba naujas (connect()), jei pool'as dar nepilnas."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    self.stats["waited"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        raise OperationalError(
+                            f"DB pool'as išnaudotas: visi {self.max_size} prisijungimai užimti ilgiau nei {self.timeout} s"
+                        )
+                if self._idle:
+                    conn, created_at, released_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    conn = None
+
+            if conn is None:
+                try:
+                    conn = connect()
+                except BaseException:
+                    self._forget()
+                    raise
+                conn._pool_created_at = time.monotonic()
+                self.stats["created"] += 1
+                return conn
+
+            now = time.monotonic()
+            if now - created_at > self.max_lifetime or (
+                now - released_at > self.health_check_after and not self._ping(conn)
+            ):
+                self._discard(conn)
+                continue
+            self.stats["reused"] += 1
+            return conn
+
+    def release(self, conn, *, discard: bool = False) -> None:
+        if discard:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, getattr(conn, "_pool_created_at", 0.0), time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _created_at, _released_at in idle:
+            self._discard(conn)
+
+    @staticmethod
+    def _ping(conn) -> bool:
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn) -> None:
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._forget()
+
+    def _forget(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, options: dict) -> ConnectionPool:
+    """Vienas pool'as alias'ui procese. Po fork() (gunicorn worker'iai) paveldėti socket'ai nenaudojami."""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(**{**DEFAULT_POOL_OPTIONS, **options})
+        return pool
+
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+    @property
+    def pool(self) -> ConnectionPool:
+        return get_pool(self.alias, self.settings_dict["OPTIONS"].get("pool") or {})
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+
+    def init_connection_state(self):
+        # Sesijos nustatymai (SQL_AUTO_IS_NULL, izoliacijos lygis) galioja visą prisijungimo gyvenimą
+        if getattr(self.connection, "_pool_initialized", False):
+            return
+        super().init_connection_state()
+        self.connection._pool_initialized = True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Nebaigta transakcija ar po DB klaidos nebeveikiantis prisijungimas į pool'ą negrąžinamas
+        discard = self.in_atomic_block or not self.autocommit or (self.errors_occurred and not self.is_usable())
+        self.pool.release(self.connection, discard=discard)
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Prieš sesijas ir auth – kad ir jų užklausos eitų per replikos maršrutą
+    'config.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,14 +79,23 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Nutolęs MySQL: kiekvienas naujas prisijungimas – TCP + autentifikacija + SET NAMES.
+# Pagal nutylėjimą (DB_POOL_SIZE=0) – įprastas backend'as su nuolatiniais prisijungimais (CONN_MAX_AGE).
+# Pool'as įjungiamas sąmoningai: DB_POOL_SIZE > 0 – prisijungimai laikomi proceso pool'e
+# (config.mysql_pool) ir grąžinami į jį užklausos pabaigoje.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": "config.mysql_pool" if DB_POOL_SIZE > 0 else "django.db.backends.mysql",
         "NAME": os.getenv("DB_NAME"),
         "USER": os.getenv("DB_USER"),
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST", "212.237.233.125"),
         "PORT": os.getenv("DB_PORT", "3306"),
+        # Su pool'u – 0 (prisijungimas grąžinamas į pool'ą po kiekvienos užklausos)
+        "CONN_MAX_AGE": 0 if DB_POOL_SIZE > 0 else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
         "OPTIONS": {
             "charset": "utf8mb4",
             # Ensures the connection uses utf8mb4 for proper Lithuanian characters.
@@ -92,6 +103,52 @@ DATABASES = {
         },
     }
 }
+if DB_POOL_SIZE > 0:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "max_size": DB_POOL_SIZE,
+        "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "600")),
+        "health_check_after": float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30")),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    }
+
+# Skaitymo replika (nebūtina): admin sąrašai, ataskaitos, eksportai ir API GET skaito iš jos,
+# rašymai ir sąskaitų generavimas – pagrindinėje DB (config.db_router). Be DB_REPLICA_HOST viskas
+# eina į "default". Lokaliai galima išbandyti su dviem SQLite DB (žr. billing/tests.py).
+DB_REPLICA_ALIAS = None
+if os.getenv("DB_REPLICA_HOST"):
+    DB_REPLICA_ALIAS = "replica"
+    DATABASES[DB_REPLICA_ALIAS] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+        "USER": os.getenv("DB_REPLICA_USER", DATABASES["default"]["USER"]),
+        "PASSWORD": os.getenv("DB_REPLICA_PASSWORD", DATABASES["default"]["PASSWORD"]),
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        # Testuose replika – ta pati testinė DB (atskirai nekuriama)
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["config.db_router.ReplicaRouter"]
+# Keliai, kurių GET/HEAD užklausos skaito iš replikos
+DB_REPLICA_READ_PATHS = ["/admin/", "/api/"]
+# Kiek sekundžių po rašymo tos naršyklės užklausos skaito iš pagrindinės DB (replikacijos vėlavimas)
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "5"))
+
+# Cache: Optimum breaker būsena, BillingProfile. Default – proceso LocMemCache (breaker būsena kiekviename
+# procese atskira, profiliai nekešuojami). Bendram visiems procesams (gunicorn, billing_worker) cache –
+# CACHE_URL: redis://host:6379/0 (reikia redis) arba memcached://host:11211 (reikia pymemcache).
+CACHE_URL = os.getenv("CACHE_URL", "").strip()
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}}
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": CACHE_URL.removeprefix("memcached://"),
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
 # DATABASES = {
 #     "default": {
@@ -150,6 +207,9 @@ STATIC_URL = 'static/'
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# MEDIA_ROOT – sąskaitų PDF / UBL; jie atsisiunčiami tik per pasirašytas nuorodas (billing:invoice_pdf).
+# Tiesioginis /media/ aptarnavimas (tik DEBUG režimu) įjungiamas atskirai, SERVE_MEDIA=1 – ne pagal DEBUG.
+SERVE_MEDIA = os.getenv("SERVE_MEDIA", "") == "1"
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 
@@ -162,4 +222,42 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 
 DEFAULT_FROM_EMAIL = "Sąskaitos < saskaitos@mevika.lt>"
 
-OPTIMUM_API_KEY = os.getenv("OPTIMUM_API_KEY", "").strip()
\ No newline at end of file
+OPTIMUM_API_KEY = os.getenv("OPTIMUM_API_KEY", "").strip()
+
+# Optimum circuit breaker: po N nesėkmių iš eilės kvietimai atidedami COOLDOWN sekundžių.
+# Timeout'as adaptuojasi pagal vėlinimą ribose [MIN, MAX]. Būsena laikoma cache – kad ją matytų
+# ir admin, ir billing_worker, CACHES turi būti bendras (žr. CACHES aukščiau).
+OPTIMUM_BREAKER_FAILURES = int(os.getenv("OPTIMUM_BREAKER_FAILURES", "3"))
+OPTIMUM_BREAKER_COOLDOWN = float(os.getenv("OPTIMUM_BREAKER_COOLDOWN", "120"))
+OPTIMUM_TIMEOUT_MIN = float(os.getenv("OPTIMUM_TIMEOUT_MIN", "3"))
+OPTIMUM_TIMEOUT_MAX = float(os.getenv("OPTIMUM_TIMEOUT_MAX", "30"))
+# GetInvoices (reconcile_optimum) – atskira grandinė su fiksuotu timeout'u
+OPTIMUM_BULK_TIMEOUT = float(os.getenv("OPTIMUM_BULK_TIMEOUT", "120"))
+
+# Klientų BillingProfile (gavėjai, PDF pirkėjo blokas) cache trukmė, s. Išmetama ir anksčiau –
+# pasikeitus Client / ClientEmail. Su proceso LocMemCache profiliai nekešuojami.
+BILLING_PROFILE_CACHE_TIMEOUT = int(os.getenv("BILLING_PROFILE_CACHE_TIMEOUT", str(24 * 3600)))
+
+# Masinio darbų importo API raktas (Authorization: Bearer ...). Tuščias – API išjungtas.
+BILLING_API_TOKEN = os.getenv("BILLING_API_TOKEN", "").strip()
+
+# Sąskaitų PDF atsisiuntimas pagal pasirašytas nuorodas (billing:invoice_pdf)
+INVOICE_PDF_LINK_MAX_AGE = int(os.getenv("INVOICE_PDF_LINK_MAX_AGE", str(7 * 24 * 3600)))
+# "nginx" – X-Accel-Redirect, "apache" – X-Sendfile, tuščia – failą srautu siunčia Django
+INVOICE_PDF_SENDFILE = os.getenv("INVOICE_PDF_SENDFILE", "").strip()
+# nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+INVOICE_PDF_ACCEL_PREFIX = os.getenv("INVOICE_PDF_ACCEL_PREFIX", "/protected-media/")
+
+# Mūsų (pardavėjo) rekvizitai el. dokumentams: i.SAF, UBL
+BILLING_SELLER = {
+    "name": "MEVIKA UAB",
+    "company_code": "302666445",
+    "vat_code": "LT100009187014",
+    "iban": "LT114010044200904314",
+    "address": "Darbo g. 19, Kuršėnai",
+    "country": "LT",
+}
+# VMI i.SAF XSD (isaf_1.2.xsd) – export_isaf juo tikrina failą, jei nenurodytas --xsd
+ISAF_XSD_PATH = os.getenv("ISAF_XSD_PATH", "").strip()
+# 0 % PVM sąskaitų i.SAF mokesčio kodai (default: billing.services.isaf.ZERO_RATE_TAX_CODES)
+ISAF_ZERO_RATE_TAX_CODES = {}